@@ -0,0 +1,171 @@
+"""
+Time-bucket aggregation for pivot exports
+Reduces decoded column batches to one row per time bucket with per-signal
+min / max / mean / rms / last, vectorized with NumPy reduceat (no per-sample
+Python). Buckets are aligned to the Unix epoch, so the same resolution gives
+the same bucket edges for any request window.
+
+Batches are reduced as they arrive: a bucket is emitted once a later batch
+starts past it, so memory stays bounded by one batch plus one open bucket.
+Channel data is time-ordered as the relay writes it; a sample arriving after
+its bucket was emitted starts a second row for that bucket.
+"""
+from typing import Dict, Iterable, Iterator, Optional
+
+import numpy as np
+
+from decoder import DTYPES
+
+AGGREGATES = ('min', 'max', 'mean', 'rms', 'last')
+COUNT_FIELD = 'count'
+
+# aggregate -> running statistic it is computed from
+STATISTIC = {'min': 'min', 'max': 'max', 'mean': 'sum', 'rms': 'sumsq', 'last': 'last'}
+STATISTICS = ('min', 'max', 'sum', 'sumsq', 'last')
+REDUCERS = {'min': np.minimum, 'max': np.maximum, 'sum': np.add, 'sumsq': np.add}
+
+
+def parse_aggregates(value: Optional[str]):
+    """Aggregate names from a comma-separated list (default: all)."""
+    if not value:
+        return AGGREGATES
+    aggregates = tuple(dict.fromkeys(a.strip().lower() for a in value.split(',') if a.strip()))
+    unknown = [a for a in aggregates if a not in AGGREGATES]
+    if unknown or not aggregates:
+        raise ValueError(f"Unknown aggregate: {','.join(unknown) or value} (use {','.join(AGGREGATES)})")
+    return aggregates
+
+
+def aggregate_fields(fields, aggregates=AGGREGATES, time_field: str = 'time'):
+    """(name, kind) of the aggregated output for (name, kind) input fields."""
+    out = [(time_field, 'long'), (COUNT_FIELD, 'long')]
+    for name, kind in fields:
+        if name == time_field or kind not in DTYPES:
+            continue
+        for aggregate in aggregates:
+            out.append((f'{name}_{aggregate}', 'double' if aggregate in ('mean', 'rms') else kind))
+    return out
+
+
+def reduce_buckets(ids: np.ndarray, count: np.ndarray, stats: Dict):
+    """
+    Combine rows with equal bucket ids. stats maps (signal, statistic) to
+    arrays aligned with ids; 'last' keeps the latest row in arrival order.
+    Returns sorted unique ids, their counts and reduced stats.
+    """
+    if len(ids) and np.any(ids[1:] < ids[:-1]):
+        order = np.argsort(ids, kind='stable')
+        ids, count = ids[order], count[order]
+        stats = {key: values[order] for key, values in stats.items()}
+
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) if len(ids) else np.empty(0, np.intp)
+    if not len(starts):
+        return ids, count, stats
+    ends = np.r_[starts[1:], len(ids)] - 1
+
+    reduced = {}
+    for (name, stat), values in stats.items():
+        reduced[name, stat] = values[ends] if stat == 'last' else REDUCERS[stat].reduceat(values, starts)
+    return ids[starts], np.add.reduceat(count, starts), reduced
+
+
+def column_statistics(columns: Dict, statistics=STATISTICS, time_field: str = 'time') -> Dict:
+    """Per-sample statistics ((signal, statistic) -> array) of numeric columns."""
+    stats = {}
+    for name, values in columns.items():
+        if name == time_field or not isinstance(values, np.ndarray):
+            continue
+        for stat in statistics:
+            if stat == 'sum':
+                stats[name, stat] = values.astype(np.float64)
+            elif stat == 'sumsq':
+                stats[name, stat] = np.square(values, dtype=np.float64)
+            else:
+                stats[name, stat] = values
+    return stats
+
+
+class Aggregator:
+    """Streaming per-bucket aggregation of one channel's column batches"""
+
+    def __init__(self, bucket_ns: int, aggregates=AGGREGATES, time_field: str = 'time'):
+        if bucket_ns <= 0:
+            raise ValueError("Bucket width must be positive")
+        self.bucket_ns = bucket_ns
+        self.aggregates = tuple(aggregates)
+        self.time_field = time_field
+        self.statistics = tuple(dict.fromkeys(STATISTIC[a] for a in self.aggregates))
+        self._pending = None
+
+    def add(self, columns: Dict) -> Optional[Dict]:
+        """Fold in one batch; returns the buckets it completed (or None)."""
+        times = columns.get(self.time_field)
+        if times is None or not len(times):
+            return None
+        stats = column_statistics(columns, self.statistics, self.time_field)
+        return self.add_statistics(times, np.ones(len(times), dtype=np.int64), stats)
+
+    def add_statistics(self, times: np.ndarray, count: np.ndarray, stats: Dict) -> Optional[Dict]:
+        """
+        Fold in pre-reduced rows (e.g. rollup buckets no wider than this
+        aggregator's, starting at times); returns the buckets completed.
+        """
+        if not len(times):
+            return None
+        ids = np.asarray(times) // self.bucket_ns
+        stats = {(name, stat): values for (name, stat), values in stats.items() if stat in self.statistics}
+        first = ids.min()
+        ids, count, stats = reduce_buckets(ids, count, stats)
+
+        if self._pending is not None and self._pending[2].keys() != stats.keys():
+            # Signal set changed (schema change between files): close the open buckets
+            pending, self._pending = self._pending, (ids, count, stats)
+            return self._columns(*pending) if len(pending[0]) else None
+
+        if self._pending is not None:
+            pending_ids, pending_count, pending_stats = self._pending
+            ids, count, stats = reduce_buckets(
+                np.concatenate([pending_ids, ids]),
+                np.concatenate([pending_count, count]),
+                {key: np.concatenate([pending_stats[key], values]) for key, values in stats.items()},
+            )
+
+        # Buckets before this batch's first one are complete
+        split = int(np.searchsorted(ids, first))
+        self._pending = (ids[split:], count[split:], {key: values[split:] for key, values in stats.items()})
+        if not split:
+            return None
+        return self._columns(ids[:split], count[:split], {key: values[:split] for key, values in stats.items()})
+
+    def finish(self) -> Optional[Dict]:
+        """Emit the buckets still open."""
+        pending, self._pending = self._pending, None
+        if pending is None or not len(pending[0]):
+            return None
+        return self._columns(*pending)
+
+    def _columns(self, ids, count, stats) -> Dict:
+        columns = {self.time_field: ids * self.bucket_ns, COUNT_FIELD: count}
+        names = dict.fromkeys(name for name, _ in stats)
+        for name in names:
+            for aggregate in self.aggregates:
+                values = stats[name, STATISTIC[aggregate]]
+                if aggregate == 'mean':
+                    values = values / count
+                elif aggregate == 'rms':
+                    values = np.sqrt(values / count)
+                columns[f'{name}_{aggregate}'] = values
+        return columns
+
+
+def aggregate_batches(batches: Iterable[Dict], bucket_ns: int, aggregates=AGGREGATES,
+                      time_field: str = 'time') -> Iterator[Dict]:
+    """Aggregated column batches of a stream of raw column batches."""
+    aggregator = Aggregator(bucket_ns, aggregates, time_field)
+    for columns in batches:
+        done = aggregator.add(columns)
+        if done is not None:
+            yield done
+    done = aggregator.finish()
+    if done is not None:
+        yield done
@@ -3,8 +3,10 @@ Pivot REST API Server - Synchronous Design
 Simple Flask-based API for AVRO-to-HDF5 export
 """
 from flask import Flask, request, send_file, jsonify
-from datetime import datetime, timedelta
-import tempfile
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+import io
+import json
 import os
 import sys
 
@@ -13,6 +15,21 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../lib/python'))
 from speeddata_config import load_config
 import dataset
 
+import arrow_writer
+from aggregate import parse_aggregates
+from catalog import FileCatalog, overlap_bytes
+from catcol import ShardService
+from cost import AdmissionBusy, AdmissionControl, AdmissionRejected, CostModel
+from export import DEFAULT_BATCH_BYTES, ChannelJob, ExportPool
+from export_cache import ExportCache
+from jobs import JobManager, QueueFull
+from live_tail import live_tails
+from rollup import RollupService
+from singleflight import SingleFlight
+from spool import ExportSpool, SpoolFull
+from virtual_set import VIRTUAL_FORMAT
+from hdf5_writer import DEFAULT_CHUNK_ROWS
+
 app = Flask(__name__)
 
 # Load configuration
@@ -23,14 +40,105 @@ limits = api_config.get('limits', {})
 # Configuration
 MAX_CHANNELS = limits.get('max_channels', 20)
 MAX_DURATION_MINUTES = limits.get('max_duration_minutes', 5)
+# Aggregated exports (resolution=) return one row per bucket: their window is bounded by
+# the bucket count and the cost estimate instead of max_duration_minutes
+MAX_BUCKETS = limits.get('max_buckets', 1000000)
+# Synchronous exports estimated to take longer are rejected (use /api/v1/pivot/jobs)
+MAX_EXPORT_SECONDS = limits.get('timeout_seconds', 60)
+
+# Streaming export: raw AVRO bytes decoded per batch bounds peak memory
+export_config = api_config.get('export', {})
+EXPORT_BATCH_BYTES = export_config.get('batch_bytes', DEFAULT_BATCH_BYTES)
+EXPORT_CHUNK_ROWS = export_config.get('chunk_rows', DEFAULT_CHUNK_ROWS)
+EXPORT_WORKERS = export_config.get('workers', os.cpu_count() or 1)
+EXPORT_MEMORY_MAX_BYTES = export_config.get('memory_max_bytes', 32 * 1024 * 1024)
+# Decoded rows of files the relay is still writing, kept per process between requests
+EXPORT_LIVE_TAIL_BYTES = export_config.get('live_tail_bytes', 64 * 1024 * 1024)
 
 # Storage configuration
 storage_config = config.get('storage', {})
 AVRO_PATH = storage_config.get('avro_path', '../../data')
 
+# File catalog, checked against the disk at startup; a file idle for a
+# rotation period (time rotation) is closed even without an index trailer
+relay_config = load_config('relay')
+relay_rotation = relay_config.get('rotation', {})
+catalog_config = config.get('catalog', {})
+catalog = FileCatalog(AVRO_PATH, catalog_config.get('path'),
+                      relay_rotation.get('threshold') if relay_rotation.get('mode') == 'time' else None)
+catalog.sync()
+
+# Channel schemas (needed for headerless C relay files)
+relay_channels = relay_config.get('channels', [])
+CHANNEL_SCHEMAS = {c['name']: c['schema'] for c in relay_channels if 'schema' in c}
+
+# Temp files of exports being sent (and worker shards), deleted after use
+spool_config = config.get('spool', {})
+export_spool = ExportSpool(spool_config.get('path', './data/export_spool'),
+                           spool_config.get('max_bytes', 10 * 1024 ** 3))
+
+# Channel decode fans out to worker processes; the server only merges shards
+export_pool = ExportPool(EXPORT_WORKERS, EXPORT_BATCH_BYTES, EXPORT_CHUNK_ROWS,
+                         scratch_dir=str(export_spool.directory), live_tail_bytes=EXPORT_LIVE_TAIL_BYTES)
+
+# Cost estimates from catalog metadata; exports run within core and memory budgets
+admission_config = api_config.get('admission', {})
+cost_model = CostModel(admission_config.get('scan_bytes_per_second', 500 * 1024 * 1024),
+                       admission_config.get('values_per_second', 100_000_000),
+                       EXPORT_WORKERS, EXPORT_BATCH_BYTES, EXPORT_MEMORY_MAX_BYTES)
+admission = AdmissionControl(admission_config.get('cores', EXPORT_WORKERS),
+                             admission_config.get('memory_bytes', 4 * 1024 ** 3),
+                             admission_config.get('max_queued', 32),
+                             admission_config.get('max_wait_seconds', 30))
+
+# Export result cache (disabled when max_bytes is 0)
+cache_config = config.get('cache', {})
+CACHE_MAX_BYTES = cache_config.get('max_bytes', 0)
+export_cache = ExportCache(cache_config.get('path', './data/export_cache'), CACHE_MAX_BYTES) \
+    if CACHE_MAX_BYTES > 0 else None
+
+# Output formats: format -> (mimetype, file extension); Arrow/Parquet need pyarrow
+EXPORT_FORMATS = {'hdf5': ('application/x-hdf5', 'h5'), VIRTUAL_FORMAT: ('application/x-hdf5', 'h5'),
+                  **arrow_writer.FORMATS}
+
+# In-flight exports, so identical concurrent requests decode once
+export_flights = SingleFlight()
+
+# Asynchronous export jobs for long windows (bounded worker pool, priority queue)
+jobs_config = api_config.get('jobs', {})
+JOBS_MAX_DURATION_MINUTES = jobs_config.get('max_duration_minutes', 120)
+JOBS_MAX_WAIT_SECONDS = jobs_config.get('max_wait_seconds', 30)
+export_jobs = JobManager(jobs_config.get('workers', 2), jobs_config.get('max_queued', 100),
+                         jobs_config.get('result_ttl_seconds', 3600),
+                         jobs_config.get('path', './data/export_jobs'),
+                         jobs_config.get('max_result_bytes', 10 * 1024 ** 3))
+
+# Columnar shards of closed files, so exports only decode the open tail
+shards_config = config.get('shards', {})
+shard_service = None
+if shards_config.get('enabled', True):
+    shard_service = ShardService(
+        catalog, shards_config.get('path', './data/shards'),
+        lambda channel: load_channel_schema(channel),
+        shards_config.get('interval_seconds', 30), EXPORT_BATCH_BYTES, EXPORT_CHUNK_ROWS)
+    shard_service.start()
+
+# Rollup pyramid of closed files, answering coarse aggregated exports
+rollup_config = config.get('rollup', {})
+rollup_service = None
+if rollup_config.get('enabled', True):
+    rollup_service = RollupService(
+        catalog, rollup_config.get('path', './data/rollup'),
+        [int(s * 1_000_000_000) for s in rollup_config.get('levels_seconds', [1, 10, 60, 600])],
+        lambda channel: load_channel_schema(channel),
+        rollup_config.get('interval_seconds', 60), EXPORT_BATCH_BYTES)
+    rollup_service.start()
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
 
 def parse_iso8601_duration(duration_str):
-    """Parse ISO 8601 duration like PT30S, PT5M, PT1H"""
+    """Parse ISO 8601 duration like PT30S, PT5M, PT1H, PT0.01S"""
     if not duration_str.startswith('PT'):
         raise ValueError(f"Invalid duration format: {duration_str}")
 
@@ -46,83 +154,273 @@ def parse_iso8601_duration(duration_str):
     if 'S' in duration_str:
         secs = duration_str.replace('S', '')
         if secs:
-            seconds += int(secs)
+            seconds += float(secs)
 
     return timedelta(seconds=seconds)
 
 
+def to_epoch_ns(dt: datetime) -> int:
+    """Convert datetime to Unix nanoseconds (naive datetimes are local time)."""
+    if dt.tzinfo is None:
+        dt = dt.astimezone()
+    return (dt - EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def load_channel_schema(channel_name: str):
+    """Load the AVRO schema registered for a channel, if any."""
+    schema_path = CHANNEL_SCHEMAS.get(channel_name)
+    if not schema_path:
+        return None
+    with open(schema_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
 def find_avro_files(channel_name: str, start: datetime, end: datetime):
-    """Find AVRO files for a channel in the time range."""
-    import glob
-    from pathlib import Path
+    """Catalog entries of a channel's AVRO files whose time range overlaps [start, end]."""
+    return catalog.files_for(channel_name, to_epoch_ns(start), to_epoch_ns(end))
+
+
+def channel_job(channel_name: str, start: datetime, end: datetime, signals=None,
+                resolution: int = 0, aggregates=None, dedupe: bool = False, files=None) -> ChannelJob:
+    """
+    Describe one channel's share of an export.
+    Record `time` is Unix nanoseconds (timestamp-nanos, as sent by the sources);
+    the catalog prunes files to the window, the sparse time index lets each
+    file seek straight to it, and the schema-compiled decoder fills NumPy
+    columns for the requested signals only, EXPORT_BATCH_BYTES at a time.
+    Closed files already pivoted into columnar shards are sliced instead, and
+    files overlapping in time are merged by timestamp. The file the relay is
+    still writing is decoded incrementally, from where the last request stopped.
+    With a resolution the columns are reduced to per-bucket aggregates, read
+    from the rollup pyramid for closed files inside the window.
+    files: the channel's catalog entries, if already looked up.
+    """
+    start_ns, end_ns = to_epoch_ns(start), to_epoch_ns(end)
+    if files is None:
+        files = find_avro_files(channel_name, start, end)
+    return ChannelJob(
+        channel=channel_name,
+        files=[f['path'] for f in files],
+        schema=load_channel_schema(channel_name),
+        start=start_ns,
+        end=end_ns,
+        signals=signals,
+        size=sum(overlap_bytes(f, start_ns, end_ns) for f in files),
+        resolution=resolution,
+        aggregates=aggregates,
+        rollups=rollup_service.lookup(files, resolution, start_ns, end_ns)
+        if resolution and rollup_service is not None else None,
+        shards=shard_service.lookup(files) if shard_service is not None else None,
+        times=[(f['first_time'], f['last_time']) for f in files],
+        dedupe=dedupe,
+        live=[f['path'] for f in files if not f['closed']],
+    )
+
+
+def plan_export(req):
+    """Channel jobs of an export request and their estimated cost."""
+    jobs, estimates = [], []
+    for channel in req.channels:
+        files = find_avro_files(channel, req.start, req.end)
+        job = channel_job(channel, req.start, req.end, req.signals, req.resolution, req.aggregates,
+                          req.dedupe, files)
+        jobs.append(job)
+        estimates.append(cost_model.channel(job, files, req.fmt))
+    return jobs, cost_model.estimate(jobs, estimates)
+
+
+def estimate_response(estimate, decision: str, cached: bool, head: bool):
+    """Dry-run answer: the estimate as JSON, or as X-Estimated-* headers for HEAD."""
+    headers = {
+        'X-Admission': decision,
+        'X-Cache': 'HIT' if cached else 'MISS',
+        'X-Estimated-Records': str(estimate.records),
+        'X-Estimated-Output-Bytes': str(estimate.output_bytes),
+        'X-Estimated-Memory-Bytes': str(estimate.memory_bytes),
+        'X-Estimated-Seconds': f'{estimate.seconds:.3f}',
+    }
+    if head:
+        return '', 200, headers
+    return jsonify({"estimate": estimate._asdict(), "admission": decision, "cached": cached}), 200, headers
+
+
+def build_export(request_key: str, jobs, fmt: str, output_bytes: int = 0):
+    """
+    Write an export (channels decoded in parallel) and cache it.
+    output_bytes (the estimated result size) is reserved in the spool.
+
+    Exports whose input is estimated under EXPORT_MEMORY_MAX_BYTES are built
+    in memory and returned as bytes; larger ones go to a spool file and its
+    path is returned (the cache links the file, the spool still owns it).
+    """
+    if sum(job.size for job in jobs) <= EXPORT_MEMORY_MAX_BYTES:
+        buf = io.BytesIO()
+        export_pool.write(buf, jobs, fmt)
+        data = buf.getvalue()
+        if export_cache is not None:
+            export_cache.put_bytes(request_key, data)
+        return data
+
+    export_path = export_spool.create(output_bytes)
+    try:
+        export_pool.write(export_path, jobs, fmt)
+    except Exception:
+        export_spool.discard(export_path)
+        raise
+    export_spool.commit(export_path)
+
+    if export_cache is not None:
+        export_cache.put(request_key, export_path)
+    return export_path
+
+
+def share_export(result, users: int):
+    """A spool file is released once by each response that sends it."""
+    if isinstance(result, str):
+        export_spool.share(result, users)
+
+
+def send_export(result, fmt: str, cache_status: str):
+    """
+    Response for export bytes, a spool file (deleted after sending) or an
+    open cached export (closed after sending).
+    """
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f'export_{timestamp}.{extension}'
+
+    if isinstance(result, bytes):
+        response = send_file(io.BytesIO(result), mimetype=mimetype,
+                             as_attachment=True, download_name=filename)
+    elif isinstance(result, str):
+        try:
+            response = send_file(result, mimetype=mimetype,
+                                 as_attachment=True, download_name=filename)
+        except Exception:
+            export_spool.release(result)
+            raise
+        response.call_on_close(lambda: export_spool.release(result))
+    else:
+        try:
+            response = send_file(result, mimetype=mimetype,
+                                 as_attachment=True, download_name=filename)
+        except Exception:
+            result.close()
+            raise
+
+    response.headers['X-Cache'] = cache_status
+    return response
+
 
-    avro_dir = Path(AVRO_PATH)
-    if not avro_dir.exists():
-        return []
+class ExportRequestError(Exception):
+    """Invalid export parameters: HTTP status and JSON error body."""
 
-    # Find all AVRO files (simple glob for now)
-    # TODO: Implement smarter file selection based on timestamps in filenames
-    pattern = str(avro_dir / "*.avro")
-    files = glob.glob(pattern)
+    def __init__(self, status: int, body: dict):
+        super().__init__(body.get('error'))
+        self.status = status
+        self.body = body
 
-    return sorted(files)
 
+# resolution: bucket width in ns (0 = raw samples), aggregates: per-bucket statistics,
+# dedupe: drop exact duplicate rows where files overlap in time
+ExportRequest = namedtuple('ExportRequest', ['start', 'end', 'channels', 'signals', 'fmt',
+                                             'resolution', 'aggregates', 'dedupe'], defaults=(0, None, False))
 
-def load_avro_data(channel_name: str, start: datetime, end: datetime, signals=None):
-    """Load AVRO data from relay storage and filter by time range."""
-    import avro.datafile
-    import avro.io
-    import numpy as np
 
-    files = find_avro_files(channel_name, start, end)
-    if not files:
-        raise FileNotFoundError(f"No AVRO files found for channel {channel_name}")
+def parse_export_request(args, max_duration_minutes: int) -> ExportRequest:
+    """Parse and validate export parameters (query string or JSON body)."""
+    # Parse time range
+    start_str = args.get('start')
+    if not start_str:
+        raise ExportRequestError(400, {"error": "Missing required parameter: start"})
 
-    # Collect records from all files
-    all_records = []
-    for file_path in files:
+    try:
+        start = datetime.fromisoformat(start_str.replace('Z', '+00:00'))
+    except ValueError as e:
+        raise ExportRequestError(400, {"error": f"Invalid start timestamp: {e}"})
+
+    # Determine end time
+    end_str = args.get('end')
+    duration_str = args.get('duration')
+
+    if end_str:
         try:
-            with open(file_path, 'rb') as f:
-                reader = avro.datafile.DataFileReader(f, avro.io.DatumReader())
-                for record in reader:
-                    # Filter by time range if 'time' field exists
-                    if 'time' in record:
-                        # Assume time is Unix timestamp
-                        record_time = datetime.fromtimestamp(record['time'])
-                        if start <= record_time <= end:
-                            all_records.append(record)
-                    else:
-                        all_records.append(record)
-                reader.close()
-        except Exception as e:
-            print(f"Warning: Failed to read {file_path}: {e}")
-            continue
-
-    if not all_records:
-        raise ValueError(f"No records found in time range for channel {channel_name}")
-
-    # Extract signals
-    time_data = []
-    signal_data = {}
-
-    for record in all_records:
-        if 'time' in record:
-            time_data.append(record['time'])
-
-        for key, value in record.items():
-            if key != 'time':
-                # Filter signals if specified
-                if signals and key not in signals:
-                    continue
-
-                if key not in signal_data:
-                    signal_data[key] = []
-                signal_data[key].append(value)
-
-    return {
-        'time': np.array(time_data) if time_data else None,
-        'signals': {k: np.array(v) for k, v in signal_data.items()}
-    }
+            end = datetime.fromisoformat(end_str.replace('Z', '+00:00'))
+        except ValueError as e:
+            raise ExportRequestError(400, {"error": f"Invalid end timestamp: {e}"})
+    elif duration_str:
+        try:
+            duration = parse_iso8601_duration(duration_str)
+            end = start + duration
+        except ValueError as e:
+            raise ExportRequestError(400, {"error": f"Invalid duration: {e}"})
+    else:
+        end = datetime.now()
+
+    # Validate time range
+    if start >= end:
+        raise ExportRequestError(400, {"error": "start must be before end"})
+
+    # Parse aggregation (optional): one row per resolution bucket
+    resolution, aggregates = 0, None
+    resolution_str = args.get('resolution')
+    if resolution_str:
+        try:
+            resolution = parse_iso8601_duration(resolution_str) // timedelta(microseconds=1) * 1000
+            aggregates = parse_aggregates(args.get('aggregate'))
+        except ValueError as e:
+            raise ExportRequestError(400, {"error": f"Invalid aggregation: {e}"})
+        if resolution <= 0:
+            raise ExportRequestError(400, {"error": "resolution must be at least 1 microsecond"})
+    elif args.get('aggregate'):
+        raise ExportRequestError(400, {"error": "aggregate requires resolution"})
+
+    duration = end - start
+    if not resolution and duration > timedelta(minutes=max_duration_minutes):
+        raise ExportRequestError(413, {
+            "error": f"Time range exceeds maximum ({max_duration_minutes} minutes)",
+            "requested_minutes": duration.total_seconds() / 60
+        })
+
+    buckets = duration // timedelta(microseconds=1) * 1000 // resolution if resolution else 0
+    if buckets > MAX_BUCKETS:
+        raise ExportRequestError(413, {
+            "error": f"Bucket count exceeds maximum ({MAX_BUCKETS}), use a coarser resolution",
+            "requested_buckets": buckets
+        })
+
+    # Parse channels
+    channels_str = args.get('channels')
+    if not channels_str:
+        raise ExportRequestError(400, {"error": "Missing required parameter: channels"})
+
+    channels = [c.strip() for c in channels_str.split(',')]
+    if len(channels) > MAX_CHANNELS:
+        raise ExportRequestError(413, {
+            "error": f"Channel count exceeds maximum ({MAX_CHANNELS})",
+            "requested_channels": len(channels)
+        })
+
+    # Parse signals (optional)
+    signals_str = args.get('signals')
+    signals = [s.strip() for s in signals_str.split(',')] if signals_str else None
+
+    # Parse output format (optional)
+    fmt = args.get('format', 'hdf5').lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ExportRequestError(400, {
+            "error": f"Unknown format: {fmt}",
+            "formats": list(EXPORT_FORMATS)
+        })
+    if fmt == VIRTUAL_FORMAT and resolution:
+        raise ExportRequestError(400, {"error": f"Format {fmt} maps raw samples and cannot be aggregated"})
+    if fmt in arrow_writer.FORMATS and not arrow_writer.available():
+        raise ExportRequestError(400, {"error": f"Format {fmt} requires pyarrow, which is not installed"})
+
+    # Duplicate elimination across overlapping files (optional)
+    dedupe = str(args.get('dedupe', 'false')).lower() in ('1', 'true', 'yes')
+
+    return ExportRequest(start, end, channels, signals, fmt, resolution, aggregates, dedupe)
 
 
 @app.route('/api/v1/pivot/export', methods=['GET'])
@@ -136,118 +434,207 @@ def export():
     - duration: ISO 8601 duration (alternative to end, e.g., PT30S)
     - channels: Comma-separated channel list (required)
     - signals: Comma-separated signal list (optional, defaults to all)
+    - format: hdf5 (default), hdf5-virtual (Set of virtual datasets over the columnar
+      shards, for use on the storage host), arrow (IPC stream), arrow-file (IPC file) or parquet
+    - resolution: ISO 8601 bucket width (optional, e.g. PT1S): one row per bucket
+    - aggregate: Comma-separated min,max,mean,rms,last (optional, defaults to all)
+    - dedupe: true to drop exact duplicate rows of overlapping files (optional)
+    - dry_run: true to only return the cost estimate (as does a HEAD request,
+      in X-Estimated-* headers)
 
     Returns:
-    - 200: HDF5 file
+    - 200: Export file (HDF5, Arrow IPC or Parquet), or the estimate for dry runs
     - 400: Bad request (invalid parameters)
-    - 413: Request too large (exceeds limits)
+    - 413: Request too large (exceeds limits or budgets, use /api/v1/pivot/jobs)
     - 500: Server error
+    - 503: Export spool full or admission queue full (retry later)
     """
     try:
-        # Parse time range
-        start_str = request.args.get('start')
-        if not start_str:
-            return jsonify({"error": "Missing required parameter: start"}), 400
+        req = parse_export_request(request.args, MAX_DURATION_MINUTES)
+        start, end, channels, signals, fmt = req.start, req.end, req.channels, req.signals, req.fmt
 
-        try:
-            start = datetime.fromisoformat(start_str.replace('Z', '+00:00'))
-        except ValueError as e:
-            return jsonify({"error": f"Invalid start timestamp: {e}"}), 400
+        # Output options that change the export file (part of the cache key)
+        options = {'format': fmt, 'chunk_rows': EXPORT_CHUNK_ROWS,
+                   'resolution': req.resolution, 'aggregates': req.aggregates, 'dedupe': req.dedupe}
 
-        # Determine end time
-        end_str = request.args.get('end')
-        duration_str = request.args.get('duration')
+        jobs, estimate = plan_export(req)
 
-        if end_str:
-            try:
-                end = datetime.fromisoformat(end_str.replace('Z', '+00:00'))
-            except ValueError as e:
-                return jsonify({"error": f"Invalid end timestamp: {e}"}), 400
-        elif duration_str:
+        # Normalized request + identity of contributing files
+        request_key = ExportCache.key(channels, signals, to_epoch_ns(start), to_epoch_ns(end),
+                                      options, [path for job in jobs for path in job.files])
+
+        head = request.method == 'HEAD'
+        if head or str(request.args.get('dry_run', 'false')).lower() in ('1', 'true', 'yes'):
+            cached = export_cache is not None and export_cache.contains(request_key)
+            decision = 'admit' if cached else admission.decide(estimate, MAX_EXPORT_SECONDS)
+            return estimate_response(estimate, decision, cached, head)
+
+        # Serve a cached export if neither the request nor any contributing file changed
+        result = export_cache.get(request_key) if export_cache is not None else None
+        cache_status = 'HIT'
+
+        if result is None:
             try:
-                duration = parse_iso8601_duration(duration_str)
-                end = start + duration
-            except ValueError as e:
-                return jsonify({"error": f"Invalid duration: {e}"}), 400
-        else:
-            end = datetime.now()
-
-        # Validate time range
-        if start >= end:
-            return jsonify({"error": "start must be before end"}), 400
-
-        duration = end - start
-        if duration > timedelta(minutes=MAX_DURATION_MINUTES):
-            return jsonify({
-                "error": f"Time range exceeds maximum ({MAX_DURATION_MINUTES} minutes)",
-                "requested_minutes": duration.total_seconds() / 60
-            }), 413
-
-        # Parse channels
-        channels_str = request.args.get('channels')
-        if not channels_str:
-            return jsonify({"error": "Missing required parameter: channels"}), 400
-
-        channels = [c.strip() for c in channels_str.split(',')]
-        if len(channels) > MAX_CHANNELS:
-            return jsonify({
-                "error": f"Channel count exceeds maximum ({MAX_CHANNELS})",
-                "requested_channels": len(channels)
-            }), 413
-
-        # Parse signals (optional)
-        signals_str = request.args.get('signals')
-        signals = [s.strip() for s in signals_str.split(',')] if signals_str else None
-
-        # Generate HDF5 file from AVRO data
-        import h5py
-        import numpy as np
-
-        with tempfile.NamedTemporaryFile(suffix='.h5', delete=False) as tmp:
-            tmp_path = tmp.name
-
-        with h5py.File(tmp_path, 'w') as f:
-            for channel in channels:
-                try:
-                    # Load AVRO data for this channel
-                    data = load_avro_data(channel, start, end, signals)
-
-                    # Create HDF5 group for channel
-                    grp = f.create_group(channel)
-
-                    # Write time array
-                    if data['time'] is not None:
-                        grp.create_dataset('time', data=data['time'])
-
-                    # Write signal datasets
-                    for signal_name, signal_values in data['signals'].items():
-                        grp.create_dataset(signal_name, data=signal_values)
-
-                except FileNotFoundError as e:
-                    # Channel has no data - create empty group
-                    print(f"Warning: {e}")
-                    grp = f.create_group(channel)
-                except ValueError as e:
-                    # No records in time range - create empty group
-                    print(f"Warning: {e}")
-                    grp = f.create_group(channel)
-
-        # Generate filename
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'export_{timestamp}.h5'
-
-        # Send file and clean up
-        return send_file(
-            tmp_path,
-            mimetype='application/x-hdf5',
-            as_attachment=True,
-            download_name=filename
-        )
+                admission.check(estimate, MAX_EXPORT_SECONDS)
+            except AdmissionRejected as e:
+                raise ExportRequestError(413, {"error": f"{e}, use /api/v1/pivot/jobs",
+                                               "estimate": estimate._asdict()})
+
+            def build():
+                with admission.admit(estimate, MAX_EXPORT_SECONDS):
+                    return build_export(request_key, jobs, fmt, estimate.output_bytes)
+
+            # Identical concurrent requests wait on one export and share its result,
+            # even if the open file grew since the first of them arrived
+            flight_key = ExportCache.key(channels, signals, to_epoch_ns(start), to_epoch_ns(end),
+                                         options, [])
+            result, shared = export_flights.do(flight_key, build, share_export)
+            cache_status = 'COALESCED' if shared else 'MISS'
+
+        return send_export(result, fmt, cache_status)
+
+    except ExportRequestError as e:
+        return jsonify(e.body), e.status
+    except (SpoolFull, AdmissionBusy) as e:
+        return jsonify({"error": str(e)}), 503, {'Retry-After': '5'}
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
+def run_export_job(job, req: ExportRequest) -> str:
+    """Job body: write the export into the jobs directory, reporting channel progress."""
+    channel_jobs, estimate = plan_export(req)
+    result_path = export_jobs.result_path(job)
+
+    def progress(done, total):
+        export_jobs.update(job, channels_done=done, channels_total=total)
 
+    progress(0, len(set(req.channels)))
+    try:
+        # Jobs wait for room as long as it takes, behind waiting interactive exports
+        with admission.admit(estimate, wait=False):
+            export_pool.write(result_path, channel_jobs, req.fmt, progress)
+    except Exception:
+        if os.path.exists(result_path):
+            os.unlink(result_path)
+        raise
+    export_jobs.update(job, bytes=os.path.getsize(result_path))
+    return result_path
+
+
+def job_status(job):
+    status = job.to_dict()
+    if job.state == 'done':
+        status['result_url'] = f'/api/v1/pivot/jobs/{job.id}/result'
+    return status
+
+
+@app.route('/api/v1/pivot/jobs', methods=['POST'])
+def submit_job():
+    """
+    Submit an asynchronous export job (for windows too long for /export)
+
+    Parameters (query string or JSON body): as /api/v1/pivot/export, plus
+    - priority: integer, higher runs first (optional, default 0)
+
+    Returns:
+    - 202: {job_id, state, status_url, estimate}
+    - 400/413: Invalid parameters, or estimated memory beyond the budget
+    - 503: Job queue or result quota full (retry later)
+    - 500: Server error
+    """
+    try:
+        args = dict(request.args.items())
+        args.update(request.get_json(silent=True) or {})
+        req = parse_export_request(args, JOBS_MAX_DURATION_MINUTES)
+        try:
+            priority = int(args.get('priority', 0))
+        except (TypeError, ValueError):
+            return jsonify({"error": f"Invalid priority: {args.get('priority')}"}), 400
+
+        _, estimate = plan_export(req)
+        try:
+            admission.check(estimate)
+        except AdmissionRejected as e:
+            return jsonify({"error": str(e), "estimate": estimate._asdict()}), 413
+
+        job = export_jobs.submit(lambda job: run_export_job(job, req), priority, meta={
+            'channels': req.channels,
+            'start': req.start.isoformat(),
+            'end': req.end.isoformat(),
+            'format': req.fmt,
+            'resolution_ns': req.resolution,
+            'estimate': estimate._asdict(),
+        }, reserve_bytes=estimate.output_bytes)
+        status = job_status(job)
+        status['status_url'] = f'/api/v1/pivot/jobs/{job.id}'
+        return jsonify(status), 202, {'Location': status['status_url']}
+
+    except ExportRequestError as e:
+        return jsonify(e.body), e.status
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503, {'Retry-After': '30'}
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
 
+@app.route('/api/v1/pivot/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Job status and progress.
+    Long-poll with ?wait=<seconds>&version=<last seen version>: returns as
+    soon as the job changes (or finishes), at most after wait seconds.
+    """
+    try:
+        wait = min(float(request.args.get('wait', 0)), JOBS_MAX_WAIT_SECONDS)
+        version = int(request.args.get('version', -1))
+    except ValueError:
+        return jsonify({"error": "wait and version must be numbers"}), 400
+
+    export_jobs.expire()
+    job = export_jobs.wait(job_id, version, wait) if wait > 0 else export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job not found: {job_id}"}), 404
+    return jsonify(job_status(job))
+
+
+@app.route('/api/v1/pivot/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Download a finished job's export (kept until the job expires)."""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job not found: {job_id}"}), 404
+    if job.state != 'done':
+        return jsonify({"error": f"Job is {job.state}", **job_status(job)}), 409
+
+    mimetype, extension = EXPORT_FORMATS[job.meta['format']]
+    return send_file(job.result, mimetype=mimetype, as_attachment=True,
+                     download_name=f'export_{job.id}.{extension}')
+
+
+@app.route('/api/v1/pivot/jobs/<job_id>', methods=['DELETE'])
+def delete_job(job_id):
+    """Cancel a queued job or delete a finished job's result."""
+    job = export_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"error": f"Job not found: {job_id}"}), 404
+    return jsonify(job_status(job))
+
+
+@app.route('/api/v1/pivot/cache', methods=['GET'])
+def cache_stats():
+    """Export cache, request coalescing, admission, spool, job, rollup, shard and live-tail counters"""
+    stats = {"enabled": export_cache is not None, "flights": export_flights.stats(),
+             "admission": admission.stats(),
+             "spool": export_spool.stats(), "jobs": export_jobs.stats(),
+             "rollup": rollup_service.stats() if rollup_service is not None else None,
+             "shards": shard_service.stats() if shard_service is not None else None,
+             "live_tail": live_tails.stats()}
+    if export_cache is not None:
+        stats.update(export_cache.stats())
+    return jsonify(stats)
+
+
 @app.route('/api/v1/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -0,0 +1,134 @@
+"""
+Arrow IPC / Parquet writer for pivot exports
+Turns decoded column batches into Arrow record batches without going
+through Python objects: numeric columns are wrapped, string columns reuse
+their offsets and bytes as Arrow buffers.
+
+Layout: one table for all requested channels. A dictionary-encoded
+`channel` column tells rows apart; each batch holds rows of one channel and
+signals that channel lacks are null. `time` is timestamp[ns, UTC].
+
+pyarrow is in requirements.txt; where it is missing these formats are
+unavailable and the rest of pivot still runs.
+"""
+import numpy as np
+
+from decoder import StringColumn
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# format -> (mimetype, file extension)
+FORMATS = {
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'arrow-file': ('application/vnd.apache.arrow.file', 'arrow'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+CHANNEL_FIELD = 'channel'
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def arrow_type(kind: str, name: str, time_field: str = 'time'):
+    """Arrow type of an AVRO primitive field."""
+    if name == time_field and kind in ('long', 'int'):
+        return pa.timestamp('ns', tz='UTC')
+    return {
+        'long': pa.int64(),
+        'int': pa.int32(),
+        'double': pa.float64(),
+        'float': pa.float32(),
+        'boolean': pa.bool_(),
+        'string': pa.large_string(),
+        'bytes': pa.large_binary(),
+        'null': pa.null(),
+    }[kind]
+
+
+def arrow_schema(fields, channels):
+    """Export schema: channel dictionary column + union of (name, kind) fields."""
+    return pa.schema(
+        [pa.field(CHANNEL_FIELD, pa.dictionary(pa.int32(), pa.string()))]
+        + [pa.field(name, arrow_type(kind, name)) for name, kind in fields]
+    )
+
+
+def to_arrow(values, arrow_type):
+    """Arrow array of a decoded column (NumPy array or StringColumn)."""
+    if isinstance(values, StringColumn):
+        cls = pa.LargeBinaryArray if pa.types.is_large_binary(arrow_type) else pa.LargeStringArray
+        return cls.from_buffers(len(values), pa.py_buffer(np.ascontiguousarray(values.offsets)),
+                                pa.py_buffer(values.data))
+    return pa.array(values, type=arrow_type)
+
+
+class ArrowStreamWriter:
+    """Append-only writer of per-channel column batches to Arrow IPC or Parquet"""
+
+    def __init__(self, target, fmt: str, fields, channels):
+        if pa is None:
+            raise RuntimeError("pyarrow is required for Arrow and Parquet exports")
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+
+        self.schema = arrow_schema(fields, channels)
+        self.signal_fields = list(self.schema)[1:]
+        self.dictionary = pa.array(list(channels), type=pa.string())
+        self.channel_ids = {channel: i for i, channel in enumerate(channels)}
+        self.rows = {}
+
+        # File objects stay open for the caller (e.g. BytesIO)
+        self._owns_sink = isinstance(target, str)
+        self._sink = pa.OSFile(target, 'wb') if self._owns_sink else pa.PythonFile(target, mode='w')
+        if fmt == 'parquet':
+            self._writer = pq.ParquetWriter(self._sink, self.schema)
+        elif fmt == 'arrow-file':
+            self._writer = pa.ipc.new_file(self._sink, self.schema)
+        else:
+            self._writer = pa.ipc.new_stream(self._sink, self.schema)
+
+    def add_channel(self, channel: str):
+        self.rows.setdefault(channel, 0)
+
+    def append(self, channel: str, columns: dict):
+        """Append one batch (field name -> NumPy array or StringColumn)."""
+        self.add_channel(channel)
+        if not columns:
+            return
+        count = len(next(iter(columns.values())))
+        if not count:
+            return
+
+        ids = np.full(count, self.channel_ids[channel], dtype=np.int32)
+        arrays = [pa.DictionaryArray.from_arrays(pa.array(ids), self.dictionary)]
+        for field in self.signal_fields:
+            values = columns.get(field.name)
+            arrays.append(pa.nulls(count, field.type) if values is None else to_arrow(values, field.type))
+        self.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        self.rows[channel] += count
+
+    def write_batch(self, batch):
+        self._writer.write_batch(batch)
+
+    def merge(self, shard_path: str, channel: str):
+        """Copy the batches of a worker's Arrow IPC file shard (memory-mapped)."""
+        self.add_channel(channel)
+        with pa.memory_map(shard_path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                self.write_batch(batch)
+                self.rows[channel] += batch.num_rows
+
+    def close(self):
+        self._writer.close()
+        if self._owns_sink:
+            self._sink.close()
+        else:
+            self._sink.flush()
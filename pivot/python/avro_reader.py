@@ -0,0 +1,418 @@
+"""
+Block-level reader for relay AVRO files
+Handles both container files with a header (Python relay, sender debug files)
+and the headerless block stream written by the C relay.
+
+Block layout (see relay/README.md):
+[object_count: varint] [byte_count: varint] [data: bytes] [sync_marker: 16 bytes]
+"""
+import io
+import itertools
+import json
+import mmap
+import os
+import zlib
+from collections import namedtuple
+
+import avro.io
+import avro.schema
+import numpy as np
+
+from decoder import (UnsupportedSchema, StringColumn, compile_schema, concat_columns, read_varints,
+                     select_rows)
+from time_index import TimeIndex
+
+# Fixed sync marker shared by all relay writers
+SYNC_MARKER = b'\xa4\x8a\x1e\x90\x05\x04$x\nh3\x7f\xc2P\x95c'
+MAGIC = b'Obj\x01'
+
+# Records per batch when falling back to record-at-a-time decoding
+RECORD_BATCH = 4096
+
+Header = namedtuple('Header', ['schema', 'codec', 'sync_marker', 'data_offset'])
+Block = namedtuple('Block', ['offset', 'count', 'data', 'end'])
+
+
+def decode_long(buf, pos: int = 0):
+    """Decode a zigzag varint long from a buffer. Returns (value, next_pos)."""
+    shift = 0
+    accum = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        accum |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return (accum >> 1) ^ -(accum & 1), pos
+        shift += 7
+
+
+def read_long(f):
+    """Read a zigzag varint long from a file object. Returns None at EOF."""
+    shift = 0
+    accum = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        b = byte[0]
+        accum |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return (accum >> 1) ^ -(accum & 1)
+        shift += 7
+
+
+def read_header(f) -> Header:
+    """
+    Read the container header if present.
+    Headerless (C relay) files start with blocks at offset 0.
+    """
+    f.seek(0)
+    if f.read(4) != MAGIC:
+        return Header(None, 'null', SYNC_MARKER, 0)
+
+    metadata = {}
+    while True:
+        count = read_long(f)
+        if not count:
+            break
+        if count < 0:
+            count = -count
+            read_long(f)  # block size in bytes, unused
+        for _ in range(count):
+            key = f.read(read_long(f)).decode('utf-8')
+            metadata[key] = f.read(read_long(f))
+
+    sync_marker = f.read(16)
+    schema = metadata.get('avro.schema')
+    codec = metadata.get('avro.codec', b'null').decode('utf-8')
+    return Header(json.loads(schema) if schema else None, codec, sync_marker, f.tell())
+
+
+def iter_blocks(f, offset: int, stop=None, sync_marker: bytes = SYNC_MARKER):
+    """
+    Yield blocks starting at offset until stop (exclusive) or EOF.
+    A truncated or corrupt trailing block ends iteration.
+    """
+    f.seek(offset)
+    while stop is None or offset < stop:
+        count = read_long(f)
+        size = read_long(f) if count is not None else None
+        if size is None or count < 0 or size < 0:
+            return
+
+        data = f.read(size)
+        if len(data) < size or f.read(16) != sync_marker:
+            return
+
+        end = f.tell()
+        yield Block(offset, count, data, end)
+        offset = end
+
+
+def frame_blocks(buf, sync_marker: bytes = SYNC_MARKER, pos: int = 0, limit=None):
+    """
+    Locate blocks in an in-memory byte range starting at a block boundary.
+    Returns (data_starts, data_sizes, counts, end) where end is the offset
+    just past the last complete block. Offsets are relative to buf; pos and
+    limit bound the range (default all of buf).
+    """
+    starts, sizes, counts = [], [], []
+    size_limit = len(buf) if limit is None else limit
+    while pos < size_limit:
+        try:
+            count, p = decode_long(buf, pos)
+            size, p = decode_long(buf, p)
+        except IndexError:
+            break
+        end = p + size + 16
+        if count < 0 or size < 0 or end > size_limit or buf[p + size:end] != sync_marker:
+            break
+        starts.append(p)
+        sizes.append(size)
+        counts.append(count)
+        pos = end
+    return starts, sizes, counts, pos
+
+
+def find_sync(buf: np.ndarray, sync_marker: bytes, start: int, end: int) -> np.ndarray:
+    """Offsets of every sync marker in buf[start:end], found with vectorized compares."""
+    marker = np.frombuffer(sync_marker, dtype=np.uint8)
+    window = buf[start:end]
+    if len(window) < len(marker):
+        return np.empty(0, dtype=np.int64)
+    hits = np.flatnonzero(window[:len(window) - len(marker) + 1] == marker[0])
+    for k in range(1, len(marker)):
+        hits = hits[window[hits + k] == marker[k]]
+    return hits + start
+
+
+def frame_view(buf: np.ndarray, start: int, end: int, sync_marker: bytes = SYNC_MARKER, raw=None):
+    """
+    Vectorized frame_blocks over buf[start:end] (a uint8 view, e.g. of an mmap).
+
+    Blocks are located by scanning for the sync marker; each candidate is
+    confirmed by its header (data start + size must land on the marker). If
+    a marker byte pattern shows up inside block data, framing continues from
+    that block with frame_blocks over raw (buf's underlying buffer).
+    Returns (data_starts, data_sizes, counts, end) as absolute offsets.
+    """
+    syncs = find_sync(buf, sync_marker, start, end)
+    empty = np.empty(0, dtype=np.int64)
+    if not len(syncs):
+        return empty, empty, empty, start
+
+    block_starts = np.concatenate(([start], syncs[:-1] + len(sync_marker)))
+    try:
+        counts, p = read_varints(buf, block_starts)
+        sizes, p = read_varints(buf, p)
+        valid = (counts >= 0) & (sizes >= 0) & (p + sizes == syncs)
+    except (IndexError, ValueError):
+        valid = np.zeros(len(syncs), dtype=bool)
+
+    if valid.all():
+        return p, sizes, counts, int(syncs[-1]) + len(sync_marker)
+
+    # Keep the confirmed prefix, then walk the rest block by block
+    good = int(np.argmin(valid))
+    pos = int(block_starts[good])
+    more_starts, more_sizes, more_counts, pos = frame_blocks(
+        raw if raw is not None else buf.tobytes(), sync_marker, pos, end)
+    return (np.concatenate((p[:good], np.asarray(more_starts, dtype=np.int64))),
+            np.concatenate((sizes[:good], np.asarray(more_sizes, dtype=np.int64))),
+            np.concatenate((counts[:good], np.asarray(more_counts, dtype=np.int64))),
+            pos)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    """Decompress block data for the container codec."""
+    if codec == 'null':
+        return data
+    if codec == 'deflate':
+        return zlib.decompress(data, -15)
+    raise ValueError(f"Unsupported AVRO codec: {codec}")
+
+
+def _byte_range(path: str, header: Header, start, end):
+    """Index-bounded (first, stop) byte range of a file for a time window."""
+    first, stop = None, None
+    index = TimeIndex.for_file(path) if start is not None or end is not None else None
+    if index:
+        first, stop = index.block_range(start, end)
+    return max(first or 0, header.data_offset), stop
+
+
+def _needs_more(buf, pos: int, limit=None) -> bool:
+    """True if the bytes after pos are the start of a block cut short by the range end."""
+    limit = len(buf) if limit is None else limit
+    try:
+        count, p = decode_long(buf, pos)
+        size, p = decode_long(buf, p)
+    except IndexError:
+        return True
+    return count >= 0 and size >= 0 and p + size + 16 > limit
+
+
+def _time_mask(columns: dict, start, end, time_field: str) -> dict:
+    """Keep rows with start <= time <= end."""
+    times = columns.get(time_field)
+    if times is None or (start is None and end is None):
+        return columns
+    mask = np.ones(len(times), dtype=bool)
+    if start is not None:
+        mask &= times >= start
+    if end is not None:
+        mask &= times <= end
+    return columns if mask.all() else select_rows(columns, mask)
+
+
+def iter_columns(path: str, start=None, end=None, schema=None, time_field: str = 'time',
+                 fields=None, batch_bytes=None):
+    """
+    Yield one file as batches of columns (field name -> NumPy array or
+    StringColumn), keeping rows with start <= time <= end.
+
+    The file is memory-mapped and the byte range from the time index is
+    framed (vectorized sync marker scan) and decoded in place, batch_bytes at
+    a time (None = all at once), so memory stays bounded by the batch size
+    rather than the window. A block that straddles a batch boundary starts
+    the next batch; batches the time filter leaves empty are not yielded.
+    Schemas the decoder cannot handle fall back to records. fields restricts
+    decoding to those names (plus time); the rest are skipped at the byte level.
+    """
+    if fields is not None:
+        fields = set(fields) | {time_field}
+
+    with open(path, 'rb') as f:
+        header = read_header(f)
+        writer_schema = header.schema or schema
+        if writer_schema is None:
+            raise ValueError(f"No schema for headerless file {path}")
+
+        try:
+            decoder = compile_schema(writer_schema)
+        except UnsupportedSchema:
+            records = read_records(path, start, end, schema, time_field)
+            while True:
+                batch = list(itertools.islice(records, RECORD_BATCH))
+                if not batch:
+                    return
+                yield columns_from_records(batch, fields)
+
+        pos, stop = _byte_range(path, header, start, end)
+        file_size = os.fstat(f.fileno()).st_size
+        limit = file_size if stop is None else min(stop, file_size)
+        if pos >= limit:
+            return
+
+        # Map the file: blocks are framed and decoded in place, no read copies
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    for columns, _ in _decode_range(mapped, header, decoder, pos, limit, fields, batch_bytes):
+        columns = _time_mask(columns, start, end, time_field)
+        if columns and len(next(iter(columns.values()))):
+            yield columns
+
+
+def _decode_range(mapped, header: Header, decoder, pos: int, limit: int, fields=None, batch_bytes=None):
+    """
+    Frame and decode the complete blocks of mapped[pos:limit], batch_bytes
+    at a time. Yields (columns, end): end is the offset just past the last
+    block decoded so far.
+    """
+    buf = np.frombuffer(mapped, dtype=np.uint8)
+    step = batch_bytes or limit
+    while pos < limit:
+        window_end = min(limit, pos + step)
+        starts, sizes, counts, consumed = frame_view(buf, pos, window_end, header.sync_marker, mapped)
+        while not len(starts) and window_end < limit and _needs_more(mapped, pos, window_end):
+            # Block larger than a batch: widen the window until it fits
+            window_end = min(limit, window_end + step)
+            starts, sizes, counts, consumed = frame_view(buf, pos, window_end, header.sync_marker, mapped)
+        if not len(starts):
+            break
+
+        if header.codec == 'null':
+            data = buf
+        else:
+            view = memoryview(mapped)
+            payloads = [decompress(view[s:s + n], header.codec) for s, n in zip(starts, sizes)]
+            data = np.frombuffer(b''.join(payloads), dtype=np.uint8)
+            starts = np.cumsum([0] + [len(p) for p in payloads[:-1]])
+
+        yield decoder.decode(data, starts, counts, fields), consumed
+
+        # Corrupt block: nothing after it can be framed
+        if consumed < window_end and not _needs_more(mapped, consumed, window_end):
+            break
+        if batch_bytes and hasattr(mmap, 'MADV_DONTNEED'):
+            # Let the kernel drop the pages of this batch from our resident set
+            first_page = pos - pos % mmap.PAGESIZE
+            mapped.madvise(mmap.MADV_DONTNEED, first_page, consumed - first_page)
+        pos = consumed
+
+
+def _open_appended(path: str, offset=None, schema=None):
+    """Map a growing file for decoding from offset: (mapped or None if nothing to read, header, decoder, pos, limit)."""
+    with open(path, 'rb') as f:
+        header = read_header(f)
+        writer_schema = header.schema or schema
+        if writer_schema is None:
+            raise ValueError(f"No schema for headerless file {path}")
+        decoder = compile_schema(writer_schema)
+
+        pos = header.data_offset if offset is None else max(offset, header.data_offset)
+        limit = os.fstat(f.fileno()).st_size
+        if pos >= limit:
+            return None, header, decoder, pos, limit
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), header, decoder, pos, limit
+
+
+def iter_appended(path: str, offset=None, schema=None, fields=None, batch_bytes=None):
+    """
+    Decode the complete blocks of a growing file from offset (a block
+    boundary; None = first block), batch_bytes at a time. Yields (columns,
+    end): end is the offset just past the batch's last block, where the next
+    read resumes. Columns may be views of the file mapping. Raises
+    UnsupportedSchema for schemas the compiled decoder cannot handle.
+    """
+    mapped, header, decoder, pos, limit = _open_appended(path, offset, schema)
+    if mapped is not None:
+        yield from _decode_range(mapped, header, decoder, pos, limit, fields, batch_bytes)
+
+
+def read_appended(path: str, offset=None, schema=None, fields=None, batch_bytes=None):
+    """
+    Decode the complete blocks of a growing file from offset (a block
+    boundary; None = first block). Returns (columns, end): end is the offset
+    just past the last complete block, where a block the writer is still
+    appending starts, so the next call resumes there. Columns own their
+    memory (no views of the file). Raises UnsupportedSchema for schemas the
+    compiled decoder cannot handle.
+    """
+    mapped, header, decoder, pos, limit = _open_appended(path, offset, schema)
+    if mapped is None:
+        return {}, pos
+
+    parts, end = [], pos
+    for columns, end in _decode_range(mapped, header, decoder, pos, limit, fields, batch_bytes):
+        parts.append(columns)
+    return concat_columns(parts), end  # concatenating copies out of the mapping
+
+
+def read_columns(path: str, start=None, end=None, schema=None, time_field: str = 'time',
+                 fields=None) -> dict:
+    """
+    Read one file as columns, keeping rows with start <= time <= end.
+    Whole-range version of iter_columns.
+    """
+    return concat_columns(iter_columns(path, start, end, schema, time_field, fields))
+
+
+def columns_from_records(records, fields=None) -> dict:
+    """Build columns from decoded record dicts (fallback path)."""
+    lists = {}
+    for record in records:
+        for key, value in record.items():
+            if fields is None or key in fields:
+                lists.setdefault(key, []).append(value)
+    columns = {}
+    for key, values in lists.items():
+        if values and isinstance(values[0], str):
+            encoded = [v.encode('utf-8') for v in values]
+            lengths = np.array([len(v) for v in encoded], dtype=np.int64)
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            columns[key] = StringColumn(offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        else:
+            columns[key] = np.array(values)
+    return columns
+
+
+def read_records(path: str, start=None, end=None, schema=None, time_field: str = 'time'):
+    """
+    Yield records of one file with start <= time <= end.
+
+    Uses the sparse time index (if present) to seek to the first block in
+    range and stop after the last, so only blocks near the window are decoded.
+    schema is required for headerless files and ignored otherwise.
+    """
+    with open(path, 'rb') as f:
+        header = read_header(f)
+        writer_schema = header.schema or schema
+        if writer_schema is None:
+            raise ValueError(f"No schema for headerless file {path}")
+
+        datum_reader = avro.io.DatumReader(avro.schema.parse(json.dumps(writer_schema)))
+        first, stop = _byte_range(path, header, start, end)
+
+        for block in iter_blocks(f, first, stop, header.sync_marker):
+            decoder = avro.io.BinaryDecoder(io.BytesIO(decompress(block.data, header.codec)))
+            for _ in range(block.count):
+                record = datum_reader.read(decoder)
+                record_time = record.get(time_field)
+                if record_time is not None:
+                    if start is not None and record_time < start:
+                        continue
+                    if end is not None and record_time > end:
+                        continue
+                yield record
@@ -0,0 +1,351 @@
+"""
+Pivot File Catalog
+SQLite catalog of relay AVRO files, so exports prune by channel and time
+range instead of globbing and opening the whole storage directory.
+
+Storage layout: <avro_path>/<channel>/*.avro (one directory per relay).
+Files directly in <avro_path> (legacy layout, sender debug files) are
+unassigned and considered for every channel.
+
+A file is closed once the relay has rotated away from it: it has an index
+trailer, a newer data_<time>.avro exists in its directory, or it has not
+been written for a rotation period. Without a trailer (index disabled, or
+the relay stopped abruptly) its summary comes from a block scan.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from avro_reader import decode_long, decompress, iter_blocks, read_header
+from time_index import TimeIndex
+
+
+# Directory mtimes have coarse granularity: a listing taken within this
+# window of the last change may miss a file created in the same tick
+MTIME_SETTLE_NS = 1_000_000_000
+
+# A rotated file is closed (index trailer, truncation) shortly after the
+# relay moves on: keep re-checking files rotated within this window
+CLOSE_SETTLE_NS = 60_000_000_000
+
+# Relay data file names: data_<unix time>.avro or data_<unix time>_<n>.avro
+DATA_FILE_NAME = re.compile(r'data_(\d+)(?:_(\d+))?\.avro$')
+
+
+def data_file_key(path: str):
+    """Sort key of a relay data file by creation, or None for other files."""
+    match = DATA_FILE_NAME.match(os.path.basename(path))
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2) or 0)
+
+
+def newest_data_file(paths) -> Optional[str]:
+    """The data file the relay is currently writing, among paths of one directory."""
+    keyed = [(key, path) for path in paths if (key := data_file_key(path)) is not None]
+    return max(keyed)[1] if keyed else None
+
+
+def overlap_fraction(entry: Dict, start: Optional[int] = None, end: Optional[int] = None) -> float:
+    """
+    Share of a cataloged file within [start, end], assuming records are
+    spread evenly over the file's time range.
+    """
+    first, last = entry['first_time'], entry['last_time']
+    if first is None or last is None or last <= first:
+        return 1.0
+    lo = first if start is None else max(start, first)
+    hi = last if end is None else min(end, last)
+    if hi < lo:
+        return 0.0
+    return (hi - lo) / (last - first)
+
+
+def overlap_bytes(entry: Dict, start: Optional[int] = None, end: Optional[int] = None) -> int:
+    """Estimated bytes of a cataloged file within [start, end]."""
+    return int(entry['bytes'] * overlap_fraction(entry, start, end))
+
+
+def overlap_records(entry: Dict, start: Optional[int] = None, end: Optional[int] = None) -> int:
+    """Estimated records of a cataloged file within [start, end]."""
+    return int((entry['record_count'] or 0) * overlap_fraction(entry, start, end))
+
+
+class FileCatalog:
+    """Catalog of (channel, file, time range, records, bytes, closed)"""
+
+    def __init__(self, avro_path: str, db_path: Optional[str] = None,
+                 rotation_seconds: Optional[float] = None):
+        self.avro_path = Path(avro_path)
+        self.rotation_ns = int(rotation_seconds * 1e9) if rotation_seconds else None
+        self.db_path = Path(db_path) if db_path else self.avro_path / 'catalog.db'
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._dir_mtimes: Dict[str, int] = {}
+        self._init_schema()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_schema(self):
+        """Initialize database schema if not exists"""
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                directory TEXT NOT NULL,
+                channel TEXT,
+                first_time INTEGER,
+                last_time INTEGER,
+                record_count INTEGER NOT NULL DEFAULT 0,
+                bytes INTEGER NOT NULL DEFAULT 0,
+                closed INTEGER NOT NULL DEFAULT 0,
+                mtime_ns INTEGER,
+                index_mtime_ns INTEGER,
+                scan_offset INTEGER
+            )
+        """)
+
+        # Index for channel + time range pruning
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_channel_time ON files(channel, first_time)
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_directory_time ON files(directory, first_time)
+        """)
+
+        conn.commit()
+        conn.close()
+
+    def sync(self):
+        """Reconcile the whole catalog with the disk (run at startup)."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                directories = {str(self.avro_path): None}
+                if self.avro_path.exists():
+                    for entry in os.scandir(self.avro_path):
+                        if entry.is_dir():
+                            directories[entry.path] = entry.name
+
+                # Drop directories that disappeared
+                known = [r['directory'] for r in conn.execute("SELECT DISTINCT directory FROM files")]
+                for directory in known:
+                    if directory not in directories:
+                        conn.execute("DELETE FROM files WHERE directory = ?", (directory,))
+
+                for directory, channel in directories.items():
+                    self._sync_dir(conn, directory, channel)
+                conn.commit()
+            finally:
+                conn.close()
+
+    def refresh(self, channel: str):
+        """
+        Cheap incremental update for one channel: relist its directories only
+        if their mtime changed (file created/removed), and re-stat open and
+        just rotated files.
+        """
+        self._refresh([(str(self.avro_path), None), (str(self.avro_path / channel), channel)])
+
+    def refresh_all(self):
+        """
+        Incremental update of every channel directory (background passes),
+        one directory at a time so exports are not held up by a full sync.
+        """
+        try:
+            channels = [entry.name for entry in os.scandir(self.avro_path) if entry.is_dir()]
+        except FileNotFoundError:
+            channels = []
+        self._refresh([(str(self.avro_path), None)])
+        for channel in channels:
+            self._refresh([(str(self.avro_path / channel), channel)])
+
+        # Drop directories that disappeared
+        present = {str(self.avro_path)} | {str(self.avro_path / channel) for channel in channels}
+        with self._lock:
+            conn = self._connect()
+            try:
+                for row in conn.execute("SELECT DISTINCT directory FROM files").fetchall():
+                    if row['directory'] not in present:
+                        conn.execute("DELETE FROM files WHERE directory = ?", (row['directory'],))
+                        self._dir_mtimes.pop(row['directory'], None)
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _refresh(self, directories):
+        """Relist changed directories of (directory, channel) and re-stat their open and just rotated files."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                for directory, dir_channel in directories:
+                    try:
+                        mtime = os.stat(directory).st_mtime_ns
+                    except FileNotFoundError:
+                        continue
+                    if self._dir_mtimes.get(directory) != mtime:
+                        self._sync_dir(conn, directory, dir_channel)
+
+                rows = conn.execute(f"""
+                    SELECT path, directory, channel FROM files
+                    WHERE (closed = 0 OR (scan_offset IS NOT NULL AND mtime_ns > ?))
+                    AND directory IN ({', '.join('?' * len(directories))})
+                """, [time.time_ns() - CLOSE_SETTLE_NS] + [d for d, _ in directories]).fetchall()
+                newest = {}
+                for row in rows:
+                    try:
+                        st = os.stat(row['path'])
+                    except FileNotFoundError:
+                        conn.execute("DELETE FROM files WHERE path = ?", (row['path'],))
+                        continue
+                    directory = row['directory']
+                    if directory not in newest:
+                        newest[directory] = newest_data_file(r['path'] for r in conn.execute(
+                            "SELECT path FROM files WHERE directory = ?", (directory,)))
+                    self._update_file(conn, row['path'], row['channel'], st,
+                                      self._rotated(row['path'], newest[directory], st))
+                conn.commit()
+            finally:
+                conn.close()
+
+    def files_for(self, channel: str, start: Optional[int] = None, end: Optional[int] = None) -> List[Dict]:
+        """
+        Files of a channel whose [first_time, last_time] overlaps [start, end],
+        ordered by first record time. Without a trailer, last_time is the
+        first time of the file's last block (the relay groups records into
+        blocks), so such a file counts as reaching to the first time of the
+        next file in its channel directory, or to now if there is none.
+        """
+        self.refresh(channel)
+
+        query = """
+            SELECT * FROM files
+            WHERE (channel = ? OR channel IS NULL) AND first_time IS NOT NULL
+        """
+        params = [channel]
+        if end is not None:
+            query += " AND first_time <= ?"
+            params.append(end)
+        if start is not None:
+            query += """ AND (last_time >= ? OR (scan_offset IS NOT NULL AND NOT EXISTS (
+                SELECT 1 FROM files later
+                WHERE later.directory = files.directory AND later.channel IS NOT NULL
+                AND later.first_time < ? AND (later.first_time, later.path) > (files.first_time, files.path)
+            )))"""
+            params += [start, start]
+        query += " ORDER BY first_time, path"
+
+        conn = self._connect()
+        try:
+            return [dict(row) for row in conn.execute(query, params)]
+        finally:
+            conn.close()
+
+    def closed_files(self) -> List[Dict]:
+        """All rotated (closed) files, ordered by channel and first record time."""
+        conn = self._connect()
+        try:
+            return [dict(row) for row in conn.execute("""
+                SELECT * FROM files WHERE closed = 1 AND first_time IS NOT NULL
+                ORDER BY channel, first_time, path
+            """)]
+        finally:
+            conn.close()
+
+    def _sync_dir(self, conn, directory: str, channel: Optional[str]):
+        """Add/update every AVRO file in a directory, drop vanished ones."""
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+            entries = [e for e in os.scandir(directory) if e.is_file() and e.name.endswith('.avro')]
+        except FileNotFoundError:
+            mtime, entries = None, []
+
+        # Only trust the listing once the directory has settled
+        settled = mtime is not None and time.time_ns() - mtime > MTIME_SETTLE_NS
+        self._dir_mtimes[directory] = mtime if settled else None
+
+        present = set()
+        newest = newest_data_file(entry.path for entry in entries)
+        for entry in entries:
+            present.add(entry.path)
+            st = entry.stat()
+            self._update_file(conn, entry.path, channel, st, self._rotated(entry.path, newest, st))
+
+        for row in conn.execute("SELECT path FROM files WHERE directory = ?", (directory,)).fetchall():
+            if row['path'] not in present:
+                conn.execute("DELETE FROM files WHERE path = ?", (row['path'],))
+
+    def _rotated(self, path: str, newest: Optional[str], st: os.stat_result) -> bool:
+        """True if the relay no longer writes a file (newer file, or idle for a rotation period)."""
+        if newest is not None and data_file_key(path) is not None and path != newest:
+            return True
+        return self.rotation_ns is not None and time.time_ns() - st.st_mtime_ns > self.rotation_ns
+
+    def _update_file(self, conn, path: str, channel: Optional[str], st: os.stat_result,
+                     rotated: bool = False):
+        """
+        Refresh one file's entry. Files with an index trailer (written at
+        rotation) take their summary from it; others are scanned incrementally
+        from the last block seen (block headers and leading timestamps only),
+        and are closed if rotated.
+        """
+        try:
+            index_mtime = os.stat(path + '.idx').st_mtime_ns
+        except FileNotFoundError:
+            index_mtime = None
+
+        row = conn.execute("SELECT * FROM files WHERE path = ?", (path,)).fetchone()
+        if row and row['mtime_ns'] == st.st_mtime_ns and row['index_mtime_ns'] == index_mtime \
+                and (row['closed'] or (row['scan_offset'] == st.st_size and not rotated)):
+            return
+
+        index = TimeIndex.for_file(path) if index_mtime is not None else None
+        if index is not None and index.summary:
+            summary = index.summary
+            values = (summary.first_time, summary.last_time, summary.record_count,
+                      st.st_size, 1, None)
+        else:
+            resume = row if row and row['scan_offset'] is not None and row['scan_offset'] <= st.st_size else None
+            try:
+                values = self._scan(path, resume, rotated)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Failed to catalog {path}: {e}")
+                return
+
+        conn.execute("""
+            INSERT OR REPLACE INTO files
+            (path, directory, channel, first_time, last_time, record_count, bytes,
+             closed, scan_offset, mtime_ns, index_mtime_ns)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (path, os.path.dirname(path), channel) + values + (st.st_mtime_ns, index_mtime))
+
+    @staticmethod
+    def _scan(path: str, row=None, closed: bool = False):
+        """Scan blocks of a file without trailer, resuming from a previous scan."""
+        first_time = row['first_time'] if row else None
+        last_time = row['last_time'] if row else None
+        record_count = row['record_count'] if row else 0
+
+        with open(path, 'rb') as f:
+            header = read_header(f)
+            offset = row['scan_offset'] if row else header.data_offset
+            for block in iter_blocks(f, offset, sync_marker=header.sync_marker):
+                record_count += block.count
+                offset = block.end
+                try:
+                    timestamp, _ = decode_long(decompress(block.data, header.codec))
+                except (IndexError, ValueError, zlib.error):
+                    continue
+                if first_time is None:
+                    first_time = timestamp
+                last_time = timestamp
+
+        return (first_time, last_time, record_count, os.path.getsize(path), int(closed), offset)
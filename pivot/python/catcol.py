@@ -1,31 +1,355 @@
+"""
+Pivot rows to columns
+Converts closed relay AVRO files into columnar HDF5 shards, one shard per
+file: a `columns` group with one dataset per signal (same dtypes as HDF5
+exports) and the file's time range as attributes. Shards are time-sorted,
+so exports slice the rows of their window instead of decoding blocks.
+
+ShardService keeps shards of every closed file in the catalog current from
+a background thread.
+
+Run as a script it is a batch pivot: selected files (globs, channels, time
+window) are pivoted in a process pool and appended to one HDF5 file, a
+group per channel. Files already in the output are skipped unless they
+grew, in which case only their newer rows are added: those from the last
+pivoted time on, less the rows already pivoted at that time.
+
+    python pivot/python/catcol.py --data data --channel example \
+        --signals sine_wave,ramp --start 2025-01-23T14:00:00Z -o run.h5 -j 8
+"""
+import argparse
+import glob
+import json
 import os
-import avro.schema
-import avro.datafile
-import avro.io
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional
+
 import h5py
+import numpy as np
+
+from avro_reader import iter_columns
+from closed_files import ClosedFileService, write_atomically
+from decoder import StringColumn, select_rows
+from hdf5_writer import DEFAULT_CHUNK_ROWS, STRING_DTYPE, Hdf5StreamWriter
+
+SHARD_SUFFIX = '.shard.h5'
+SHARD_GROUP = 'columns'
+
+# Bytes per row assumed for variable-length columns when sizing read batches
+STRING_ROW_BYTES = 16
+
+
+def _skip_at(columns: Dict, times, start, skip: int):
+    """Drop the first skip rows with time == start. Returns (columns, rows dropped)."""
+    at = np.flatnonzero(times == start)[:skip]
+    if not len(at):
+        return columns, 0
+    keep = np.ones(len(times), dtype=bool)
+    keep[at] = False
+    return select_rows(columns, keep), len(at)
+
+
+def pivot_file(source_path: str, shard_path: str, schema=None, fields=None,
+               batch_bytes: Optional[int] = None, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+               time_field: str = 'time', start=None, end=None, skip: int = 0) -> int:
+    """
+    Pivot one AVRO file (rows with start <= time <= end) into a columnar
+    shard, written atomically. skip drops the first rows (in file order)
+    with time == start, e.g. those a previous run already pivoted. Rows out
+    of time order are sorted in place afterwards. Returns rows.
+
+    The shard records its time range and how many of its rows are at its
+    last time (last_time_rows).
+    """
+    rows = 0
+
+    def write(f):
+        nonlocal rows, skip
+        writer = Hdf5StreamWriter(f, chunk_rows)
+        grp = writer.add_channel(SHARD_GROUP)
+        first = last = None
+        last_rows = 0
+        ordered = True
+        for columns in iter_columns(source_path, start, end, schema, time_field, fields, batch_bytes):
+            times = columns.get(time_field)
+            if times is not None and skip:
+                columns, dropped = _skip_at(columns, times, start, skip)
+                skip -= dropped
+                times = columns[time_field]
+            if times is not None and len(times):
+                if (last is not None and times[0] < last) or np.any(times[1:] < times[:-1]):
+                    ordered = False
+                first = times.min() if first is None else min(first, times.min())
+                latest = times.max()
+                if last is None or latest > last:
+                    last, last_rows = latest, 0
+                if latest == last:
+                    last_rows += int(np.count_nonzero(times == latest))
+            writer.append(SHARD_GROUP, columns)
+        writer.finish()
+        rows = writer.rows[SHARD_GROUP]
+
+        if not ordered:
+            # One column in memory at a time
+            order = np.argsort(grp[time_field][:], kind='stable')
+            for dset in grp.values():
+                dset[...] = dset[:][order]
+
+        grp.attrs['rows'] = rows
+        if first is not None:
+            grp.attrs['first_time'] = first
+            grp.attrs['last_time'] = last
+            grp.attrs['last_time_rows'] = last_rows
+
+    write_atomically(shard_path, write, source_path)
+    return rows
+
+
+def read_shard(shard_path: str, start=None, end=None, fields=None, batch_bytes: Optional[int] = None,
+               time_field: str = 'time'):
+    """
+    Yield a shard's rows with start <= time <= end as batches of columns
+    (field name -> NumPy array or StringColumn), about batch_bytes at a time.
+    """
+    with h5py.File(shard_path, 'r') as f:
+        grp = f[SHARD_GROUP]
+        if time_field not in grp:
+            return
+        wanted = None if fields is None else set(fields) | {time_field}
+        names = [name for name in grp if wanted is None or name in wanted]
+
+        times = grp[time_field][:]
+        lo = 0 if start is None else int(np.searchsorted(times, start, 'left'))
+        hi = len(times) if end is None else int(np.searchsorted(times, end, 'right'))
+
+        row_bytes = sum(STRING_ROW_BYTES if grp[name].dtype.kind == 'O' else grp[name].dtype.itemsize
+                        for name in names)
+        step = max(1, batch_bytes // row_bytes) if batch_bytes else max(hi - lo, 1)
+        for a in range(lo, hi, step):
+            b = min(a + step, hi)
+            columns = {}
+            for name in names:
+                dset = grp[name]
+                if name == time_field:
+                    columns[name] = times[a:b]
+                elif dset.dtype.kind == 'O':
+                    columns[name] = StringColumn.from_strings(dset[a:b])
+                else:
+                    columns[name] = dset[a:b]
+            yield columns
+
+
+class ShardService(ClosedFileService):
+    """Pivots the catalog's closed files into columnar shards, from a background thread"""
+
+    name = 'shard'
+    suffix = SHARD_SUFFIX
+
+    def __init__(self, catalog, directory: str, schema_for: Optional[Callable] = None,
+                 interval: float = 60, batch_bytes: Optional[int] = None,
+                 chunk_rows: int = DEFAULT_CHUNK_ROWS):
+        self.chunk_rows = chunk_rows
+        super().__init__(catalog, directory, schema_for, interval, batch_bytes)
+
+    def build(self, source_path: str, output_path: str, schema):
+        pivot_file(source_path, output_path, schema, batch_bytes=self.batch_bytes,
+                   chunk_rows=self.chunk_rows)
+
+    def lookup(self, entries) -> Dict[str, str]:
+        """Shards of the given catalog entries that match their source files."""
+        return self.current(entries)
+
+
+# Batch pivot (command line)
+
+SOURCES_DATASET = '_sources'
+UNASSIGNED = 'unassigned'
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def parse_time(value: Optional[str]) -> Optional[int]:
+    """ISO 8601 timestamp -> Unix ns (naive timestamps are local time)."""
+    if value is None:
+        return None
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.astimezone()
+    return (dt - EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def find_inputs(data_dir: str, patterns=(), channels=()):
+    """
+    (path, channel) of the AVRO files to pivot, in name order: glob patterns,
+    channel directories under data_dir, or by default every file in data_dir.
+    A file's channel is its directory (files directly in data_dir are unassigned).
+    """
+    root = os.path.abspath(data_dir)
+
+    def channel_of(path):
+        parent = os.path.dirname(os.path.abspath(path))
+        return UNASSIGNED if parent == root else os.path.basename(parent)
+
+    paths = []
+    for pattern in patterns:
+        paths += sorted(glob.glob(pattern, recursive=True))
+    for channel in channels:
+        paths += sorted(glob.glob(os.path.join(data_dir, channel, '*.avro')))
+    if not patterns and not channels:
+        paths = sorted(glob.glob(os.path.join(data_dir, '*.avro'))) + \
+            sorted(glob.glob(os.path.join(data_dir, '*', '*.avro')))
+
+    unique = {}
+    for path in paths:
+        if path.endswith('.avro'):
+            unique.setdefault(os.path.abspath(path), channel_of(path))
+    return list(unique.items())
+
+
+def load_sources(h5file) -> Dict[str, Dict]:
+    """Input files already pivoted into an output file (latest entry per path)."""
+    if SOURCES_DATASET not in h5file:
+        return {}
+    sources = {}
+    for line in h5file[SOURCES_DATASET].asstr()[:]:
+        entry = json.loads(line)
+        sources[entry['path']] = entry
+    return sources
+
+
+def record_source(h5file, entry: Dict):
+    if SOURCES_DATASET not in h5file:
+        h5file.create_dataset(SOURCES_DATASET, shape=(0,), maxshape=(None,), dtype=STRING_DTYPE,
+                              chunks=(256,))
+    dset = h5file[SOURCES_DATASET]
+    dset.resize((dset.shape[0] + 1,))
+    dset[-1] = json.dumps(entry, sort_keys=True)
+
+
+def pivot_task(task):
+    """Worker: pivot one input file into a scratch shard. Returns the task with its results."""
+    source, channel, shard, schema, fields, start, end, skip, batch_bytes, chunk_rows = task
+    rows = pivot_file(source, shard, schema, fields, batch_bytes, chunk_rows, start=start, end=end, skip=skip)
+    last_time = last_time_rows = None
+    if rows:
+        with h5py.File(shard, 'r') as f:
+            last_time = int(f[SHARD_GROUP].attrs['last_time'])
+            last_time_rows = int(f[SHARD_GROUP].attrs['last_time_rows'])
+    return source, channel, shard, rows, last_time, last_time_rows
+
+
+def batch_pivot(inputs, output: str, schema=None, signals=None, start=None, end=None, workers: int = 1,
+                batch_bytes: Optional[int] = None, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Dict:
+    """
+    Pivot (path, channel) inputs into output, appending to what it holds.
+    Returns totals: files, records, bytes (input), seconds.
+    """
+    began = time.perf_counter()
+    totals = {'files': 0, 'records': 0, 'bytes': 0, 'seconds': 0.0}
+    selection = json.dumps({'signals': signals, 'start': start, 'end': end}, sort_keys=True)
+
+    writer = Hdf5StreamWriter.append_to(output, chunk_rows)
+    try:
+        previous = writer.file.attrs.get('selection')
+        if previous is not None and previous != selection:
+            raise ValueError(f"{output} was pivoted with another signal/time selection ({previous})")
+        writer.file.attrs['selection'] = selection
+        sources = load_sources(writer.file)
+
+        scratch = tempfile.mkdtemp(prefix='catcol_', dir=os.path.dirname(os.path.abspath(output)))
+        tasks, pending = [], {}
+        for i, (path, channel) in enumerate(inputs):
+            st = os.stat(path)
+            seen = sources.get(path)
+            if seen and seen['size'] == st.st_size and seen['mtime_ns'] == st.st_mtime_ns:
+                continue
+            # A grown file only contributes rows after those already pivoted: from
+            # the last pivoted time on (more rows may share it), less those seen
+            file_start, skip = start, 0
+            if seen and seen.get('last_time') is not None:
+                resume = seen['last_time']
+                if start is None or start <= resume:
+                    file_start, skip = resume, seen.get('last_time_rows', 0)
+            pending[path] = (st, seen)
+            tasks.append((path, channel, os.path.join(scratch, f'{i}.h5'), schema, signals, file_start, end,
+                          skip, batch_bytes, chunk_rows))
+
+        executor = ProcessPoolExecutor(workers) if workers > 1 and len(tasks) > 1 else None
+        try:
+            results = executor.map(pivot_task, tasks) if executor else map(pivot_task, tasks)
+            # Appended in input order as workers finish
+            for source, channel, shard, rows, last_time, last_time_rows in results:
+                for columns in read_shard(shard, batch_bytes=batch_bytes):
+                    writer.append(channel, columns)
+                os.unlink(shard)
+
+                st, seen = pending[source]
+                seen_last = (seen or {}).get('last_time')
+                if last_time is None:
+                    last_time, last_time_rows = seen_last, (seen or {}).get('last_time_rows', 0)
+                elif last_time == seen_last:
+                    last_time_rows += seen.get('last_time_rows', 0)
+                record_source(writer.file, {
+                    'path': source,
+                    'channel': channel,
+                    'size': st.st_size,
+                    'mtime_ns': st.st_mtime_ns,
+                    'rows': rows + (seen['rows'] if seen else 0),
+                    'last_time': last_time,
+                    'last_time_rows': last_time_rows,
+                })
+                totals['files'] += 1
+                totals['records'] += rows
+                totals['bytes'] += st.st_size - (seen['size'] if seen else 0)
+                print(f"{source}: {rows} records -> {channel}")
+        finally:
+            if executor:
+                executor.shutdown()
+            shutil.rmtree(scratch, ignore_errors=True)
+    finally:
+        writer.close()
+
+    totals['seconds'] = time.perf_counter() - began
+    return totals
+
 
-# Paths to input Avro file and output HDF5 file
-hdf5_file = "data/data.h5"
-signal_name = "time"
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pivot relay AVRO files into a columnar HDF5 file")
+    parser.add_argument('inputs', nargs='*', help="AVRO files or glob patterns (default: all of --data)")
+    parser.add_argument('-o', '--output', default='data/data.h5', help="HDF5 file to create or append to")
+    parser.add_argument('--data', default='data', help="Storage directory (one subdirectory per channel)")
+    parser.add_argument('-c', '--channel', action='append', default=[], help="Channel to pivot (repeatable)")
+    parser.add_argument('-s', '--signals', help="Comma-separated signals (default: all)")
+    parser.add_argument('--start', help="ISO 8601 start time (default: beginning)")
+    parser.add_argument('--end', help="ISO 8601 end time (default: end)")
+    parser.add_argument('--schema', help="AVRO schema (.avsc) of headerless relay files")
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument('--batch-bytes', type=int, default=16 * 1024 * 1024,
+                        help="Raw AVRO bytes decoded per batch")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help="HDF5 chunk size in rows")
+    args = parser.parse_args(argv)
 
-# Open Avro file and extract signal data
-signal_data = []
+    schema = None
+    if args.schema:
+        with open(args.schema, 'r', encoding='utf-8') as f:
+            schema = json.load(f)
+    signals = [s.strip() for s in args.signals.split(',')] if args.signals else None
 
-for filename in os.listdir('data'):
-    if filename.endswith('.avro'): 
-        with open('data/' + filename, "rb") as f:
-            print(filename)
-            # Open Avro file using DataFileReader
-            reader = avro.datafile.DataFileReader(f, avro.io.DatumReader())
+    inputs = find_inputs(args.data, args.inputs, args.channel)
+    if not inputs:
+        parser.error("No AVRO files selected")
 
-            for record in reader:
-                if signal_name in record:
-                    signal_data.append(record[signal_name])
+    totals = batch_pivot(inputs, args.output, schema, signals, parse_time(args.start), parse_time(args.end),
+                         args.workers, args.batch_bytes, args.chunk_rows)
 
-            reader.close()
+    seconds = max(totals['seconds'], 1e-9)
+    print(f"Pivoted {totals['records']} records from {totals['files']} files "
+          f"({totals['bytes'] / 1e6:.1f} MB) into {args.output} in {seconds:.2f} s: "
+          f"{totals['records'] / seconds:,.0f} records/s, {totals['bytes'] / 1e6 / seconds:.1f} MB/s")
 
-# Write the signal to an HDF5 file
-with h5py.File(hdf5_file, "w") as hf:
-    hf.create_dataset(signal_name, data=signal_data, compression="gzip")
 
-print(f"Signal '{signal_name}' written to {hdf5_file}.")
+if __name__ == '__main__':
+    main()
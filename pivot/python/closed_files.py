@@ -0,0 +1,143 @@
+"""
+Background processing of closed relay files
+Base for services that derive one HDF5 file per rotated (closed) AVRO file
+(rollups, columnar shards): a daemon thread refreshes the catalog
+incrementally, builds what is new or changed, and deletes outputs whose
+source files are gone.
+
+Outputs mirror the storage layout under their own directory and record the
+source's mtime and size (attributes source_mtime_ns / source_size), so they
+are picked up again after a restart and never used for a changed source.
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import h5py
+
+
+class ClosedFileService:
+    """Keeps one derived file per closed catalog file current, from a background thread"""
+
+    name = 'closed-file'
+    suffix = '.h5'
+
+    def __init__(self, catalog, directory: str, schema_for: Optional[Callable] = None,
+                 interval: float = 60, batch_bytes: Optional[int] = None):
+        self.catalog = catalog
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.schema_for = schema_for or (lambda channel: None)  # schemas of headerless files
+        self.interval = interval
+        self.batch_bytes = batch_bytes
+        self._lock = threading.Lock()
+        self._built: Dict[str, tuple] = {}  # source path -> (mtime_ns, size) built from
+        self._stop = threading.Event()
+        self._thread = None
+        self.built = 0
+        self.failed = 0
+        self._load()
+
+    def build(self, source_path: str, output_path: str, schema):
+        """Derive output_path from one closed AVRO file (written atomically)."""
+        raise NotImplementedError
+
+    def output_path(self, source_path: str) -> str:
+        relative = os.path.relpath(source_path, self.catalog.avro_path)
+        return str(self.directory / (relative + self.suffix))
+
+    def _load(self):
+        """Pick up outputs of a previous run (unfinished ones are dropped)."""
+        for path in self.directory.rglob('*' + self.suffix + '.part'):
+            path.unlink()
+        for path in self.directory.rglob('*' + self.suffix):
+            relative = str(path.relative_to(self.directory))[:-len(self.suffix)]
+            try:
+                with h5py.File(path, 'r') as f:
+                    identity = (int(f.attrs['source_mtime_ns']), int(f.attrs['source_size']))
+            except (OSError, KeyError):
+                path.unlink()
+                continue
+            self._built[os.path.join(self.catalog.avro_path, relative)] = identity
+
+    def current(self, entries: List[Dict]) -> Dict[str, str]:
+        """Source path -> output path for closed entries built in their current state."""
+        usable = {}
+        with self._lock:
+            for entry in entries:
+                if entry['closed'] and self._built.get(entry['path']) == (entry['mtime_ns'], entry['bytes']):
+                    usable[entry['path']] = self.output_path(entry['path'])
+        return usable
+
+    def run_once(self) -> int:
+        """Build outputs of new or changed closed files, drop those of removed ones. Returns files built."""
+        self.catalog.refresh_all()
+        entries = self.catalog.closed_files()
+        built = 0
+        for entry in entries:
+            path = entry['path']
+            with self._lock:
+                if self._built.get(path) == (entry['mtime_ns'], entry['bytes']):
+                    continue
+            try:
+                self.build(path, self.output_path(path), self.schema_for(entry['channel']))
+            except Exception as e:
+                print(f"Warning: {self.name} failed for {path}: {e}")
+                self.failed += 1
+                continue
+            with self._lock:
+                self._built[path] = (entry['mtime_ns'], entry['bytes'])
+            built += 1
+        self.built += built
+
+        # Storage is ephemeral: outputs go when their source files do
+        present = {entry['path'] for entry in entries}
+        with self._lock:
+            for path in [p for p in self._built if p not in present]:
+                del self._built[path]
+                try:
+                    os.unlink(self.output_path(path))
+                except FileNotFoundError:
+                    pass
+        return built
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f'pivot-{self.name}', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Warning: {self.name} pass failed: {e}")
+            self._stop.wait(self.interval)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'files': len(self._built), 'built': self.built, 'failed': self.failed}
+
+
+def write_atomically(output_path: str, write: Callable, source_path: str):
+    """
+    Run write(h5file) on a temp file next to output_path, stamp the source
+    identity and move it into place.
+    """
+    st = os.stat(source_path)
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    partial = output_path + '.part'
+    try:
+        with h5py.File(partial, 'w') as f:
+            f.attrs['source_mtime_ns'] = st.st_mtime_ns
+            f.attrs['source_size'] = st.st_size
+            write(f)
+    except BaseException:
+        if os.path.exists(partial):
+            os.unlink(partial)
+        raise
+    os.replace(partial, output_path)
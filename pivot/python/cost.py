@@ -0,0 +1,239 @@
+"""
+Pivot export cost estimation and admission control
+Predicts what an export costs from catalog metadata alone (bytes and record
+counts of the files in range, the requested signals) and admits exports
+against the server's CPU and memory budgets: an export runs if it fits next
+to those already running, waits in a bounded queue if not, and is rejected
+if it can never fit (or would run past the synchronous time limit).
+
+The model is linear: decoding AVRO costs per byte read (framing, skipping
+unrequested fields) plus per value decoded (record x signal); shards cost
+per value and rollups per bucket. Output size is counted uncompressed.
+Rates come from config (api.admission) and only need to be roughly right
+for the hardware: estimates rank requests, they are not promises.
+"""
+import threading
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from aggregate import STATISTICS
+from catalog import overlap_bytes, overlap_records
+from catcol import STRING_ROW_BYTES
+from decoder import DTYPES
+from export import DEFAULT_BATCH_BYTES, ChannelJob, job_fields
+from virtual_set import VIRTUAL_FORMAT
+
+DEFAULT_SCAN_BYTES_PER_SECOND = 500 * 1024 * 1024
+DEFAULT_VALUES_PER_SECOND = 100_000_000
+
+ADMIT = 'admit'
+QUEUE = 'queue'
+REJECT = 'reject'
+
+# input_bytes: AVRO bytes to decode, records / values: rows and row x signal
+# values in the window, output_bytes: uncompressed result, cpu_seconds: total
+# work, cores: channels decoding at once, seconds: predicted wall time,
+# memory_bytes: predicted peak memory
+ExportEstimate = namedtuple('ExportEstimate', ['input_bytes', 'records', 'values', 'output_bytes',
+                                               'cpu_seconds', 'cores', 'seconds', 'memory_bytes'])
+
+
+def row_bytes(fields) -> int:
+    """Bytes of one output row of (name, kind) fields."""
+    return sum(np.dtype(DTYPES[kind]).itemsize if kind in DTYPES else STRING_ROW_BYTES
+               for _, kind in fields)
+
+
+class CostModel:
+    """Linear cost model of channel jobs, from catalog entries"""
+
+    def __init__(self, scan_bytes_per_second: float = DEFAULT_SCAN_BYTES_PER_SECOND,
+                 values_per_second: float = DEFAULT_VALUES_PER_SECOND, workers: int = 1,
+                 batch_bytes: int = DEFAULT_BATCH_BYTES, memory_max_bytes: int = 0):
+        self.scan_bytes_per_second = scan_bytes_per_second
+        self.values_per_second = values_per_second
+        self.workers = workers
+        self.batch_bytes = batch_bytes
+        self.memory_max_bytes = memory_max_bytes  # exports with less input are built in memory
+
+    def channel(self, job: ChannelJob, entries: List[Dict], fmt: str = 'hdf5') -> ExportEstimate:
+        """Estimate one channel job; entries are the catalog entries of its files."""
+        raw_fields = job_fields(job._replace(resolution=0))
+        width = len(raw_fields)
+        shards, rollups = job.shards or {}, job.rollups or {}
+
+        scan = records = values = output_rows = 0
+        for entry in entries:
+            path = entry['path']
+            rows = overlap_records(entry, job.start, job.end)
+            records += rows
+            if path in rollups:
+                # Rollups are only used for files inside the window
+                span = entry['last_time'] - entry['first_time']
+                values += min(rows, span // job.resolution + 1) * width * len(STATISTICS)
+                continue
+            values += rows * width
+            if path not in shards:
+                scan += overlap_bytes(entry, job.start, job.end)
+            if fmt != VIRTUAL_FORMAT or path not in shards:
+                output_rows += rows  # virtual sets only copy rows without a shard
+
+        if job.resolution:
+            buckets = records if job.start is None or job.end is None \
+                else (job.end - job.start) // job.resolution + 1
+            output = min(records, buckets) * row_bytes(job_fields(job))
+        else:
+            output = output_rows * row_bytes(raw_fields)
+
+        # One batch of AVRO bytes in flight, plus the columns decoded from it
+        batch = min(scan, self.batch_bytes)
+        input_bytes = sum(entry['bytes'] for entry in entries)
+        expansion = row_bytes(raw_fields) * max(records, 1) / max(input_bytes, 1)
+        memory = int(batch * (1 + expansion))
+
+        cpu = scan / self.scan_bytes_per_second + values / self.values_per_second
+        return ExportEstimate(scan, records, values, output, cpu, 1, cpu, memory)
+
+    def estimate(self, jobs: List[ChannelJob], estimates: List[ExportEstimate]) -> ExportEstimate:
+        """Whole export from its channels' estimates (channels run on the worker pool)."""
+        if not estimates:
+            return ExportEstimate(0, 0, 0, 0, 0.0, 0, 0.0, 0)
+        cores = max(1, min(self.workers, len(estimates)))
+        cpu = sum(e.cpu_seconds for e in estimates)
+        output = sum(e.output_bytes for e in estimates)
+        memory = sum(sorted((e.memory_bytes for e in estimates), reverse=True)[:cores])
+        if sum(job.size for job in jobs) <= self.memory_max_bytes:
+            memory += output  # built in memory, not in a spool file
+        seconds = max(cpu / cores, max(e.seconds for e in estimates))
+        return ExportEstimate(sum(e.input_bytes for e in estimates), sum(e.records for e in estimates),
+                              sum(e.values for e in estimates), output, cpu, cores, seconds, memory)
+
+
+class AdmissionRejected(Exception):
+    """Export can never fit the budgets (or the time limit); the message says which."""
+
+
+class AdmissionBusy(Exception):
+    """Admission queue full or wait timed out; retry later."""
+
+
+class _Ticket:
+    def __init__(self, cores: int, memory: int, background: bool = False):
+        self.cores = cores
+        self.memory = memory
+        self.background = background
+
+
+class AdmissionControl:
+    """
+    Runs exports within core and memory budgets, queueing the rest in arrival
+    order. Background jobs wait in a queue of their own, behind every waiting
+    interactive export, so a large job never holds up interactive ones.
+    """
+
+    def __init__(self, cores: int, memory_bytes: int, max_queued: int = 32, max_wait: float = 30):
+        self.cores = max(1, cores)
+        self.memory_bytes = memory_bytes
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._queue: deque = deque()
+        self._jobs: deque = deque()  # background tickets
+        self._cores_used = 0
+        self._memory_used = 0
+        self._running = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _ticket(self, estimate: ExportEstimate) -> _Ticket:
+        return _Ticket(min(self.cores, max(1, estimate.cores)), estimate.memory_bytes)
+
+    def _fits(self, ticket: _Ticket) -> bool:
+        return (self._cores_used + ticket.cores <= self.cores
+                and self._memory_used + ticket.memory <= self.memory_bytes)
+
+    def _ready(self, ticket: _Ticket) -> bool:
+        """Head of its queue (jobs: with no interactive export waiting) and fits."""
+        if ticket.background:
+            return not self._queue and self._jobs[0] is ticket and self._fits(ticket)
+        return self._queue[0] is ticket and self._fits(ticket)
+
+    def check(self, estimate: ExportEstimate, max_seconds: Optional[float] = None):
+        """Raise AdmissionRejected if the export can never be admitted."""
+        if estimate.memory_bytes > self.memory_bytes:
+            raise AdmissionRejected(f"Estimated memory {estimate.memory_bytes} bytes exceeds "
+                                    f"the budget of {self.memory_bytes} bytes")
+        if max_seconds is not None and estimate.seconds > max_seconds:
+            raise AdmissionRejected(f"Estimated time {estimate.seconds:.1f} s exceeds "
+                                    f"the limit of {max_seconds} s")
+
+    def decide(self, estimate: ExportEstimate, max_seconds: Optional[float] = None) -> str:
+        """What admit would do right now: ADMIT, QUEUE or REJECT (for dry runs)."""
+        try:
+            self.check(estimate, max_seconds)
+        except AdmissionRejected:
+            return REJECT
+        with self._cond:
+            if not self._queue and self._fits(self._ticket(estimate)):
+                return ADMIT
+            return QUEUE if len(self._queue) < self.max_queued else REJECT
+
+    @contextmanager
+    def admit(self, estimate: ExportEstimate, max_seconds: Optional[float] = None, wait: bool = True):
+        """
+        Hold the export's share of the budgets while the body runs. Waits in
+        arrival order for room (up to max_wait seconds, unless wait is False:
+        then as a background job, indefinitely, outside the queue limit and
+        behind any waiting interactive export).
+        """
+        try:
+            self.check(estimate, max_seconds)
+        except AdmissionRejected:
+            with self._cond:
+                self.rejected += 1
+            raise
+
+        ticket = self._ticket(estimate)
+        ticket.background = not wait
+        queue = self._jobs if ticket.background else self._queue
+        with self._cond:
+            if queue or (ticket.background and self._queue) or not self._fits(ticket):
+                if wait and len(self._queue) >= self.max_queued:
+                    self.rejected += 1
+                    raise AdmissionBusy(f"Admission queue full ({self.max_queued} exports waiting)")
+                self.queued += 1
+            queue.append(ticket)
+            ready = self._cond.wait_for(lambda: self._ready(ticket), self.max_wait if wait else None)
+            if not ready:
+                queue.remove(ticket)
+                self.timeouts += 1
+                self._cond.notify_all()
+                raise AdmissionBusy(f"No room for the export within {self.max_wait} s")
+            queue.popleft()
+            self._cores_used += ticket.cores
+            self._memory_used += ticket.memory
+            self._running += 1
+            self.admitted += 1
+            self._cond.notify_all()
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._cores_used -= ticket.cores
+                self._memory_used -= ticket.memory
+                self._running -= 1
+                self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {'running': self._running, 'waiting': len(self._queue), 'jobs_waiting': len(self._jobs),
+                    'cores_used': self._cores_used, 'cores': self.cores,
+                    'memory_used': self._memory_used, 'memory_bytes': self.memory_bytes,
+                    'admitted': self.admitted, 'queued': self.queued,
+                    'rejected': self.rejected, 'timeouts': self.timeouts}
@@ -0,0 +1,330 @@
+"""
+Schema-compiled columnar AVRO decoder
+Walks raw block bytes and writes each field straight into a typed NumPy
+column, one field at a time across all records (no per-record dicts).
+
+Every field is decoded for all records in one vectorized step, from each
+record's start. Files of the Python relay hold one record per block, so the
+block starts are the record starts. The C relay groups up to block_records
+records (1000 by default) into a block, so the starts of the records
+inside blocks are found first by a skip-only pass in lanes: the k-th
+record of every block is stepped over in one vectorized step. When records
+are evenly spaced, fixed-width columns come out as strided views of the
+input buffer instead of copies.
+"""
+import json
+from functools import lru_cache
+
+import numpy as np
+
+# Fixed-width and varint primitive types -> column dtype
+DTYPES = {
+    'long': np.int64,
+    'int': np.int32,
+    'double': np.float64,
+    'float': np.float32,
+    'boolean': np.bool_,
+}
+FIXED_WIDTH = {'double': (8, np.float64), 'float': (4, np.float32), 'boolean': (1, np.uint8)}
+VARINT_TYPES = ('long', 'int')
+BYTES_TYPES = ('string', 'bytes')
+MAX_VARINT_BYTES = 10
+
+
+class UnsupportedSchema(ValueError):
+    """Schema uses types the compiled decoder does not handle (unions, nesting)."""
+
+
+class StringColumn:
+    """Variable-length column stored as offsets (n + 1) into a byte buffer."""
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def gather(cls, buf: np.ndarray, positions: np.ndarray, lengths: np.ndarray):
+        """Build from (position, length) slices of buf."""
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        index = np.repeat(positions - offsets[:-1], lengths) + np.arange(offsets[-1], dtype=np.int64)
+        return cls(offsets, buf[index])
+
+    @classmethod
+    def from_strings(cls, values):
+        """Build from str or bytes values (e.g. read back from HDF5)."""
+        encoded = [v.encode('utf-8') if isinstance(v, str) else bytes(v) for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+        return cls(offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+    @classmethod
+    def concat(cls, columns):
+        """Concatenate several string columns."""
+        columns = list(columns)
+        data = np.concatenate([c.data for c in columns]) if columns else np.empty(0, np.uint8)
+        offsets = [np.zeros(1, dtype=np.int64)]
+        base = 0
+        for c in columns:
+            offsets.append(c.offsets[1:] + base)
+            base += c.offsets[-1]
+        return cls(np.concatenate(offsets), data)
+
+    def __getitem__(self, selection):
+        """Select rows with a boolean mask or index array; int returns one str."""
+        if isinstance(selection, (int, np.integer)):
+            return bytes(self.data[self.offsets[selection]:self.offsets[selection + 1]]).decode('utf-8')
+        starts = self.offsets[:-1][selection]
+        lengths = np.diff(self.offsets)[selection]
+        return StringColumn.gather(self.data, starts, lengths)
+
+    def tolist(self):
+        return [self[i] for i in range(len(self))]
+
+
+def read_varints(buf: np.ndarray, pos: np.ndarray):
+    """Vectorized zigzag varint decode at each position. Returns (values, next_pos)."""
+    accum = np.zeros(len(pos), dtype=np.uint64)
+    nxt = pos.copy()
+    pending = np.arange(len(pos))
+    for shift in range(0, 7 * MAX_VARINT_BYTES, 7):
+        if not len(pending):
+            break
+        byte = buf[nxt[pending]].astype(np.uint64)
+        accum[pending] |= (byte & np.uint64(0x7F)) << np.uint64(shift)
+        nxt[pending] += 1
+        pending = pending[byte >= 0x80]
+    if len(pending):
+        raise ValueError("Malformed varint in block data")
+    values = (accum >> np.uint64(1)).astype(np.int64) ^ -(accum & np.uint64(1)).astype(np.int64)
+    return values, nxt
+
+
+def skip_varints(buf: np.ndarray, pos: np.ndarray) -> np.ndarray:
+    """Advance past a varint at each position without decoding it."""
+    nxt = pos.copy()
+    pending = np.arange(len(pos))
+    for _ in range(MAX_VARINT_BYTES):
+        if not len(pending):
+            return nxt
+        byte = buf[nxt[pending]]
+        nxt[pending] += 1
+        pending = pending[byte >= 0x80]
+    if len(pending):
+        raise ValueError("Malformed varint in block data")
+    return nxt
+
+
+def read_fixed(buf: np.ndarray, pos: np.ndarray, width: int, dtype) -> np.ndarray:
+    """Gather width bytes at each position and reinterpret as dtype."""
+    if not len(pos):
+        return np.empty(0, dtype=dtype)
+    # Row gather on a sliding window view copies each slice as one run
+    rows = np.lib.stride_tricks.sliding_window_view(buf, width)[pos]
+    return np.ascontiguousarray(rows).view(np.dtype(dtype).newbyteorder('<')).ravel()
+
+
+def fixed_view(buf: np.ndarray, pos: np.ndarray, width: int, count: int, dtype):
+    """
+    Zero-copy (len(pos), count) view of count fields of width bytes at each
+    position, when positions are evenly spaced (fixed-size records). None
+    otherwise. The view shares buf's memory and is read-only.
+    """
+    if len(pos) < 2:
+        return None
+    stride = int(pos[1] - pos[0])
+    if stride < width * count or (np.diff(pos) != stride).any():
+        return None
+    try:
+        return np.ndarray((len(pos), count), dtype=np.dtype(dtype).newbyteorder('<'), buffer=buf,
+                          offset=int(pos[0]), strides=(stride, width))
+    except TypeError:
+        # Last field runs past the end of buf
+        return None
+
+
+class RecordDecoder:
+    """Decoder compiled once for a flat record schema of primitive fields."""
+
+    def __init__(self, schema: dict):
+        if schema.get('type') != 'record':
+            raise UnsupportedSchema("Top-level schema must be a record")
+
+        self.fields = []
+        for field in schema['fields']:
+            kind = field['type']
+            if isinstance(kind, dict):
+                kind = kind.get('type')
+            if not isinstance(kind, str) or kind not in DTYPES and kind not in BYTES_TYPES and kind != 'null':
+                raise UnsupportedSchema(f"Field {field['name']!r} has unsupported type {field['type']!r}")
+            self.fields.append((field['name'], kind))
+
+        self._plans = {}
+
+    def plan(self, fields=None):
+        """
+        Compiled decode plan for a projection (None = all fields), cached.
+
+        Runs of same-type fixed-width fields are read with one gather; fields
+        outside the projection are skipped at the byte level: adjacent
+        fixed-width fields collapse into one jump, varints and length-prefixed
+        strings only advance the position.
+        """
+        key = None if fields is None else frozenset(fields)
+        if key in self._plans:
+            return self._plans[key]
+
+        plan = []
+        for name, kind in self.fields:
+            keep = key is None or name in key
+            last = plan[-1] if plan else None
+            if kind in FIXED_WIDTH:
+                if not keep:
+                    width = FIXED_WIDTH[kind][0]
+                    if last and last[0] == 'skip':
+                        plan[-1] = ('skip', None, last[2] + width)
+                    else:
+                        plan.append(('skip', None, width))
+                elif last and last[0] == 'fixed' and last[1] == kind:
+                    last[2].append(name)
+                else:
+                    plan.append(('fixed', kind, [name]))
+            elif kind in VARINT_TYPES:
+                plan.append(('varint' if keep else 'skip_varint', kind, name))
+            elif kind in BYTES_TYPES:
+                plan.append(('bytes' if keep else 'skip_bytes', kind, name))
+
+        self._plans[key] = plan
+        return plan
+
+    @property
+    def names(self):
+        return [name for name, _ in self.fields]
+
+    def record_starts(self, buf: np.ndarray, starts, counts) -> np.ndarray:
+        """
+        Offset in buf of every record of blocks with counts records each.
+        Records are stepped over in lanes, the k-th record of every block at
+        a time, reading only varints and string lengths.
+        """
+        skip = self.plan(())
+        first_row = np.zeros(len(counts), dtype=np.int64)
+        np.cumsum(counts[:-1], out=first_row[1:])
+        positions = np.empty(int(counts.sum()), dtype=np.int64)
+
+        pos = starts.copy()
+        max_count = int(counts.max()) if len(counts) else 0
+        for k in range(max_count):
+            lanes = np.nonzero(counts > k)[0]
+            p = pos[lanes]
+            positions[first_row[lanes] + k] = p
+            if k == max_count - 1:
+                break
+            for op, _, target in skip:
+                if op == 'skip':
+                    p = p + target
+                elif op == 'skip_varint':
+                    p = skip_varints(buf, p)
+                else:
+                    lengths, p = read_varints(buf, p)
+                    p = p + lengths
+            pos[lanes] = p
+        return positions
+
+    def decode(self, buf: np.ndarray, starts, counts=None, fields=None) -> dict:
+        """
+        Decode blocks of records into columns.
+
+        buf: uint8 array holding the (decompressed) block data
+        starts: offset in buf of each block's first record
+        counts: records per block (default 1)
+        fields: names to decode (default all); others are skipped unread
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        if counts is not None:
+            counts = np.asarray(counts, dtype=np.int64)
+            if len(counts) and int(counts.max()) > 1:
+                starts = self.record_starts(buf, starts, counts)
+            elif len(counts) != int(counts.sum()):
+                starts = starts[counts > 0]  # empty blocks hold no record
+
+        # One record per start: nothing reads past the last decoded field
+        plan = self.plan(fields)
+        while plan and plan[-1][0].startswith('skip'):
+            plan = plan[:-1]
+
+        total = len(starts)
+        columns = {}
+        strings = {}
+        for name, kind in self.fields:
+            if fields is not None and name not in fields:
+                continue
+            if kind not in BYTES_TYPES and kind != 'null':
+                columns[name] = np.empty(total, dtype=DTYPES[kind])
+
+        p = starts
+        for op, kind, target in plan:
+            if op == 'varint':
+                columns[target][:], p = read_varints(buf, p)
+            elif op == 'fixed':
+                width, dtype = FIXED_WIDTH[kind]
+                values = fixed_view(buf, p, width, len(target), DTYPES[kind])
+                if values is not None:
+                    # Evenly spaced records: columns are strided views of buf
+                    for i, name in enumerate(target):
+                        columns[name] = values[:, i]
+                else:
+                    values = read_fixed(buf, p, width * len(target), dtype).reshape(len(p), len(target))
+                    for i, name in enumerate(target):
+                        columns[name][:] = values[:, i]
+                p = p + width * len(target)
+            elif op == 'bytes':
+                lengths, p = read_varints(buf, p)
+                strings[target] = (p, lengths)
+                p = p + lengths
+            elif op == 'skip':
+                p = p + target
+            elif op == 'skip_varint':
+                p = skip_varints(buf, p)
+            else:
+                lengths, p = read_varints(buf, p)
+                p = p + lengths
+
+        for name, (positions, lengths) in strings.items():
+            columns[name] = StringColumn.gather(buf, positions, lengths)
+
+        # Preserve schema field order
+        return {name: columns[name] for name in self.names if name in columns}
+
+
+@lru_cache(maxsize=64)
+def _compile(schema_json: str) -> RecordDecoder:
+    return RecordDecoder(json.loads(schema_json))
+
+
+def compile_schema(schema: dict) -> RecordDecoder:
+    """Compiled decoder for a schema, cached per distinct schema."""
+    return _compile(json.dumps(schema, sort_keys=True))
+
+
+def select_rows(columns: dict, selection) -> dict:
+    """Apply a row mask or index array to every column."""
+    return {name: column[selection] for name, column in columns.items()}
+
+
+def concat_columns(parts) -> dict:
+    """Concatenate column dicts (same fields) from several files."""
+    parts = [p for p in parts if p]
+    if not parts:
+        return {}
+    result = {}
+    for name in parts[0]:
+        values = [p[name] for p in parts if name in p]
+        if isinstance(values[0], StringColumn):
+            result[name] = StringColumn.concat(values)
+        else:
+            result[name] = np.concatenate(values)
+    return result
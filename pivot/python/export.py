@@ -0,0 +1,266 @@
+"""
+Pivot export pipeline
+Streams each channel's AVRO files into the output: an HDF5 group per
+channel, or rows of one Arrow IPC / Parquet table. With workers > 1,
+channels are decoded in a process pool: each worker writes its channel to a
+shard file and the main process only copies finished shards into the output.
+Closed files already pivoted by the background shard service (catcol.py)
+are sliced from their columnar shards; only the open tail is decoded, and
+of the file still being written only the blocks appended since the
+previous read (live_tail.py).
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from aggregate import AGGREGATES, Aggregator, aggregate_fields
+from arrow_writer import ArrowStreamWriter
+from avro_reader import iter_columns, read_header
+from catcol import read_shard
+from decoder import BYTES_TYPES, DTYPES
+from hdf5_writer import DEFAULT_CHUNK_ROWS, Hdf5StreamWriter
+from live_tail import DEFAULT_MAX_BYTES, configure, live_tails
+from merge import merge_batches, overlap_groups
+from rollup import read_rollup
+from virtual_set import VIRTUAL_FORMAT, write_virtual_set
+
+DEFAULT_BATCH_BYTES = 16 * 1024 * 1024
+
+# One channel of an export: files come from the catalog, times are Unix ns,
+# size is the estimated AVRO bytes in the window, resolution (ns) > 0 exports
+# per-bucket aggregates (default: all of AGGREGATES) instead of raw samples,
+# rollups maps files to rollup files standing in for them when aggregating,
+# shards maps closed files to their columnar shards (read instead of decoding),
+# times are the files' (first, last) record times: overlapping files are merged
+# by timestamp, dropping exact duplicate rows if dedupe, and live lists the
+# files the relay is still writing (read incrementally through live_tail)
+ChannelJob = namedtuple('ChannelJob', ['channel', 'files', 'schema', 'start', 'end', 'signals', 'size',
+                                       'resolution', 'aggregates', 'rollups', 'shards', 'times', 'dedupe',
+                                       'live'],
+                        defaults=(0, 0, None, None, None, None, False, None))
+
+
+def job_fields(job: ChannelJob, time_field: str = 'time'):
+    """(name, kind) of the primitive fields a channel job exports, in schema order."""
+    schema = job.schema
+    if schema is None and job.files:
+        with open(job.files[0], 'rb') as f:
+            schema = read_header(f).schema
+    if schema is None:
+        return []
+
+    wanted = None if job.signals is None else set(job.signals) | {time_field}
+    fields = []
+    for field in schema.get('fields', []):
+        kind = field['type']
+        if isinstance(kind, dict):
+            kind = kind.get('type')
+        if kind in DTYPES or kind in BYTES_TYPES:
+            if wanted is None or field['name'] in wanted:
+                fields.append((field['name'], kind))
+    if job.resolution:
+        return aggregate_fields(fields, job.aggregates or AGGREGATES, time_field)
+    return fields
+
+
+def union_fields(jobs):
+    """Fields of all channel jobs (first definition of a name wins)."""
+    fields = {}
+    for job in jobs:
+        for name, kind in job_fields(job):
+            fields.setdefault(name, kind)
+    return list(fields.items())
+
+
+def open_writer(target, fmt: str, chunk_rows: int, fields=None, channels=None):
+    """Export writer for a format: 'hdf5', 'arrow', 'arrow-file' or 'parquet'."""
+    if fmt == 'hdf5':
+        return Hdf5StreamWriter.create(target, chunk_rows)
+    return ArrowStreamWriter(target, fmt, fields, channels)
+
+
+def iter_file_batches(job: ChannelJob, file_path: str, batch_bytes=DEFAULT_BATCH_BYTES):
+    """
+    Yield column batches of one file within the job's time range (warns on
+    failure): sliced from its shard if pivoted, from the kept live tail if
+    still being written, otherwise decoded.
+    """
+    shard = (job.shards or {}).get(file_path)
+    try:
+        if shard is not None:
+            yield from read_shard(shard, job.start, job.end, job.signals, batch_bytes)
+        elif file_path in (job.live or ()):
+            yield from live_tails.iter_columns(file_path, job.start, job.end, job.schema, fields=job.signals,
+                                               batch_bytes=batch_bytes)
+        else:
+            yield from iter_columns(file_path, job.start, job.end, job.schema, fields=job.signals,
+                                    batch_bytes=batch_bytes)
+    except Exception as e:
+        print(f"Warning: Failed to read {file_path}: {e}")
+
+
+def iter_group_batches(job: ChannelJob, group, batch_bytes=DEFAULT_BATCH_BYTES):
+    """Yield time-ordered column batches of a run of overlapping files."""
+    if len(group) == 1:
+        return iter_file_batches(job, group[0], batch_bytes)
+    return merge_batches([iter_file_batches(job, path, batch_bytes) for path in group], dedupe=job.dedupe)
+
+
+def iter_aggregated_batches(job: ChannelJob, batch_bytes=DEFAULT_BATCH_BYTES):
+    """Yield per-bucket aggregates, from rollups where the job has them."""
+    aggregator = Aggregator(job.resolution, job.aggregates or AGGREGATES)
+    wanted = None if job.signals is None else set(job.signals)
+    rollups = job.rollups or {}
+    for group in overlap_groups(job.files, job.times):
+        file_path = group[0]
+        if len(group) == 1 and file_path in rollups:
+            try:
+                times, count, stats = read_rollup(rollups[file_path], job.resolution)
+            except Exception as e:
+                print(f"Warning: Failed to read rollup of {file_path}: {e}")
+            else:
+                if wanted is not None:
+                    stats = {key: values for key, values in stats.items() if key[0] in wanted}
+                done = aggregator.add_statistics(times, count, stats)
+                if done is not None:
+                    yield done
+                continue
+
+        for columns in iter_group_batches(job, group, batch_bytes):
+            done = aggregator.add(columns)
+            if done is not None:
+                yield done
+
+    done = aggregator.finish()
+    if done is not None:
+        yield done
+
+
+def iter_channel_batches(job: ChannelJob, batch_bytes=DEFAULT_BATCH_BYTES):
+    """
+    Yield column batches of a channel's files within the job's time range,
+    in time order (overlapping files are merged).
+    """
+    if job.resolution:
+        yield from iter_aggregated_batches(job, batch_bytes)
+        return
+    for group in overlap_groups(job.files, job.times):
+        yield from iter_group_batches(job, group, batch_bytes)
+
+
+def write_channel(writer: Hdf5StreamWriter, job: ChannelJob, batch_bytes=DEFAULT_BATCH_BYTES) -> int:
+    """Decode and append one channel, one bounded batch at a time. Returns rows written."""
+    writer.add_channel(job.channel)
+    if not job.files:
+        print(f"Warning: No AVRO files found for channel {job.channel}")
+        return 0
+
+    for columns in iter_channel_batches(job, batch_bytes):
+        writer.append(job.channel, columns)
+
+    rows = writer.rows[job.channel]
+    if not rows:
+        print(f"Warning: No records found in time range for channel {job.channel}")
+    return rows
+
+
+def write_shard(job: ChannelJob, shard_path: str, batch_bytes: int, chunk_rows: int,
+                fmt: str = 'hdf5', fields=None, channels=None) -> int:
+    """
+    Worker entry point: write one channel to its own shard file
+    (HDF5 for HDF5 exports, an Arrow IPC file otherwise).
+    """
+    writer = open_writer(shard_path, 'hdf5' if fmt == 'hdf5' else 'arrow-file', chunk_rows, fields, channels)
+    try:
+        return write_channel(writer, job, batch_bytes)
+    finally:
+        writer.close()
+
+
+class ExportPool:
+    """Writes exports, fanning channels out to worker processes when configured."""
+
+    def __init__(self, workers: int = 0, batch_bytes: int = DEFAULT_BATCH_BYTES,
+                 chunk_rows: int = DEFAULT_CHUNK_ROWS, scratch_dir=None,
+                 live_tail_bytes: int = DEFAULT_MAX_BYTES):
+        self.workers = workers
+        self.batch_bytes = batch_bytes
+        self.chunk_rows = chunk_rows
+        self.scratch_dir = scratch_dir
+        # The live-tail budget is shared by this process and its workers
+        self.live_tail_bytes = live_tail_bytes // (workers + 1) if workers > 1 else live_tail_bytes
+        self._executor = None
+        configure(self.live_tail_bytes)
+
+    @property
+    def executor(self):
+        """Process pool, started on first parallel export (spawn: the server is threaded)."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=configure, initargs=(self.live_tail_bytes,))
+        return self._executor
+
+    def write(self, target, jobs, fmt: str = 'hdf5', progress=None):
+        """
+        Write the channels of jobs (in order) to a new export file
+        ('hdf5-virtual' maps columnar shards instead of copying rows).
+        target is a path or a writable binary file object (e.g. io.BytesIO).
+        Worker shards go to scratch_dir (default: system temp directory).
+        progress, if given, is called with (channels_done, channels_total).
+        """
+        # A channel listed twice is exported once
+        unique = {}
+        for job in jobs:
+            unique.setdefault(job.channel, job)
+        jobs = list(unique.values())
+
+        if fmt == VIRTUAL_FORMAT:
+            write_virtual_set(target, jobs, lambda job, group: iter_group_batches(job, group, self.batch_bytes),
+                              self.chunk_rows, progress)
+            return
+
+        # Arrow and Parquet need the whole schema up front
+        fields = union_fields(jobs) if fmt != 'hdf5' else None
+        channels = [job.channel for job in jobs]
+
+        if self.workers <= 1 or len(jobs) <= 1:
+            writer = open_writer(target, fmt, self.chunk_rows, fields, channels)
+            try:
+                for done, job in enumerate(jobs, 1):
+                    write_channel(writer, job, self.batch_bytes)
+                    if progress:
+                        progress(done, len(jobs))
+            finally:
+                writer.close()
+            return
+
+        shard_dir = tempfile.mkdtemp(prefix='pivot_shards_', dir=self.scratch_dir)
+        try:
+            futures = []
+            for i, job in enumerate(jobs):
+                shard_path = os.path.join(shard_dir, f'{i}.shard')
+                futures.append((job, shard_path, self.executor.submit(
+                    write_shard, job, shard_path, self.batch_bytes, self.chunk_rows, fmt, fields, channels)))
+
+            # Merge in request order; shards are copied without decoding
+            writer = open_writer(target, fmt, self.chunk_rows, fields, channels)
+            try:
+                for done, (job, shard_path, future) in enumerate(futures, 1):
+                    future.result()
+                    writer.merge(shard_path, job.channel)
+                    os.unlink(shard_path)
+                    if progress:
+                        progress(done, len(jobs))
+            finally:
+                writer.close()
+        finally:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
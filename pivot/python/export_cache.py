@@ -0,0 +1,164 @@
+"""
+Pivot Export Cache
+Disk-backed cache of finished export files, keyed by the request and the
+identity (size, mtime) of every contributing AVRO file. A file that grows
+(the relay's open file) changes the key, so stale results are never served.
+Least recently used entries are evicted to stay under a byte budget.
+
+Entries are handed out as open files and added as hard links, so an entry
+evicted while a response is still sending it stays readable until the
+response closes it.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional
+
+CACHE_SUFFIX = '.export'  # any export format
+
+
+def file_identity(paths: List[str]) -> List[list]:
+    """(path, size, mtime_ns) of each file; missing files are marked as such."""
+    identity = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            identity.append([path, st.st_size, st.st_mtime_ns])
+        except FileNotFoundError:
+            identity.append([path, None, None])
+    return identity
+
+
+class ExportCache:
+    """LRU cache of export files under a byte budget"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Rebuild LRU order from the previous run (oldest access first)
+        existing = sorted(self.directory.glob('*' + CACHE_SUFFIX), key=lambda p: p.stat().st_mtime_ns)
+        for path in existing:
+            self._entries[path.stem] = path.stat().st_size
+        with self._lock:
+            self._evict()
+
+    @property
+    def size(self) -> int:
+        return sum(self._entries.values())
+
+    @staticmethod
+    def key(channels: List[str], signals: Optional[List[str]], start: int, end: int,
+            options: Dict, files: List[str]) -> str:
+        """Cache key of a normalized export request and its contributing files."""
+        request = {
+            'channels': sorted(set(channels)),
+            'signals': sorted(set(signals)) if signals is not None else None,
+            'start': start,
+            'end': end,
+            'options': options,
+            'files': file_identity(sorted(files)),
+        }
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.directory / (key + CACHE_SUFFIX)
+
+    def get(self, key: str) -> Optional[BinaryIO]:
+        """
+        Cached export opened for reading (the caller closes it), or None.
+        Counts a hit or a miss.
+        """
+        with self._lock:
+            path = self.path(key)
+            if key in self._entries:
+                try:
+                    f = open(path, 'rb')
+                except FileNotFoundError:
+                    pass
+                else:
+                    self._entries.move_to_end(key)
+                    os.utime(path)
+                    self.hits += 1
+                    return f
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def contains(self, key: str) -> bool:
+        """True if an export is cached for key (no hit, miss or LRU update)."""
+        with self._lock:
+            return key in self._entries and self.path(key).exists()
+
+    def put(self, key: str, export_path: str) -> bool:
+        """
+        Add a finished export file (hard link, or a copy across file systems);
+        export_path itself is left to the caller. Returns False for exports
+        larger than the whole budget, which are not cached.
+        """
+        size = os.path.getsize(export_path)
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            path = self.path(key)
+            tmp = path.with_suffix('.part')
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            try:
+                os.link(export_path, tmp)
+            except OSError:
+                shutil.copyfile(export_path, tmp)
+            os.replace(tmp, path)
+            self._entries[key] = size
+            self._entries.move_to_end(key)
+            self._evict()
+            return True
+
+    def put_bytes(self, key: str, data: bytes):
+        """Store an export built in memory."""
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            path = self.path(key)
+            tmp = path.with_suffix('.part')
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            self._entries[key] = len(data)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until under budget (lock held)."""
+        total = self.size
+        while total > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            try:
+                os.unlink(self.path(key))
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+            }
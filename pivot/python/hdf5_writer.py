@@ -0,0 +1,95 @@
+"""
+Streaming HDF5 writer for pivot exports
+Appends column batches to chunked, resizable datasets (one group per channel,
+one dataset per signal), so an export never holds more than one batch.
+"""
+import h5py
+import numpy as np
+
+from decoder import StringColumn
+
+# Rows per HDF5 chunk (dataset growth and I/O granularity)
+DEFAULT_CHUNK_ROWS = 65536
+
+STRING_DTYPE = h5py.string_dtype(encoding='utf-8')
+
+
+class Hdf5StreamWriter:
+    """Append-only writer of per-channel signal columns into an open h5py.File"""
+
+    def __init__(self, h5file: h5py.File, chunk_rows: int = DEFAULT_CHUNK_ROWS):
+        self.file = h5file
+        self.chunk_rows = chunk_rows
+        self.rows = {}
+        self._owned = False
+
+    @classmethod
+    def create(cls, target, chunk_rows: int = DEFAULT_CHUNK_ROWS):
+        """Writer owning a new file (path or binary file object), closed by close()."""
+        writer = cls(h5py.File(target, 'w'), chunk_rows)
+        writer._owned = True
+        return writer
+
+    @classmethod
+    def append_to(cls, target, chunk_rows: int = DEFAULT_CHUNK_ROWS):
+        """Writer owning an existing (or new) file, appending after the rows already in it."""
+        writer = cls(h5py.File(target, 'a'), chunk_rows)
+        writer._owned = True
+        for name, grp in writer.file.items():
+            if isinstance(grp, h5py.Group):
+                writer.rows[name] = max((d.shape[0] for d in grp.values()), default=0)
+        return writer
+
+    def add_channel(self, channel: str) -> h5py.Group:
+        """Create the channel group (left empty if no batch is appended)."""
+        if channel not in self.file:
+            self.file.create_group(channel)
+            self.rows[channel] = 0
+        return self.file[channel]
+
+    def append(self, channel: str, columns: dict):
+        """Append one batch (field name -> NumPy array or StringColumn)."""
+        grp = self.add_channel(channel)
+        if not columns:
+            return
+        count = len(next(iter(columns.values())))
+        if not count:
+            return
+
+        offset = self.rows[channel]
+        for name, values in columns.items():
+            if isinstance(values, StringColumn):
+                values = np.array(values.tolist(), dtype=object)
+                dtype = STRING_DTYPE
+            else:
+                dtype = values.dtype
+
+            if name not in grp:
+                # Signals first seen in a later file start after the earlier rows
+                grp.create_dataset(name, shape=(offset,), maxshape=(None,), dtype=dtype,
+                                   chunks=(self.chunk_rows,))
+            dset = grp[name]
+            if dset.shape[0] < offset:
+                dset.resize((offset,))
+            dset.resize((offset + count,))
+            dset[offset:] = values
+
+        self.rows[channel] = offset + count
+
+    def finish(self):
+        """Pad signals missing from trailing batches so all datasets align."""
+        for channel, rows in self.rows.items():
+            for dset in self.file[channel].values():
+                if dset.shape[0] < rows:
+                    dset.resize((rows,))
+
+    def merge(self, shard_path: str, channel: str):
+        """Copy a channel group from a worker's shard file (no re-decode)."""
+        with h5py.File(shard_path, 'r') as shard:
+            self.file.copy(shard[channel], self.file, name=channel)
+            self.rows[channel] = max((d.shape[0] for d in shard[channel].values()), default=0)
+
+    def close(self):
+        self.finish()
+        if self._owned:
+            self.file.close()
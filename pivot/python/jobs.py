@@ -0,0 +1,228 @@
+"""
+Pivot Export Jobs
+Asynchronous export jobs: submitted jobs wait in a priority queue and run on
+a bounded pool of worker threads (the decode itself fans out to the export
+process pool). Clients poll or long-poll job status, then download the
+result, which is kept until it expires.
+
+Results live in the manager's directory and count against a byte quota:
+a job counts with its estimated size from submission until it finishes.
+Job state is in memory only, so results left by a previous run are
+deleted at startup.
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+RESULT_SUFFIX = '.result'
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    """Too many jobs waiting; submit again later."""
+
+
+class ResultsFull(QueueFull):
+    """Job results are at their byte quota; submit again once some expire."""
+
+
+class Job:
+    """One export job and its progress"""
+
+    def __init__(self, fn: Callable, priority: int = 0, meta: Optional[Dict] = None):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.priority = priority
+        self.meta = meta or {}
+        self.state = QUEUED
+        self.progress: Dict = {}
+        self.result: Optional[str] = None
+        self.result_bytes = 0  # estimated until finished, then the result's size
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.version = 0  # bumped on every change, for long-polling
+
+    @property
+    def done(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    def to_dict(self) -> Dict:
+        return {
+            'job_id': self.id,
+            'state': self.state,
+            'priority': self.priority,
+            'progress': dict(self.progress),
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'version': self.version,
+            **self.meta,
+        }
+
+
+class JobManager:
+    """Priority queue of jobs served by a bounded pool of worker threads"""
+
+    def __init__(self, workers: int = 2, max_queued: int = 100, result_ttl: float = 3600,
+                 directory: Optional[str] = None, max_result_bytes: int = 0):
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.directory = Path(directory) if directory else None
+        self.max_result_bytes = max_result_bytes  # 0 = unlimited
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # No job of a previous run can still be downloaded
+            for leftover in self.directory.glob('*' + RESULT_SUFFIX):
+                leftover.unlink()
+        self._jobs: Dict[str, Job] = {}
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f'export-job-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def result_bytes(self) -> int:
+        return sum(job.result_bytes for job in self._jobs.values())
+
+    def result_path(self, job: Job) -> str:
+        """Where fn(job) writes its result (counted and deleted with the job)."""
+        return str(self.directory / (job.id + RESULT_SUFFIX))
+
+    def submit(self, fn: Callable, priority: int = 0, meta: Optional[Dict] = None,
+               reserve_bytes: int = 0) -> Job:
+        """
+        Queue fn(job) -> result path. Higher priority runs first; equal
+        priorities run in submission order. reserve_bytes (the expected
+        result size) counts against the result quota until the job finishes.
+        """
+        self.expire()
+        with self._cond:
+            queued = sum(1 for job in self._jobs.values() if job.state == QUEUED)
+            if queued >= self.max_queued:
+                raise QueueFull(f"Export job queue full ({queued} jobs waiting)")
+            used = self.result_bytes
+            if self.max_result_bytes and used + reserve_bytes > self.max_result_bytes:
+                raise ResultsFull(f"Export job results full ({used} of {self.max_result_bytes} bytes, "
+                                  f"{reserve_bytes} needed)")
+            job = Job(fn, priority, meta)
+            job.result_bytes = reserve_bytes
+            self._jobs[job.id] = job
+            heapq.heappush(self._queue, (-priority, next(self._seq), job))
+            self._cond.notify_all()
+            return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, since_version: int = -1, timeout: float = 0) -> Optional[Job]:
+        """Long-poll: return once the job changed past since_version, finished, or timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None or job.done or job.version > since_version:
+                    return job
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return job
+                self._cond.wait(remaining)
+
+    def update(self, job: Job, **progress):
+        """Report progress of a running job."""
+        with self._cond:
+            job.progress.update(progress)
+            job.version += 1
+            self._cond.notify_all()
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancel a queued job, or drop a finished one and its result.
+        Running jobs are not interrupted; cancel again once finished.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.state == QUEUED:
+                job.state = CANCELLED
+                job.result_bytes = 0
+                job.finished = time.time()
+                job.version += 1
+                self._cond.notify_all()
+            elif job.done:
+                self._remove(job)
+            return job
+
+    def expire(self):
+        """Drop finished jobs (and their results) older than result_ttl."""
+        now = time.time()
+        with self._cond:
+            for job in list(self._jobs.values()):
+                if job.done and now - job.finished > self.result_ttl:
+                    self._remove(job)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            counts = {state: 0 for state in (QUEUED, RUNNING) + FINISHED_STATES}
+            for job in self._jobs.values():
+                counts[job.state] += 1
+            return {**counts, 'result_bytes': self.result_bytes, 'max_result_bytes': self.max_result_bytes}
+
+    def _remove(self, job: Job):
+        del self._jobs[job.id]
+        if job.result:
+            try:
+                os.unlink(job.result)
+            except FileNotFoundError:
+                pass
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._queue)
+                if job.state != QUEUED:
+                    continue
+                job.state = RUNNING
+                job.started = time.time()
+                job.version += 1
+                self._cond.notify_all()
+
+            try:
+                result, error, state = job.fn(job), None, DONE
+            except Exception as e:
+                result, error, state = None, str(e), FAILED
+            try:
+                size = os.path.getsize(result) if result else 0
+            except OSError:
+                size = 0
+
+            with self._cond:
+                job.result = result
+                job.result_bytes = size
+                job.error = error
+                job.state = state
+                job.finished = time.time()
+                job.version += 1
+                self._cond.notify_all()
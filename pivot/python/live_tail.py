@@ -0,0 +1,209 @@
+"""
+Live-tail reads of open relay files
+The file the relay is still writing holds the newest (most requested) data
+and has no shard, rollup or closing summary yet. LiveTail keeps, per open
+file, its decoded rows and the offset just past its last complete block:
+the next read only frames and decodes the bytes appended since. A trailing
+block cut short by the writer is left for the read after it is complete.
+
+Reads stay bounded like plain ones: appended bytes are decoded batch_bytes
+at a time, each batch is kept and its rows in the window yielded before the
+next is decoded, and decoding stops at the first batch past the window end.
+Only the requested fields (and time) are decoded and kept: a tail belongs to
+one file and projection, so reads of other signals keep their own.
+Kept rows are bounded by a byte budget shared by all tails: tails not read
+for the longest are forgotten first, then the oldest batches of the file
+being read are dropped (a read starting before the kept rows decodes the
+file from its time index again). A replaced or truncated file starts over.
+Every process keeps its own tails; export worker processes split the budget
+with the server (export.ExportPool).
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from avro_reader import iter_appended, iter_columns
+from decoder import StringColumn, UnsupportedSchema, concat_columns, select_rows
+from time_index import TimeIndex
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def column_bytes(columns: Dict) -> int:
+    """Memory held by a column dict."""
+    total = 0
+    for values in columns.values():
+        if isinstance(values, StringColumn):
+            total += values.offsets.nbytes + values.data.nbytes
+        else:
+            total += values.nbytes
+    return total
+
+
+class _Tail:
+    """Decoded rows of one open file and projection (batches in file order), from a block boundary up to offset"""
+
+    def __init__(self, identity):
+        self.identity = identity  # (st_dev, st_ino): a new file at the path starts over
+        self.lock = threading.Lock()
+        self.offset = None  # end of the last complete block decoded (None = nothing read)
+        self.parts = []  # column dicts owning their memory
+        self.whole = False  # rows start at the file's first block
+        self.nbytes = 0
+
+    def reset(self, offset=None):
+        self.offset, self.parts, self.whole, self.nbytes = offset, [], False, 0
+
+
+def _window(columns: Dict, start, end, time_field: str) -> Dict:
+    """Rows of a time-sorted batch with start <= time <= end, or {}."""
+    if not columns:
+        return {}
+    times = columns[time_field]
+    lo = 0 if start is None else int(np.searchsorted(times, start, 'left'))
+    hi = len(times) if end is None else int(np.searchsorted(times, end, 'right'))
+    return select_rows(columns, slice(lo, hi)) if hi > lo else {}
+
+
+class LiveTail:
+    """Incrementally decoded rows of open relay files, under a byte budget"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._tails: 'OrderedDict[Tuple[str, Optional[frozenset]], _Tail]' = OrderedDict()  # (path, fields)
+        self.hits = 0
+        self.misses = 0
+        self.bytes_decoded = 0
+
+    def _tail(self, key, identity) -> _Tail:
+        with self._lock:
+            tail = self._tails.get(key)
+            if tail is None or tail.identity != identity:
+                tail = self._tails[key] = _Tail(identity)
+            self._tails.move_to_end(key)
+            return tail
+
+    def forget(self, path: str):
+        """Drop the tails of a file (every projection)."""
+        with self._lock:
+            for key in [key for key in self._tails if key[0] == path]:
+                del self._tails[key]
+
+    def iter_columns(self, path: str, start=None, end=None, schema=None, time_field: str = 'time',
+                     fields=None, batch_bytes=None):
+        """
+        Drop-in for avro_reader.iter_columns on a file that is still growing:
+        rows with start <= time <= end, decoding only what was appended
+        since the previous read of the same fields (None = all).
+        """
+        fields = None if fields is None else frozenset(fields) | {time_field}
+        key = (path, fields)
+        st = os.stat(path)
+        tail = self._tail(key, (st.st_dev, st.st_ino))
+        with tail.lock:
+            if tail.offset is not None and st.st_size < tail.offset:
+                tail.reset()  # truncated: start over
+            if self._covers(tail, start, time_field):
+                self.hits += 1
+            else:
+                # Decode from the indexed block before start, as a plain read would
+                self.misses += 1
+                index = TimeIndex.for_file(path) if start is not None else None
+                offset = index.block_range(start, None)[0] if index else None
+                tail.reset(offset)
+                tail.whole = offset is None
+            parts, offset = list(tail.parts), tail.offset
+
+        # Kept rows first, then batches decoded from where they end; the rest
+        # of the file is skipped once a batch reaches past the window
+        for part in parts:
+            columns = _window(part, start, end, time_field)
+            if columns:
+                yield columns
+            times = part[time_field]
+            if end is not None and len(times) and times[-1] > end:
+                return
+
+        try:
+            for columns, batch_end in iter_appended(path, offset, schema, fields, batch_bytes):
+                columns = concat_columns([columns])  # own the rows, not the file mapping
+                self._keep(tail, key, offset, batch_end, columns)
+                offset = batch_end
+                window = _window(columns, start, end, time_field)
+                if window:
+                    yield window
+                times = columns.get(time_field)
+                if end is not None and times is not None and len(times) and times[-1] > end:
+                    return
+        except UnsupportedSchema:
+            self.forget(path)
+            yield from iter_columns(path, start, end, schema, time_field, fields, batch_bytes)
+
+    def _covers(self, tail: _Tail, start, time_field: str) -> bool:
+        """True if the kept rows hold every row at or after start."""
+        if tail.offset is None:
+            return False
+        if tail.whole:
+            return True
+        times = tail.parts[0].get(time_field) if tail.parts else None
+        # Rows at the first kept time may have been dropped: only later starts are covered
+        return start is not None and times is not None and len(times) > 0 and start > times[0]
+
+    def _keep(self, tail: _Tail, key, offset, end: int, columns: Dict):
+        """Add a decoded batch to the tail if it continues it, then enforce the budget."""
+        with tail.lock:
+            if tail.offset != offset:
+                return  # another read moved the tail meanwhile
+            self.bytes_decoded += end - (offset or 0)
+            tail.offset = end
+            if columns:
+                tail.parts.append(columns)
+                tail.nbytes += column_bytes(columns)
+            self._trim(tail)
+        self._evict(key)
+
+    def _trim(self, tail: _Tail):
+        """Drop the oldest kept rows of a tail over the whole budget (tail lock held)."""
+        while tail.nbytes > self.max_bytes and tail.parts:
+            tail.whole = False
+            if len(tail.parts) > 1:
+                tail.nbytes -= column_bytes(tail.parts.pop(0))
+                continue
+            part = tail.parts[0]
+            rows = len(next(iter(part.values())))
+            keep = min(rows - 1, rows * self.max_bytes // tail.nbytes)
+            if keep <= 0:
+                tail.reset()
+                return
+            # Index arrays copy, so the dropped rows' memory is released
+            tail.parts = [select_rows(part, np.arange(rows - keep, rows))]
+            tail.nbytes = column_bytes(tail.parts[0])
+
+    def _evict(self, current):
+        """Forget least recently read tails other than current while over budget."""
+        with self._lock:
+            total = sum(tail.nbytes for tail in self._tails.values())
+            for key in list(self._tails):
+                if total <= self.max_bytes:
+                    break
+                if key != current:
+                    total -= self._tails.pop(key).nbytes
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'files': len({path for path, _ in self._tails}), 'tails': len(self._tails), 'bytes': sum(t.nbytes for t in self._tails.values()),
+                    'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses,
+                    'bytes_decoded': self.bytes_decoded}
+
+
+# Tails of this process, shared by its export threads
+live_tails = LiveTail()
+
+
+def configure(max_bytes: int):
+    """Set this process's live-tail budget (also the worker process initializer)."""
+    live_tails.max_bytes = max_bytes
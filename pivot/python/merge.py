@@ -0,0 +1,154 @@
+"""
+Time-ordered merge of overlapping files
+Files of a channel normally follow each other in time, but a restarted
+relay, sender debug files or several recorders produce files whose time
+ranges overlap. Their column batches are merged by timestamp here, so
+consumers get one time-ordered stream without sorting it afterwards.
+
+The merge streams: each file keeps one buffered batch, and rows older than
+every file's newest buffered time are emitted (only those rows are sorted,
+a merge of already-sorted runs). Memory stays bounded by one batch per
+overlapping file. Files are expected to be time-ordered internally, as the
+relay writes them; a batch out of order is sorted within its file's buffer.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from decoder import StringColumn, concat_columns, select_rows
+
+
+def overlap_groups(files: Sequence[str], times: Optional[Sequence] = None) -> List[List[str]]:
+    """
+    Split files (ordered by first time, as the catalog lists them) into runs
+    whose [first_time, last_time] ranges overlap. Without times every file
+    is its own run.
+    """
+    if times is None:
+        return [[path] for path in files]
+    groups, end = [], None
+    for path, (first, last) in zip(files, times):
+        if groups and first is not None and end is not None and first <= end:
+            groups[-1].append(path)
+            end = max(end, last)
+        else:
+            groups.append([path])
+            end = last
+    return groups
+
+
+def _empty_like(values, count: int):
+    """Column of count missing values shaped like values (NaN, 0, False or '')."""
+    if isinstance(values, StringColumn):
+        return StringColumn(np.zeros(count + 1, dtype=np.int64), np.empty(0, dtype=np.uint8))
+    if values.dtype.kind == 'f':
+        return np.full(count, np.nan, dtype=values.dtype)
+    return np.zeros(count, dtype=values.dtype)
+
+
+def _rows(columns: Dict) -> int:
+    return len(next(iter(columns.values()))) if columns else 0
+
+
+def drop_duplicates(columns: Dict, time_field: str = 'time') -> Dict:
+    """Drop rows identical in every column to another row (time-sorted input)."""
+    times = columns[time_field]
+    if len(times) < 2 or not np.any(times[1:] == times[:-1]):
+        return columns
+
+    # Identical rows share a time; order ties by value so they end up adjacent
+    numeric = [values for name, values in columns.items()
+               if name != time_field and isinstance(values, np.ndarray)]
+    columns = select_rows(columns, np.lexsort(numeric[::-1] + [times]))
+    times = columns[time_field]
+
+    dup = times[1:] == times[:-1]
+    for name, values in columns.items():
+        if name == time_field:
+            continue
+        if isinstance(values, StringColumn):
+            lengths = np.diff(values.offsets)
+            dup &= lengths[1:] == lengths[:-1]
+            for i in np.flatnonzero(dup):
+                if values[int(i)] != values[int(i) + 1]:
+                    dup[i] = False
+        else:
+            same = values[1:] == values[:-1]
+            if values.dtype.kind == 'f':
+                same |= np.isnan(values[1:]) & np.isnan(values[:-1])
+            dup &= same
+    if not dup.any():
+        return columns
+    return select_rows(columns, np.r_[True, ~dup])
+
+
+def merge_batches(streams: Iterable[Iterable[Dict]], time_field: str = 'time',
+                  dedupe: bool = False) -> Iterable[Dict]:
+    """
+    k-way merge of column batch streams (each time-ordered) into one
+    time-ordered stream of batches. dedupe drops exact duplicate rows.
+    """
+    streams = [iter(stream) for stream in streams]
+    buffers: List[Optional[Dict]] = [None] * len(streams)
+    finished = [False] * len(streams)
+    prototypes = {}  # column name -> a column, for padding streams that lack it
+
+    def pull(i: int) -> bool:
+        """Append the next non-empty batch of stream i to its buffer."""
+        for columns in streams[i]:
+            if not columns or time_field not in columns or not len(columns[time_field]):
+                continue
+            for name, values in columns.items():
+                prototypes.setdefault(name, values)
+            buffered = concat_columns([buffers[i], columns]) if buffers[i] else columns
+            times = buffered[time_field]
+            if np.any(times[1:] < times[:-1]):
+                buffered = select_rows(buffered, np.argsort(times, kind='stable'))
+            buffers[i] = buffered
+            return True
+        finished[i] = True
+        return False
+
+    for i in range(len(streams)):
+        pull(i)
+
+    while True:
+        pending = [i for i in range(len(streams)) if buffers[i]]
+        if not pending:
+            return
+
+        # Rows older than every open stream's newest buffered time are final
+        open_ends = [buffers[i][time_field][-1] for i in pending if not finished[i]]
+        watermark = min(open_ends) if open_ends else None
+
+        parts = []
+        for i in pending:
+            times = buffers[i][time_field]
+            split = len(times) if watermark is None else int(np.searchsorted(times, watermark, 'left'))
+            if not split:
+                continue
+            parts.append(select_rows(buffers[i], slice(0, split)))
+            buffers[i] = select_rows(buffers[i], slice(split, None)) if split < len(times) else None
+
+        if not parts:
+            # Ties at the watermark: read further in the streams holding it
+            for i in pending:
+                if not finished[i] and buffers[i][time_field][-1] == watermark:
+                    pull(i)
+            continue
+
+        for i in range(len(streams)):
+            if buffers[i] is None and not finished[i]:
+                pull(i)
+
+        for part in parts:
+            count = _rows(part)
+            for name, values in prototypes.items():
+                if name not in part:
+                    part[name] = _empty_like(values, count)
+        merged = concat_columns(parts)
+        if len(parts) > 1:
+            merged = select_rows(merged, np.argsort(merged[time_field], kind='stable'))
+        if dedupe:
+            merged = drop_duplicates(merged, time_field)
+        yield merged
@@ -0,0 +1,125 @@
+"""
+Pivot Rollup Pyramid
+Per-bucket summaries of closed relay files at fixed widths (default 1 s,
+10 s, 1 min, 10 min), so coarse aggregated exports read a few rows per
+bucket instead of decoding every raw block.
+
+One rollup file per closed AVRO file, mirroring the storage layout:
+<rollup_path>/<channel>/<file>.avro.rollup.h5, with one group per level
+(named by bucket width in ns) holding `time` (bucket start), `count` and
+<signal>_<statistic> datasets for min / max / sum / sumsq / last. Levels
+are built from the finest one, so every width must be a multiple of it.
+
+Exports only take rollups of files lying entirely inside the requested
+window; edge files are decoded as usual, so results match the raw path.
+Only files with an index trailer qualify: without one, the catalog's
+last_time is the first time of the last block, not of the last record.
+"""
+from typing import Callable, Dict, Iterable, List, Optional
+
+import h5py
+import numpy as np
+
+from aggregate import STATISTICS, column_statistics, reduce_buckets
+from avro_reader import iter_columns
+from closed_files import ClosedFileService, write_atomically
+
+ROLLUP_SUFFIX = '.rollup.h5'
+DEFAULT_LEVELS_NS = tuple(s * 1_000_000_000 for s in (1, 10, 60, 600))
+
+
+def rollup_level(levels: Iterable[int], resolution: int) -> Optional[int]:
+    """Coarsest level width that divides resolution (None if none does)."""
+    widths = [width for width in levels if resolution % width == 0]
+    return max(widths) if widths else None
+
+
+def build_rollup(source_path: str, rollup_path: str, schema=None, levels=DEFAULT_LEVELS_NS,
+                 batch_bytes: Optional[int] = None, time_field: str = 'time'):
+    """Summarize one closed AVRO file at every level and write its rollup file."""
+    levels = sorted(levels)
+    finest = levels[0]
+    if any(width % finest for width in levels):
+        raise ValueError(f"Rollup levels must be multiples of {finest} ns")
+
+    # Finest level, reduced batch by batch
+    parts = []
+    for columns in iter_columns(source_path, None, None, schema, time_field, batch_bytes=batch_bytes):
+        times = columns[time_field]
+        parts.append(reduce_buckets(times // finest, np.ones(len(times), dtype=np.int64),
+                                    column_statistics(columns, STATISTICS, time_field)))
+    if parts:
+        keys = parts[0][2].keys()
+        ids, count, stats = reduce_buckets(
+            np.concatenate([p[0] for p in parts]),
+            np.concatenate([p[1] for p in parts]),
+            {key: np.concatenate([p[2][key] for p in parts if key in p[2]]) for key in keys},
+        )
+    else:
+        ids, count, stats = np.empty(0, np.int64), np.empty(0, np.int64), {}
+
+    def write(f):
+        for width in levels:
+            level_ids, level_count, level_stats = reduce_buckets(ids * finest // width, count, stats)
+            grp = f.create_group(str(width))
+            grp.attrs['width_ns'] = width
+            grp.create_dataset(time_field, data=level_ids * width)
+            grp.create_dataset('count', data=level_count)
+            for (name, stat), values in level_stats.items():
+                grp.create_dataset(f'{name}_{stat}', data=values)
+
+    write_atomically(rollup_path, write, source_path)
+
+
+def read_rollup(rollup_path: str, resolution: int, time_field: str = 'time'):
+    """
+    (times, count, stats) of the coarsest stored level dividing resolution,
+    ready for Aggregator.add_statistics.
+    """
+    with h5py.File(rollup_path, 'r') as f:
+        width = rollup_level((int(name) for name in f), resolution)
+        if width is None:
+            raise ValueError(f"No rollup level divides {resolution} ns in {rollup_path}")
+        grp = f[str(width)]
+        stats = {}
+        for name in grp:
+            signal, _, stat = name.rpartition('_')
+            if stat in STATISTICS and name not in (time_field, 'count'):
+                stats[signal, stat] = grp[name][:]
+        return grp[time_field][:], grp['count'][:], stats
+
+
+class RollupService(ClosedFileService):
+    """Keeps rollups of the catalog's closed files current, from a background thread"""
+
+    name = 'rollup'
+    suffix = ROLLUP_SUFFIX
+
+    def __init__(self, catalog, directory: str, levels=DEFAULT_LEVELS_NS,
+                 schema_for: Optional[Callable] = None, interval: float = 60,
+                 batch_bytes: Optional[int] = None):
+        self.levels = tuple(sorted(levels))
+        super().__init__(catalog, directory, schema_for, interval, batch_bytes)
+
+    def build(self, source_path: str, output_path: str, schema):
+        build_rollup(source_path, output_path, schema, self.levels, self.batch_bytes)
+
+    def rollup_path(self, source_path: str) -> str:
+        return self.output_path(source_path)
+
+    def lookup(self, entries: List[Dict], resolution: int, start: Optional[int] = None,
+               end: Optional[int] = None) -> Dict[str, str]:
+        """
+        Rollup files usable for an aggregated export: catalog entries that are
+        closed, summarized by their trailer (exact last_time), entirely inside
+        [start, end] and rolled up in their current state.
+        """
+        if not resolution or rollup_level(self.levels, resolution) is None:
+            return {}
+        inside = [entry for entry in entries
+                  if entry.get('scan_offset') is None
+                  and (start is None or entry['first_time'] >= start) and (end is None or entry['last_time'] <= end)]
+        return self.current(inside)
+
+    def stats(self) -> Dict:
+        return {**super().stats(), 'levels_ns': list(self.levels)}
@@ -0,0 +1,76 @@
+"""
+Single-flight call coalescing
+Concurrent calls with the same key share one execution: the first caller
+runs the function, later callers wait for and receive its result (or its
+exception). Once the call finishes the key is free again.
+"""
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.callers = 1
+
+
+class SingleFlight:
+    """Coalesces concurrent calls per key"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any],
+           share: Optional[Callable[[Any, int], None]] = None) -> Tuple[Any, bool]:
+        """
+        Run fn once per concurrent key. Returns (result, shared).
+        share, if given, is called with the result and the final number of
+        callers receiving it before any of them is released.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.callers += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            if call.error is None and share is not None:
+                share(call.result, call.callers)
+            call.done.set()
+        return call.result, False
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls),
+            }
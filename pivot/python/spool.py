@@ -0,0 +1,93 @@
+"""
+Export Spool
+Managed temp files for export results that must be fully written before
+they are sent (HDF5). Files are reference counted by the responses sending
+them and deleted after the last one closes; total spool size is capped.
+A file counts with its expected size from creation until it is committed,
+so concurrent exports cannot all pass the quota while still empty.
+"""
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict
+
+SPOOL_SUFFIX = '.spool'
+
+
+class SpoolFull(Exception):
+    """Spool is at its byte quota; the export should be retried later."""
+
+
+class ExportSpool:
+    """Quota-limited, reference-counted temp files"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._files: Dict[str, list] = {}  # path -> [size, refs]
+
+        # Nothing survives a restart: no response can still be sending it
+        for leftover in self.directory.glob('*' + SPOOL_SUFFIX):
+            leftover.unlink()
+
+    @property
+    def size(self) -> int:
+        return sum(size for size, _ in self._files.values())
+
+    def create(self, reserve_bytes: int = 0) -> str:
+        """
+        New empty spool file, owned by the caller (one reference), with
+        reserve_bytes (its expected size) counted against the quota.
+        """
+        with self._lock:
+            size = self.size
+            if size >= self.max_bytes or size + reserve_bytes > self.max_bytes:
+                raise SpoolFull(f"Export spool full ({size} of {self.max_bytes} bytes, "
+                                f"{reserve_bytes} needed)")
+            fd, path = tempfile.mkstemp(suffix=SPOOL_SUFFIX, dir=self.directory)
+            os.close(fd)
+            self._files[path] = [reserve_bytes, 1]
+            return path
+
+    def commit(self, path: str):
+        """Account the final size of a written spool file (replacing its reservation)."""
+        with self._lock:
+            if path in self._files:
+                self._files[path][0] = os.path.getsize(path)
+
+    def share(self, path: str, users: int):
+        """Set the number of responses that will send (and release) the file."""
+        with self._lock:
+            if path in self._files:
+                self._files[path][1] = users
+
+    def release(self, path: str):
+        """Drop one reference; the file is deleted with the last one."""
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self._files[path]
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def discard(self, path: str):
+        """Delete a spool file regardless of references (failed export)."""
+        with self._lock:
+            self._files.pop(path, None)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'files': len(self._files), 'bytes': self.size, 'max_bytes': self.max_bytes}
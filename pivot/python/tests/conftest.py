@@ -0,0 +1,98 @@
+"""Shared fixtures for pivot tests: synthetic relay AVRO files"""
+import io
+import json
+import os
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import avro.io
+import avro.schema
+
+SCHEMA_PATH = os.path.join(
+    os.path.dirname(__file__),
+    '../../../config/agents/example.avsc'
+)
+SYNC_MARKER = b'\xa4\x8a\x1e\x90\x05\x04$x\nh3\x7f\xc2P\x95c'
+
+
+def encode_long(n: int) -> bytes:
+    """Encode a long integer as a byte array per Avro."""
+    avro.io.BinaryEncoder(bytes_io := io.BytesIO()).write_long(n)
+    return bytes_io.getvalue()
+
+
+def make_record(i: int, t0: int = 1_700_000_000_000_000_000, step: int = 1_000_000) -> dict:
+    """Example-schema record with time = t0 + i * step (nanoseconds)."""
+    return {
+        "time": t0 + i * step,
+        "message": f"msg{i}",
+        "counter": i,
+        "sine_wave": float(i) * 0.5,
+        "ramp": -float(i),
+        "square_wave": 1.0 if i % 2 else -1.0,
+        "noise": float(i) / 7.0,
+    }
+
+
+def write_relay_file(path, records, schema, header=False, index_interval=0, closed=False, block_records=1):
+    """
+    Write records the way the relay does: block_records records per block,
+    fixed sync marker, optional container header (Python relay) and sparse
+    time index (with the summary trailer if closed). Returns the block offsets.
+    """
+    datum_writer = avro.io.DatumWriter(avro.schema.parse(json.dumps(schema)))
+    offsets = []
+    with open(path, 'wb') as f:
+        if header:
+            f.write(b'Obj\x01')
+            meta = {'avro.schema': json.dumps(schema).encode(), 'avro.codec': b'null'}
+            f.write(encode_long(len(meta)))
+            for key, value in meta.items():
+                f.write(encode_long(len(key)) + key.encode())
+                f.write(encode_long(len(value)) + value)
+            f.write(encode_long(0))
+            f.write(SYNC_MARKER)
+
+        for first in range(0, len(records), block_records):
+            block = records[first:first + block_records]
+            buf = io.BytesIO()
+            for record in block:
+                datum_writer.write(record, avro.io.BinaryEncoder(buf))
+            data = buf.getvalue()
+            offsets.append(f.tell())
+            f.write(encode_long(len(block)) + encode_long(len(data)) + data + SYNC_MARKER)
+
+    if index_interval:
+        with open(str(path) + '.idx', 'wb') as f:
+            f.write(b'SDIX' + struct.pack('<III', 1, index_interval, 0))
+            for i in range(0, len(offsets), index_interval):
+                f.write(struct.pack('<qQ', records[i * block_records]['time'], offsets[i]))
+            if closed:
+                f.write(b'SDIE' + struct.pack('<4xqqQQ', records[0]['time'], records[-1]['time'],
+                                              len(records), os.path.getsize(path)))
+
+    return offsets
+
+
+@pytest.fixture
+def example_schema():
+    with open(SCHEMA_PATH, 'r') as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def relay_file(tmp_path, example_schema):
+    """Factory: write n example records to a relay file, return (path, records, offsets)."""
+    def factory(n, name='data_1.avro', header=False, index_interval=0, closed=False, block_records=1,
+                **record_kwargs):
+        records = [make_record(i, **record_kwargs) for i in range(n)]
+        path = str(tmp_path / name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        offsets = write_relay_file(path, records, example_schema, header, index_interval, closed,
+                                   block_records)
+        return path, records, offsets
+    return factory
@@ -0,0 +1,80 @@
+"""Tests for time-bucket aggregation"""
+import numpy as np
+import pytest
+
+from aggregate import AGGREGATES, Aggregator, aggregate_batches, aggregate_fields, parse_aggregates
+from decoder import StringColumn
+
+BUCKET = 1000
+
+
+def reference(times, values, bucket=BUCKET):
+    """Per-bucket aggregates computed one bucket at a time."""
+    out = {}
+    for b in sorted(set(t // bucket for t in times)):
+        v = values[times // bucket == b]
+        out[b * bucket] = (len(v), v.min(), v.max(), v.mean(), np.sqrt(np.mean(v ** 2)), v[-1])
+    return out
+
+
+def collect(batches):
+    rows = {}
+    for columns in batches:
+        for i, t in enumerate(columns['time']):
+            assert t not in rows
+            rows[t] = tuple(columns[name][i] for name in
+                            ('count', 'x_min', 'x_max', 'x_mean', 'x_rms', 'x_last'))
+    return rows
+
+
+@pytest.mark.parametrize('batch_size', [1, 7, 250, 10000])
+def test_batches_match_reference(batch_size):
+    rng = np.random.default_rng(0)
+    times = np.sort(rng.integers(0, 50 * BUCKET, 1000))
+    values = rng.normal(size=1000)
+    batches = [{'time': times[i:i + batch_size], 'x': values[i:i + batch_size]}
+               for i in range(0, len(times), batch_size)]
+
+    got = collect(aggregate_batches(batches, BUCKET))
+    want = reference(times, values)
+    assert got.keys() == want.keys()
+    for t in want:
+        np.testing.assert_allclose(got[t], want[t])
+
+
+def test_unordered_batch_and_types():
+    times = np.array([2500, 100, 2100, 900, 1500])
+    columns = {
+        'time': times,
+        'x': np.array([5, 1, 4, 2, 3], dtype=np.int32),
+        'flag': np.array([True, False, False, False, True]),
+        'message': StringColumn(np.array([0, 1, 2, 3, 4, 5]), np.frombuffer(b'abcde', np.uint8)),
+    }
+    aggregator = Aggregator(BUCKET, ('min', 'mean', 'last'))
+    assert aggregator.add(columns) is None
+    out = aggregator.finish()
+
+    assert out['time'].tolist() == [0, 1000, 2000]
+    assert out['count'].tolist() == [2, 1, 2]
+    assert out['x_min'].dtype == np.int32
+    assert out['x_min'].tolist() == [1, 3, 4]
+    assert out['x_mean'].tolist() == [1.5, 3.0, 4.5]
+    assert out['x_last'].tolist() == [2, 3, 4]
+    assert out['flag_min'].tolist() == [False, True, False]
+    assert 'message_last' not in out
+    assert aggregator.finish() is None
+
+
+def test_fields_and_parsing():
+    fields = [('time', 'long'), ('message', 'string'), ('counter', 'int'), ('noise', 'double')]
+    assert aggregate_fields(fields, ('max', 'rms')) == [
+        ('time', 'long'), ('count', 'long'),
+        ('counter_max', 'int'), ('counter_rms', 'double'),
+        ('noise_max', 'double'), ('noise_rms', 'double'),
+    ]
+    assert parse_aggregates(None) == AGGREGATES
+    assert parse_aggregates('Max, min,max') == ('max', 'min')
+    with pytest.raises(ValueError):
+        parse_aggregates('median')
+    with pytest.raises(ValueError):
+        Aggregator(0)
@@ -0,0 +1,67 @@
+"""Tests for Arrow IPC / Parquet exports"""
+import io
+
+import numpy as np
+import pytest
+
+from decoder import StringColumn
+from export import ChannelJob, ExportPool
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.ipc  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+
+from arrow_writer import ArrowStreamWriter, to_arrow  # noqa: E402
+
+
+def read_table(data: bytes, fmt: str):
+    if fmt == 'parquet':
+        return pq.read_table(io.BytesIO(data))
+    if fmt == 'arrow-file':
+        return pa.ipc.open_file(pa.BufferReader(data)).read_all()
+    return pa.ipc.open_stream(pa.BufferReader(data)).read_all()
+
+
+def test_string_column_zero_copy():
+    column = StringColumn(np.array([0, 1, 3, 3]), np.frombuffer('aé'.encode(), dtype=np.uint8))
+    array = to_arrow(column, pa.large_string())
+    assert array.to_pylist() == ['a', 'é', '']
+
+
+@pytest.mark.parametrize('fmt', ['arrow', 'arrow-file', 'parquet'])
+def test_writer_fills_missing_signals_with_nulls(fmt):
+    buf = io.BytesIO()
+    writer = ArrowStreamWriter(buf, fmt, [('time', 'long'), ('x', 'double'), ('y', 'int')], ['a', 'b'])
+    writer.append('a', {'time': np.array([1, 2]), 'x': np.array([0.5, 1.5])})
+    writer.append('b', {'time': np.array([3]), 'y': np.array([7], dtype=np.int32)})
+    writer.close()
+
+    table = read_table(buf.getvalue(), fmt)
+    assert table.column('channel').to_pylist() == ['a', 'a', 'b']
+    assert table.column('time').type == pa.timestamp('ns', tz='UTC')
+    assert table.column('time').cast(pa.int64()).to_pylist() == [1, 2, 3]
+    assert table.column('x').to_pylist() == [0.5, 1.5, None]
+    assert table.column('y').to_pylist() == [None, None, 7]
+    assert writer.rows == {'a': 2, 'b': 1}
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+@pytest.mark.parametrize('fmt', ['arrow', 'parquet'])
+def test_export_channels(tmp_path, relay_file, example_schema, fmt, workers):
+    jobs = []
+    for n, channel in ((60, 'a'), (40, 'b')):
+        path, records, _ = relay_file(n, name=f'{channel}/data_1.avro')
+        jobs.append(ChannelJob(channel, [path], example_schema, None, None, ['message', 'ramp']))
+
+    buf = io.BytesIO()
+    pool = ExportPool(workers, batch_bytes=256, scratch_dir=str(tmp_path))
+    try:
+        pool.write(buf, jobs, fmt)
+    finally:
+        pool.shutdown()
+
+    table = read_table(buf.getvalue(), fmt)
+    assert table.column_names == ['channel', 'time', 'message', 'ramp']
+    assert table.column('channel').to_pylist() == ['a'] * 60 + ['b'] * 40
+    assert table.column('message').to_pylist() == [f'msg{i}' for i in range(60)] + [f'msg{i}' for i in range(40)]
+    assert table.column('ramp').to_pylist()[:3] == [0.0, -1.0, -2.0]
@@ -0,0 +1,46 @@
+"""Tests for block framing and the memory-mapped column reader"""
+import numpy as np
+
+from avro_reader import SYNC_MARKER, find_sync, frame_blocks, frame_view, iter_columns
+from .conftest import encode_long
+
+
+def make_blocks(payloads):
+    return b''.join(encode_long(1) + encode_long(len(p)) + p + SYNC_MARKER for p in payloads)
+
+
+def test_frame_view_matches_frame_blocks():
+    raw = make_blocks([bytes([i]) * i for i in range(1, 60)]) + b'\x02\x40partial'
+    buf = np.frombuffer(raw, dtype=np.uint8)
+
+    starts, sizes, counts, end = frame_view(buf, 0, len(raw))
+    expected = frame_blocks(raw)
+    assert starts.tolist() == expected[0]
+    assert sizes.tolist() == expected[1]
+    assert counts.tolist() == expected[2]
+    assert end == expected[3] == len(raw) - len(b'\x02\x40partial')
+    assert len(find_sync(buf, SYNC_MARKER, 0, len(raw))) == 59
+
+
+def test_frame_view_marker_inside_data():
+    # A payload containing the sync marker must not split its block
+    payloads = [b'a' * 5, b'xx' + SYNC_MARKER + b'yy', b'b' * 7]
+    raw = make_blocks(payloads)
+    buf = np.frombuffer(raw, dtype=np.uint8)
+
+    starts, sizes, counts, end = frame_view(buf, 0, len(raw), SYNC_MARKER, raw)
+    assert [raw[s:s + n] for s, n in zip(starts, sizes)] == payloads
+    assert end == len(raw)
+
+
+def test_iter_columns_blocks_larger_than_batch(tmp_path, relay_file, example_schema):
+    path, records, _ = relay_file(20, header=True)
+    batches = list(iter_columns(path, schema=example_schema, batch_bytes=8))
+    assert sum(len(b['time']) for b in batches) == 20
+    assert [b['counter'].tolist() for b in batches] == [[i] for i in range(20)]
+
+
+def test_iter_columns_empty_file(tmp_path, example_schema):
+    path = tmp_path / 'empty.avro'
+    path.write_bytes(b'')
+    assert list(iter_columns(str(path), schema=example_schema)) == []
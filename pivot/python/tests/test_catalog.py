@@ -0,0 +1,156 @@
+"""Tests for the pivot file catalog"""
+import os
+
+import numpy as np
+
+from avro_reader import iter_columns
+from catalog import FileCatalog, overlap_bytes
+from time_index import TimeIndex
+
+T0 = 1_700_000_000_000_000_000
+SECOND = 1_000_000_000
+
+
+def test_closed_file_summary_from_trailer(relay_file):
+    path, records, _ = relay_file(50, index_interval=8, closed=True)
+
+    summary = TimeIndex.for_file(path).summary
+    assert summary.first_time == records[0]['time']
+    assert summary.last_time == records[-1]['time']
+    assert summary.record_count == 50
+    assert summary.bytes == os.path.getsize(path)
+
+
+def test_sync_and_prune_by_channel_and_time(relay_file, tmp_path):
+    # Two closed files and one open file for 'example', one for 'other'
+    relay_file(10, name='example/data_1.avro', index_interval=4, closed=True, t0=T0, step=SECOND)
+    relay_file(10, name='example/data_2.avro', index_interval=4, closed=True, t0=T0 + 10 * SECOND, step=SECOND)
+    relay_file(10, name='example/data_3.avro', index_interval=4, t0=T0 + 20 * SECOND, step=SECOND)
+    relay_file(10, name='other/data_1.avro', index_interval=4, closed=True, t0=T0, step=SECOND)
+
+    catalog = FileCatalog(str(tmp_path))
+    catalog.sync()
+
+    files = catalog.files_for('example', T0 + 12 * SECOND, T0 + 22 * SECOND)
+    names = [os.path.relpath(f['path'], tmp_path) for f in files]
+    assert names == ['example/data_2.avro', 'example/data_3.avro']
+
+    closed, open_file = files
+    assert closed['closed'] == 1 and closed['record_count'] == 10
+    assert open_file['closed'] == 0
+    assert open_file['first_time'] == T0 + 20 * SECOND
+    assert open_file['last_time'] == T0 + 29 * SECOND
+    assert open_file['record_count'] == 10
+
+    assert len(catalog.files_for('example')) == 3
+    assert len(catalog.files_for('other')) == 1
+    assert catalog.files_for('missing') == []
+
+
+def test_open_file_growth_and_rotation(relay_file, tmp_path):
+    relay_file(5, name='example/data_1.avro', index_interval=4, t0=T0, step=SECOND)
+
+    catalog = FileCatalog(str(tmp_path))
+    catalog.sync()
+    assert catalog.files_for('example')[0]['last_time'] == T0 + 4 * SECOND
+
+    # Relay appends to the open file (same prefix, more blocks): picked up incrementally
+    relay_file(8, name='example/data_1.avro', index_interval=4, t0=T0, step=SECOND)
+    [entry] = catalog.files_for('example')
+    assert entry['last_time'] == T0 + 7 * SECOND
+    assert entry['record_count'] == 8
+
+    # Rotation: old file gets its trailer, new file appears
+    relay_file(8, name='example/data_1.avro', index_interval=4, closed=True, t0=T0, step=SECOND)
+    relay_file(3, name='example/data_2.avro', index_interval=4, t0=T0 + 8 * SECOND, step=SECOND)
+    files = catalog.files_for('example')
+    assert [f['closed'] for f in files] == [1, 0]
+    assert catalog.files_for('example', T0 + 9 * SECOND, T0 + 10 * SECOND)[0]['path'].endswith('data_2.avro')
+
+
+def test_open_file_with_record_blocks(relay_file, tmp_path, example_schema):
+    # Open files are scanned a block at a time: last_time is its last block's first record
+    path, records, _ = relay_file(10, name='example/data_1.avro', index_interval=1, block_records=4,
+                                  t0=T0, step=SECOND)
+
+    catalog = FileCatalog(str(tmp_path))
+    [entry] = catalog.files_for('example')
+    assert entry['record_count'] == 10
+    assert entry['last_time'] == T0 + 8 * SECOND
+
+    # ...so a window after it still finds the open file and its last record
+    [entry] = catalog.files_for('example', T0 + 9 * SECOND, T0 + 20 * SECOND)
+    window = iter_columns(path, T0 + 9 * SECOND, T0 + 20 * SECOND, example_schema)
+    times = np.concatenate([columns['time'] for columns in window])
+    assert times.tolist() == [records[9]['time']]
+
+
+def test_closed_without_index(relay_file, tmp_path):
+    # Index disabled: rotated files have no trailer, only a newer file next to them
+    relay_file(10, name='example/data_100.avro', block_records=4, t0=T0, step=SECOND)
+    relay_file(10, name='example/data_110.avro', block_records=4, t0=T0 + 10 * SECOND, step=SECOND)
+    relay_file(10, name='example/data_120.avro', block_records=4, t0=T0 + 20 * SECOND, step=SECOND)
+
+    catalog = FileCatalog(str(tmp_path))
+    catalog.sync()
+    names = [os.path.basename(f['path']) for f in catalog.closed_files()]
+    assert names == ['data_100.avro', 'data_110.avro']
+
+    # Pruned by time; data_110's last block (records 18, 19) reaches past its
+    # scanned last_time up to the next file
+    files = catalog.files_for('example', T0 + 19 * SECOND, T0 + 25 * SECOND)
+    assert [os.path.basename(f['path']) for f in files] == ['data_110.avro', 'data_120.avro']
+    assert [os.path.basename(f['path']) for f in catalog.files_for('example', T0 + 21 * SECOND)] \
+        == ['data_120.avro']
+
+    # The newest file is open until it is idle for a rotation period
+    path = str(tmp_path / 'example' / 'data_120.avro')
+    idle = FileCatalog(str(tmp_path), str(tmp_path / 'idle.db'), rotation_seconds=60)
+    idle.sync()
+    assert len(idle.closed_files()) == 2
+    os.utime(path, ns=(T0, T0))
+    idle.refresh('example')
+    assert len(idle.closed_files()) == 3
+
+
+def test_unassigned_files_and_removal(relay_file, tmp_path):
+    path, _, _ = relay_file(5, name='data.avro', t0=T0, step=SECOND)
+
+    catalog = FileCatalog(str(tmp_path))
+    catalog.sync()
+    assert [f['channel'] for f in catalog.files_for('example')] == [None]
+
+    os.remove(path)
+    assert catalog.files_for('example') == []
+
+
+def test_refresh_all_without_sync(relay_file, tmp_path):
+    relay_file(10, name='example/data_1.avro', index_interval=4, closed=True, t0=T0, step=SECOND)
+    catalog = FileCatalog(str(tmp_path))
+    catalog.refresh_all()
+    assert len(catalog.closed_files()) == 1
+
+    # New channel directories and files are picked up, removed directories dropped
+    relay_file(10, name='other/data_1.avro', index_interval=4, closed=True, t0=T0, step=SECOND)
+    os.remove(str(tmp_path / 'example' / 'data_1.avro'))
+    os.remove(str(tmp_path / 'example' / 'data_1.avro.idx'))
+    os.rmdir(str(tmp_path / 'example'))
+    catalog.refresh_all()
+    assert [f['channel'] for f in catalog.closed_files()] == ['other']
+
+
+def test_catalog_persists(relay_file, tmp_path):
+    relay_file(5, name='example/data_1.avro', index_interval=4, closed=True, t0=T0, step=SECOND)
+
+    FileCatalog(str(tmp_path)).sync()
+    reopened = FileCatalog(str(tmp_path))
+    assert len(reopened.files_for('example', T0, T0 + SECOND)) == 1
+
+
+def test_overlap_bytes():
+    entry = {'first_time': 100, 'last_time': 200, 'bytes': 1000}
+    assert overlap_bytes(entry) == 1000
+    assert overlap_bytes(entry, 150, 175) == 250
+    assert overlap_bytes(entry, 0, 120) == 200
+    assert overlap_bytes(entry, 300, 400) == 0
+    assert overlap_bytes({'first_time': 5, 'last_time': 5, 'bytes': 40}, 0, 10) == 40
@@ -0,0 +1,122 @@
+"""Tests for pivoting closed relay files into columnar shards"""
+import os
+
+import h5py
+import numpy as np
+import pytest
+
+from catalog import FileCatalog
+from catcol import SHARD_GROUP, ShardService, batch_pivot, find_inputs, pivot_file, read_shard
+from export import ChannelJob, iter_channel_batches
+
+from .conftest import make_record, write_relay_file
+
+T0 = 1_700_000_000_000_000_000
+MS = 1_000_000
+
+
+def test_pivot_and_slice(relay_file, example_schema, tmp_path):
+    path, records, _ = relay_file(100, step=MS)
+    shard = str(tmp_path / 'shards' / 'data_1.avro.shard.h5')
+    assert pivot_file(path, shard, example_schema, chunk_rows=16) == 100
+
+    with h5py.File(shard, 'r') as f:
+        grp = f[SHARD_GROUP]
+        assert grp.attrs['first_time'] == records[0]['time']
+        assert grp.attrs['last_time'] == records[-1]['time']
+        assert f.attrs['source_size'] == os.path.getsize(path)
+
+    batches = list(read_shard(shard, records[10]['time'], records[89]['time'], ['counter', 'message'],
+                              batch_bytes=320))
+    assert len(batches) > 1
+    assert set(batches[0]) == {'time', 'counter', 'message'}
+    assert np.concatenate([b['counter'] for b in batches]).tolist() == list(range(10, 90))
+    assert batches[0]['message'].tolist()[:2] == ['msg10', 'msg11']
+
+
+def test_unordered_file_is_sorted(example_schema, tmp_path):
+    records = [make_record(i) for i in (3, 1, 2, 0, 4)]
+    path = str(tmp_path / 'data_1.avro')
+    write_relay_file(path, records, example_schema)
+    shard = str(tmp_path / 'data_1.avro.shard.h5')
+    pivot_file(path, shard, example_schema)
+
+    (columns,) = read_shard(shard)
+    assert columns['counter'].tolist() == [0, 1, 2, 3, 4]
+    assert columns['message'].tolist() == ['msg0', 'msg1', 'msg2', 'msg3', 'msg4']
+
+
+def test_service_shards_match_decoding(relay_file, example_schema, tmp_path):
+    paths = []
+    for i in range(2):
+        path, _, _ = relay_file(100, name=f'a/data_{i}.avro', index_interval=16, closed=True,
+                                t0=T0 + i * 100 * MS, step=MS)
+        paths.append(path)
+    relay_file(50, name='a/data_2.avro', index_interval=16, t0=T0 + 200 * MS, step=MS)
+
+    catalog = FileCatalog(str(tmp_path), str(tmp_path / 'catalog.db'))
+    service = ShardService(catalog, str(tmp_path / 'shards'), lambda channel: example_schema)
+    assert service.run_once() == 2
+
+    start, end = T0 + 55 * MS, T0 + 230 * MS
+    entries = catalog.files_for('a', start, end)
+    shards = service.lookup(entries)
+    assert sorted(shards) == paths
+
+    job = ChannelJob('a', [e['path'] for e in entries], example_schema, start, end, None)
+    decoded = list(iter_channel_batches(job, batch_bytes=1024))
+    sliced = list(iter_channel_batches(job._replace(shards=shards), batch_bytes=1024))
+    for name in ('time', 'counter', 'noise'):
+        assert np.concatenate([b[name] for b in sliced]).tolist() == \
+            np.concatenate([b[name] for b in decoded]).tolist()
+    assert sum(len(b['message']) for b in sliced) == 176
+
+
+def test_batch_pivot_appends_incrementally(example_schema, tmp_path):
+    data = tmp_path / 'data'
+    for channel, n in (('a', 30), ('b', 20)):
+        os.makedirs(data / channel)
+        write_relay_file(str(data / channel / 'data_1.avro'), [make_record(i) for i in range(n)], example_schema)
+    write_relay_file(str(data / 'data.avro'), [make_record(i) for i in range(5)], example_schema)
+
+    inputs = find_inputs(str(data))
+    assert [(os.path.relpath(p, data), c) for p, c in inputs] == [
+        ('data.avro', 'unassigned'), ('a/data_1.avro', 'a'), ('b/data_1.avro', 'b')]
+    assert [c for _, c in find_inputs(str(data), channels=['b'])] == ['b']
+
+    output = str(tmp_path / 'out.h5')
+    totals = batch_pivot(inputs, output, example_schema, ['counter'], workers=2)
+    assert totals['files'] == 3 and totals['records'] == 55
+
+    # Unchanged files are skipped, a grown file only adds its new rows
+    write_relay_file(str(data / 'a' / 'data_1.avro'), [make_record(i) for i in range(45)], example_schema)
+    totals = batch_pivot(inputs, output, example_schema, ['counter'], workers=2)
+    assert totals['files'] == 1 and totals['records'] == 15
+
+    with h5py.File(output, 'r') as f:
+        assert f['a/counter'][:].tolist() == list(range(45))
+        assert set(f['a']) == {'time', 'counter'}
+        assert f['unassigned/counter'].shape == (5,)
+
+    with pytest.raises(ValueError):
+        batch_pivot(inputs, output, example_schema, None)
+
+
+def test_batch_pivot_resumes_at_shared_timestamp(example_schema, tmp_path):
+    # Rows arriving after a run at the last pivoted time are not lost
+    path = str(tmp_path / 'data_1.avro')
+    records = [make_record(i) for i in range(7)]
+    for i in (4, 5):
+        records[i]['time'] = records[3]['time']
+
+    output = str(tmp_path / 'out.h5')
+    write_relay_file(path, records[:5], example_schema)
+    batch_pivot([(path, 'a')], output, example_schema, ['counter'])
+    write_relay_file(path, records[:6], example_schema)
+    batch_pivot([(path, 'a')], output, example_schema, ['counter'])
+    write_relay_file(path, records, example_schema)
+    totals = batch_pivot([(path, 'a')], output, example_schema, ['counter'])
+    assert totals['records'] == 1
+
+    with h5py.File(output, 'r') as f:
+        assert f['a/counter'][:].tolist() == list(range(7))
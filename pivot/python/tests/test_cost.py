@@ -0,0 +1,136 @@
+"""Tests for export cost estimation and admission control"""
+import threading
+import time
+
+import pytest
+
+from catalog import FileCatalog
+from cost import (ADMIT, QUEUE, REJECT, AdmissionBusy, AdmissionControl, AdmissionRejected,
+                  CostModel, ExportEstimate)
+from export import ChannelJob
+
+T0 = 1_700_000_000_000_000_000
+MS = 1_000_000
+
+
+def channel_estimate(tmp_path, relay_file, example_schema, signals=None, **job_options):
+    relay_file(1000, name='a/relay.avro', index_interval=100, closed=True)
+    catalog = FileCatalog(str(tmp_path), str(tmp_path / 'catalog.db'))
+    catalog.sync()
+    entries = catalog.files_for('a')
+    start, end = T0, T0 + 499 * MS
+    job = ChannelJob('a', [e['path'] for e in entries], example_schema, start, end, signals,
+                     **job_options)
+    return CostModel(scan_bytes_per_second=1e6, values_per_second=1e6).channel(job, entries), entries
+
+
+def test_estimate_scales_with_window_and_signals(tmp_path, relay_file, example_schema):
+    full, entries = channel_estimate(tmp_path, relay_file, example_schema)
+    assert 490 <= full.records <= 510
+    assert full.input_bytes == pytest.approx(entries[0]['bytes'] / 2, rel=0.02)
+    assert full.values == full.records * 7
+    assert full.output_bytes == full.records * (5 * 8 + 4 + 16)  # long/doubles, int counter, string
+
+    narrow, _ = channel_estimate(tmp_path, relay_file, example_schema, ['counter'])
+    assert narrow.values == narrow.records * 2
+    assert narrow.output_bytes == narrow.records * 12
+    assert narrow.cpu_seconds < full.cpu_seconds
+
+
+def test_shards_and_aggregation_cut_cost(tmp_path, relay_file, example_schema):
+    raw, entries = channel_estimate(tmp_path, relay_file, example_schema)
+    sharded, _ = channel_estimate(tmp_path, relay_file, example_schema,
+                                  shards={entries[0]['path']: 'shard.h5'})
+    assert sharded.input_bytes == 0 and sharded.memory_bytes == 0
+    assert sharded.cpu_seconds < raw.cpu_seconds
+
+    aggregated, _ = channel_estimate(tmp_path, relay_file, example_schema, ['counter'],
+                                     resolution=100 * MS, aggregates=['min', 'max'])
+    assert aggregated.output_bytes == 5 * (8 + 8 + 2 * 4)  # time, count, counter_min, counter_max
+
+
+def test_export_estimate_combines_channels():
+    model = CostModel(workers=2, memory_max_bytes=0)
+    channels = [ExportEstimate(100, 10, 20, 1000, 4.0, 1, 4.0, mem) for mem in (30, 50, 10)]
+    jobs = [ChannelJob(str(i), [], None, 0, 1, None, size=100) for i in range(3)]
+    total = model.estimate(jobs, channels)
+    assert (total.cores, total.cpu_seconds, total.seconds) == (2, 12.0, 6.0)
+    assert total.memory_bytes == 80  # the two largest channels at once
+    in_memory = CostModel(workers=2, memory_max_bytes=1000).estimate(jobs, channels)
+    assert in_memory.memory_bytes == 80 + 3000
+
+
+def estimate(cores=1, memory=10, seconds=1.0):
+    return ExportEstimate(0, 0, 0, 0, seconds * cores, cores, seconds, memory)
+
+
+def test_admission_rejects_what_never_fits():
+    admission = AdmissionControl(cores=4, memory_bytes=100)
+    with pytest.raises(AdmissionRejected):
+        with admission.admit(estimate(memory=101)):
+            pass
+    with pytest.raises(AdmissionRejected):
+        with admission.admit(estimate(seconds=61), max_seconds=60):
+            pass
+    assert admission.decide(estimate(seconds=61), max_seconds=60) == REJECT
+    assert admission.stats()['rejected'] == 2
+
+
+def test_admission_queues_until_room():
+    admission = AdmissionControl(cores=2, memory_bytes=100, max_queued=1, max_wait=5)
+    order = []
+    with admission.admit(estimate(cores=2, memory=60)):
+        assert admission.decide(estimate()) == QUEUE
+
+        def waiter():
+            with admission.admit(estimate(memory=50)):
+                order.append('waiter')
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        while not admission.stats()['waiting']:
+            time.sleep(0.01)
+        assert admission.decide(estimate()) == REJECT  # queue full
+        with pytest.raises(AdmissionBusy):
+            with admission.admit(estimate()):
+                pass
+        order.append('first')
+    thread.join(5)
+    assert order == ['first', 'waiter']
+    assert admission.decide(estimate()) == ADMIT
+    stats = admission.stats()
+    assert (stats['running'], stats['admitted'], stats['queued']) == (0, 2, 1)
+
+
+def test_admission_wait_times_out():
+    admission = AdmissionControl(cores=1, memory_bytes=100, max_wait=0.05)
+    with admission.admit(estimate()):
+        with pytest.raises(AdmissionBusy):
+            with admission.admit(estimate()):
+                pass
+    assert admission.stats()['timeouts'] == 1
+    with admission.admit(estimate()):
+        pass
+
+
+def test_background_jobs_wait_behind_interactive_exports():
+    admission = AdmissionControl(cores=4, memory_bytes=100, max_wait=5)
+    admitted = threading.Event()
+
+    def job():
+        with admission.admit(estimate(memory=100), wait=False):
+            admitted.set()
+
+    with admission.admit(estimate(memory=60)):
+        thread = threading.Thread(target=job)
+        thread.start()
+        while not admission.stats()['jobs_waiting']:
+            time.sleep(0.01)
+
+        # The large job at the head of its queue does not hold up an export that fits
+        assert admission.decide(estimate(memory=30)) == ADMIT
+        with admission.admit(estimate(memory=30)):
+            assert not admitted.is_set()
+    thread.join(5)
+    assert admitted.is_set()
+    assert admission.stats()['jobs_waiting'] == 0
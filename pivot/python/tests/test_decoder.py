@@ -0,0 +1,178 @@
+"""Tests for the schema-compiled columnar decoder"""
+import io
+import json
+
+import avro.io
+import avro.schema
+import numpy as np
+import pytest
+
+from avro_reader import iter_columns, read_columns, read_records
+from decoder import RecordDecoder, StringColumn, UnsupportedSchema, compile_schema, concat_columns
+
+
+def encode(schema, records):
+    """Encode records back to back, returning (bytes, record offsets)."""
+    writer = avro.io.DatumWriter(avro.schema.parse(json.dumps(schema)))
+    buf = io.BytesIO()
+    offsets = []
+    for record in records:
+        offsets.append(buf.tell())
+        writer.write(record, avro.io.BinaryEncoder(buf))
+    return np.frombuffer(buf.getvalue(), dtype=np.uint8), offsets
+
+
+def test_decode_matches_avro(example_schema):
+    records = [
+        {"time": 1_700_000_000_123_456_789 + i, "message": "é" * (i % 5), "counter": -i * 70000,
+         "sine_wave": i / 3.0, "ramp": -1.5, "square_wave": float('inf'), "noise": 1e-300}
+        for i in range(50)
+    ]
+    buf, offsets = encode(example_schema, records)
+
+    columns = compile_schema(example_schema).decode(buf, offsets)
+
+    assert list(columns) == [f['name'] for f in example_schema['fields']]
+    assert columns['time'].dtype == np.int64
+    assert columns['counter'].dtype == np.int32
+    assert columns['sine_wave'].dtype == np.float64
+    for name in ('time', 'counter', 'sine_wave', 'ramp', 'square_wave', 'noise'):
+        assert columns[name].tolist() == [r[name] for r in records]
+    assert columns['message'].tolist() == [r['message'] for r in records]
+
+
+def test_multi_record_blocks():
+    schema = {"type": "record", "name": "r", "fields": [
+        {"name": "time", "type": "long"},
+        {"name": "flag", "type": "boolean"},
+        {"name": "level", "type": "float"},
+        {"name": "tag", "type": "bytes"},
+    ]}
+    records = [{"time": i, "flag": bool(i % 2), "level": i * 0.25, "tag": b"x" * i} for i in range(10)]
+    buf, offsets = encode(schema, records)
+
+    # Blocks of 3, 1, 4 and 2 records
+    starts = [offsets[0], offsets[3], offsets[4], offsets[8]]
+    columns = RecordDecoder(schema).decode(buf, starts, [3, 1, 4, 2])
+
+    assert columns['time'].tolist() == list(range(10))
+    assert columns['flag'].tolist() == [r['flag'] for r in records]
+    assert columns['level'].tolist() == [r['level'] for r in records]
+    assert [bytes(columns['tag'].data[a:b]) for a, b in zip(columns['tag'].offsets, columns['tag'].offsets[1:])] \
+        == [r['tag'] for r in records]
+
+
+def test_string_column_ops():
+    a = StringColumn(np.array([0, 1, 3]), np.frombuffer(b'abc', dtype=np.uint8))
+    b = StringColumn(np.array([0, 0, 4]), np.frombuffer(b'defg', dtype=np.uint8))
+
+    joined = StringColumn.concat([a, b])
+    assert joined.tolist() == ['a', 'bc', '', 'defg']
+    assert joined[np.array([False, True, True, True])].tolist() == ['bc', '', 'defg']
+
+    merged = concat_columns([{'s': a, 'v': np.arange(2)}, {'s': b, 'v': np.arange(2)}])
+    assert merged['v'].tolist() == [0, 1, 0, 1]
+    assert len(merged['s']) == 4
+
+
+def test_unsupported_schema():
+    schema = {"type": "record", "name": "r", "fields": [{"name": "x", "type": ["null", "long"]}]}
+    with pytest.raises(UnsupportedSchema):
+        RecordDecoder(schema)
+
+
+@pytest.mark.parametrize('header', [False, True])
+def test_read_columns_matches_records(relay_file, example_schema, header):
+    path, records, _ = relay_file(300, header=header, index_interval=32)
+    start, end = records[40]['time'], records[250]['time']
+
+    columns = read_columns(path, start, end, example_schema)
+    expected = list(read_records(path, start, end, example_schema))
+
+    assert columns['counter'].tolist() == [r['counter'] for r in expected] == list(range(40, 251))
+    assert columns['message'].tolist() == [r['message'] for r in expected]
+    assert columns['noise'].tolist() == [r['noise'] for r in expected]
+
+
+def test_projection_skips_unrequested_fields(example_schema):
+    records = [
+        {"time": 1_700_000_000_000_000_000 + i, "message": "x" * i, "counter": i * 1000,
+         "sine_wave": i / 3.0, "ramp": -float(i), "square_wave": 1.0, "noise": i * 0.5}
+        for i in range(20)
+    ]
+    buf, offsets = encode(example_schema, records)
+    decoder = compile_schema(example_schema)
+
+    columns = decoder.decode(buf, offsets, fields={'counter', 'noise'})
+    assert list(columns) == ['counter', 'noise']
+    assert columns['counter'].tolist() == [r['counter'] for r in records]
+    assert columns['noise'].tolist() == [r['noise'] for r in records]
+
+    # Skipped doubles collapse into one jump; trailing skips are dropped
+    ops = [op for op, _, _ in decoder.plan({'counter'})]
+    assert ops == ['skip_varint', 'skip_bytes', 'varint', 'skip']
+
+
+def test_projection_multi_record_blocks(example_schema):
+    records = [
+        {"time": i, "message": "m" * (i % 3), "counter": i, "sine_wave": 0.0,
+         "ramp": float(i), "square_wave": 0.0, "noise": 0.0}
+        for i in range(9)
+    ]
+    buf, offsets = encode(example_schema, records)
+
+    # Trailing skipped fields still advance to the next record in a block
+    columns = compile_schema(example_schema).decode(buf, offsets[::3], [3, 3, 3], fields={'ramp'})
+    assert columns['ramp'].tolist() == [float(i) for i in range(9)]
+
+
+def test_read_columns_projection(relay_file, example_schema):
+    path, records, _ = relay_file(50, index_interval=8)
+    columns = read_columns(path, records[10]['time'], records[20]['time'], example_schema, fields=['ramp'])
+
+    assert set(columns) == {'time', 'ramp'}
+    assert columns['ramp'].tolist() == [r['ramp'] for r in records[10:21]]
+
+
+@pytest.mark.parametrize('batch_bytes', [1, 100, 4096])
+def test_iter_columns_batches(relay_file, example_schema, batch_bytes):
+    path, records, _ = relay_file(200, header=True, index_interval=16)
+    start, end = records[5]['time'], records[190]['time']
+
+    batches = list(iter_columns(path, start, end, example_schema, batch_bytes=batch_bytes))
+    if batch_bytes > 100:
+        assert len(batches) > 1
+    assert all(len(b['time']) for b in batches)
+
+    joined = concat_columns(batches)
+    assert joined['counter'].tolist() == list(range(5, 191))
+    assert joined['message'].tolist() == [r['message'] for r in records[5:191]]
+
+
+def test_iter_columns_truncated_tail(relay_file, example_schema):
+    path, records, _ = relay_file(30)
+    with open(path, 'ab') as f:
+        f.write(b'\x02\x80\x01partial')
+
+    batches = list(iter_columns(path, schema=example_schema, batch_bytes=64))
+    assert concat_columns(batches)['counter'].tolist() == list(range(30))
+
+
+def test_fixed_size_records_decode_to_views():
+    schema = {"type": "record", "name": "r", "fields": [
+        {"name": "time", "type": "long"},
+        {"name": "x", "type": "double"},
+        {"name": "ok", "type": "boolean"},
+    ]}
+    records = [{"time": 1_700_000_000_000_000_000 + i, "x": i * 0.5, "ok": bool(i % 3)} for i in range(40)]
+    buf, offsets = encode(schema, records)
+
+    columns = compile_schema(schema).decode(buf, offsets)
+    assert np.shares_memory(columns['x'], buf)
+    assert columns['ok'].dtype == np.bool_
+    assert columns['x'].tolist() == [r['x'] for r in records]
+    assert columns['ok'].tolist() == [r['ok'] for r in records]
+
+    # Uneven spacing falls back to a copying gather
+    columns = compile_schema(schema).decode(buf, offsets[:-2] + [offsets[-1]])
+    assert not np.shares_memory(columns['x'], buf)
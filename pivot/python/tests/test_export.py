@@ -0,0 +1,72 @@
+"""Tests for the (optionally parallel) export pipeline"""
+import io
+
+import h5py
+import pytest
+
+from export import ChannelJob, ExportPool
+
+
+@pytest.fixture
+def channel_jobs(relay_file, example_schema):
+    jobs = []
+    for n, channel in ((120, 'a'), (80, 'b'), (50, 'c')):
+        path, records, _ = relay_file(n, name=f'{channel}/data_1.avro', index_interval=16)
+        jobs.append(ChannelJob(channel, [path], example_schema,
+                               records[10]['time'], records[-10]['time'], None))
+    jobs.append(ChannelJob('missing', [], example_schema, None, None, None))
+    return jobs
+
+
+def read_export(path):
+    with h5py.File(path, 'r') as f:
+        return {name: {signal: f[name][signal][:].tolist() for signal in f[name]} for name in f}
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_export_channels(tmp_path, channel_jobs, workers):
+    pool = ExportPool(workers, batch_bytes=512, chunk_rows=32, scratch_dir=str(tmp_path))
+    try:
+        pool.write(str(tmp_path / 'out.h5'), channel_jobs + channel_jobs[:1])
+    finally:
+        pool.shutdown()
+
+    data = read_export(tmp_path / 'out.h5')
+    assert set(data) == {'a', 'b', 'c', 'missing'}
+    assert data['missing'] == {}
+    assert data['a']['counter'] == list(range(10, 111))
+    assert data['c']['counter'] == list(range(10, 41))
+    assert list(tmp_path.glob('pivot_shards_*')) == []
+
+
+def test_parallel_matches_sequential(tmp_path, channel_jobs):
+    ExportPool(0).write(str(tmp_path / 'seq.h5'), channel_jobs)
+    pool = ExportPool(3)
+    try:
+        pool.write(str(tmp_path / 'par.h5'), channel_jobs)
+    finally:
+        pool.shutdown()
+    assert read_export(tmp_path / 'seq.h5') == read_export(tmp_path / 'par.h5')
+
+
+def test_export_in_memory(channel_jobs):
+    buf = io.BytesIO()
+    ExportPool(0).write(buf, channel_jobs)
+    data = read_export(io.BytesIO(buf.getvalue()))
+    assert data['b']['counter'] == list(range(10, 71))
+
+
+def test_export_aggregated(tmp_path, channel_jobs):
+    # Records are 1 ms apart: 10 ms buckets hold 10 records
+    job = channel_jobs[0]._replace(resolution=10_000_000, aggregates=('min', 'max', 'mean'))
+    ExportPool(0, batch_bytes=512).write(str(tmp_path / 'out.h5'), [job])
+
+    data = read_export(tmp_path / 'out.h5')['a']
+    assert set(data) == {'time', 'count', 'counter_min', 'counter_max', 'counter_mean',
+                         'sine_wave_min', 'sine_wave_max', 'sine_wave_mean', 'ramp_min', 'ramp_max',
+                         'ramp_mean', 'square_wave_min', 'square_wave_max', 'square_wave_mean',
+                         'noise_min', 'noise_max', 'noise_mean'}
+    assert data['count'] == [10] * 10 + [1]
+    assert data['counter_min'] == list(range(10, 111, 10))
+    assert data['counter_mean'][:2] == [14.5, 24.5]
+    assert data['time'][1] - data['time'][0] == 10_000_000
@@ -0,0 +1,76 @@
+"""Tests for the disk-backed export cache"""
+import os
+
+from export_cache import ExportCache
+
+
+def make_export(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b'x' * size)
+    return str(path)
+
+
+def test_hit_miss_and_lru_eviction(tmp_path):
+    cache = ExportCache(str(tmp_path / 'cache'), max_bytes=250)
+
+    assert cache.get('a') is None
+    cache.put('a', make_export(tmp_path, 'a.tmp', 100))
+    cache.put('b', make_export(tmp_path, 'b.tmp', 100))
+    with cache.get('a') as f:  # a is now most recent
+        assert f.read() == b'x' * 100
+
+    cache.put('c', make_export(tmp_path, 'c.tmp', 100))
+    assert cache.get('b') is None
+    for key in ('a', 'c'):
+        with cache.get(key) as f:
+            assert f is not None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (3, 2, 1)
+    assert (stats['entries'], stats['bytes']) == (2, 200)
+    assert not os.path.exists(cache.path('b'))
+
+
+def test_oversized_export_not_cached(tmp_path):
+    cache = ExportCache(str(tmp_path / 'cache'), max_bytes=10)
+    export = make_export(tmp_path, 'big.tmp', 100)
+    assert not cache.put('big', export)
+    assert os.path.exists(export)
+    assert cache.stats()['entries'] == 0
+
+
+def test_entry_readable_after_eviction(tmp_path):
+    # A response holding a cached export keeps reading it after eviction
+    cache = ExportCache(str(tmp_path / 'cache'), max_bytes=150)
+    export = make_export(tmp_path, 'a.tmp', 100)
+    assert cache.put('a', export)
+    assert os.path.exists(export)  # linked, still owned by the caller
+
+    with cache.get('a') as f:
+        cache.put('b', make_export(tmp_path, 'b.tmp', 100))
+        assert not os.path.exists(cache.path('a'))
+        assert f.read() == b'x' * 100
+
+
+def test_entries_survive_restart(tmp_path):
+    cache = ExportCache(str(tmp_path / 'cache'), max_bytes=1000)
+    cache.put('a', make_export(tmp_path, 'a.tmp', 10))
+
+    reopened = ExportCache(str(tmp_path / 'cache'), max_bytes=1000)
+    with reopened.get('a') as f:
+        assert f.name == str(cache.path('a'))
+
+
+def test_key_tracks_request_and_file_growth(relay_file, example_schema):
+    path, records, _ = relay_file(20)
+    key = ExportCache.key(['b', 'a'], ['x', 'y'], 1, 2, {'format': 'hdf5'}, [path])
+
+    # Normalized: channel and signal order do not matter
+    assert key == ExportCache.key(['a', 'b', 'a'], ['y', 'x'], 1, 2, {'format': 'hdf5'}, [path])
+    assert key != ExportCache.key(['a', 'b'], None, 1, 2, {'format': 'hdf5'}, [path])
+    assert key != ExportCache.key(['a', 'b'], ['x', 'y'], 1, 3, {'format': 'hdf5'}, [path])
+
+    # Open file grows: same request, new key
+    with open(path, 'ab') as f:
+        f.write(b'\x00')
+    assert key != ExportCache.key(['a', 'b'], ['x', 'y'], 1, 2, {'format': 'hdf5'}, [path])
@@ -0,0 +1,61 @@
+"""Tests for the streaming HDF5 export writer"""
+import h5py
+import numpy as np
+
+from avro_reader import iter_columns
+from decoder import StringColumn
+from hdf5_writer import Hdf5StreamWriter
+
+
+def strings(values):
+    encoded = [v.encode('utf-8') for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in encoded], out=offsets[1:])
+    return StringColumn(offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+
+def test_append_batches(tmp_path):
+    path = tmp_path / 'out.h5'
+    with h5py.File(path, 'w') as f:
+        writer = Hdf5StreamWriter(f, chunk_rows=4)
+        writer.add_channel('empty')
+        writer.append('a', {'time': np.arange(3), 'x': np.array([0.5, 1.5, 2.5]), 's': strings(['a', 'bc', ''])})
+        writer.append('a', {'time': np.arange(3, 10), 'x': np.arange(7) * 1.0, 's': strings(['é'] * 7)})
+        writer.append('a', {'time': np.empty(0, np.int64)})
+        writer.finish()
+
+    with h5py.File(path, 'r') as f:
+        assert list(f['empty']) == []
+        grp = f['a']
+        assert grp['time'][:].tolist() == list(range(10))
+        assert grp['time'].chunks == (4,)
+        assert grp['time'].maxshape == (None,)
+        assert grp['x'][:5].tolist() == [0.5, 1.5, 2.5, 0.0, 1.0]
+        assert grp['s'].asstr()[:].tolist() == ['a', 'bc', ''] + ['é'] * 7
+
+
+def test_signals_missing_from_some_batches_are_aligned(tmp_path):
+    path = tmp_path / 'out.h5'
+    with h5py.File(path, 'w') as f:
+        writer = Hdf5StreamWriter(f)
+        writer.append('a', {'time': np.arange(2), 'old': np.ones(2)})
+        writer.append('a', {'time': np.arange(2, 5), 'new': np.ones(3)})
+        writer.finish()
+
+    with h5py.File(path, 'r') as f:
+        assert f['a/old'][:].tolist() == [1, 1, 0, 0, 0]
+        assert f['a/new'][:].tolist() == [0, 0, 1, 1, 1]
+
+
+def test_stream_file_to_hdf5(tmp_path, relay_file, example_schema):
+    file_path, records, _ = relay_file(500, index_interval=64)
+    path = tmp_path / 'out.h5'
+    with h5py.File(path, 'w') as f:
+        writer = Hdf5StreamWriter(f, chunk_rows=128)
+        for columns in iter_columns(file_path, schema=example_schema, fields=['noise'], batch_bytes=2048):
+            writer.append('ch', columns)
+        writer.finish()
+
+    with h5py.File(path, 'r') as f:
+        assert set(f['ch']) == {'time', 'noise'}
+        assert f['ch/noise'][:].tolist() == [r['noise'] for r in records]
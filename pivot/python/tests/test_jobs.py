@@ -0,0 +1,137 @@
+"""Tests for asynchronous export jobs"""
+import os
+import threading
+
+import pytest
+
+from jobs import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobManager, QueueFull, ResultsFull
+
+
+def blocking(release, order=None, name=None):
+    def run(job):
+        if order is not None:
+            order.append(name)
+        release.wait(5)
+        return None
+    return run
+
+
+def test_job_runs_and_reports_progress(tmp_path):
+    result = tmp_path / 'export.h5'
+    manager = JobManager(workers=1)
+
+    def run(job):
+        manager.update(job, channels_done=1, channels_total=1)
+        result.write_bytes(b'data')
+        return str(result)
+
+    job = manager.submit(run, meta={'format': 'hdf5'})
+    job = manager.wait(job.id, timeout=5)
+    while not job.done:
+        job = manager.wait(job.id, job.version, timeout=5)
+
+    assert job.state == DONE
+    assert job.result == str(result)
+    assert job.to_dict()['progress'] == {'channels_done': 1, 'channels_total': 1}
+    assert job.to_dict()['format'] == 'hdf5'
+
+
+def test_higher_priority_runs_first():
+    release, order = threading.Event(), []
+    manager = JobManager(workers=1)
+    first = manager.submit(blocking(release, order, 'first'))
+    while manager.get(first.id).state != RUNNING:
+        manager.wait(first.id, first.version, timeout=1)
+
+    low = manager.submit(blocking(release, order, 'low'), priority=0)
+    high = manager.submit(blocking(release, order, 'high'), priority=5)
+    release.set()
+    for job in (first, low, high):
+        while not manager.get(job.id).done:
+            manager.wait(job.id, manager.get(job.id).version, timeout=5)
+
+    assert order == ['first', 'high', 'low']
+
+
+def test_long_poll_times_out_without_change():
+    release = threading.Event()
+    manager = JobManager(workers=0)
+    job = manager.submit(blocking(release))
+
+    polled = manager.wait(job.id, job.version, timeout=0.05)
+    assert polled.state == QUEUED
+    assert manager.wait('missing', timeout=0.01) is None
+
+
+def test_failed_job_keeps_error():
+    manager = JobManager(workers=1)
+
+    def run(job):
+        raise OSError("disk full")
+
+    job = manager.submit(run)
+    while not job.done:
+        manager.wait(job.id, job.version, timeout=5)
+
+    assert job.state == FAILED
+    assert job.error == "disk full"
+    assert job.result is None
+
+
+def test_cancel_queued_job_and_queue_limit():
+    manager = JobManager(workers=0, max_queued=2)
+    a = manager.submit(lambda job: None)
+    manager.submit(lambda job: None)
+    with pytest.raises(QueueFull):
+        manager.submit(lambda job: None)
+
+    assert manager.cancel(a.id).state == CANCELLED
+    manager.submit(lambda job: None)
+    assert manager.stats()[QUEUED] == 2
+    assert manager.cancel('missing') is None
+
+
+def test_finished_results_expire(tmp_path):
+    result = tmp_path / 'export.h5'
+    manager = JobManager(workers=1, result_ttl=0)
+
+    def run(job):
+        result.write_bytes(b'data')
+        return str(result)
+
+    job = manager.submit(run)
+    while not job.done:
+        manager.wait(job.id, job.version, timeout=5)
+
+    manager.expire()
+    assert manager.get(job.id) is None
+    assert not result.exists()
+
+
+def test_results_swept_at_startup_and_capped(tmp_path):
+    (tmp_path / 'stale.result').write_bytes(b'x' * 10)
+    (tmp_path / 'other.h5').write_bytes(b'kept')
+    manager = JobManager(workers=1, directory=str(tmp_path), max_result_bytes=100)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['other.h5']
+
+    def run(job):
+        path = manager.result_path(job)
+        with open(path, 'wb') as f:
+            f.write(b'x' * 40)
+        return path
+
+    # Counted as estimated until finished, then with the result's size
+    job = manager.submit(run, reserve_bytes=80)
+    with pytest.raises(ResultsFull):
+        manager.submit(run, reserve_bytes=30)
+    while not manager.get(job.id).done:
+        manager.wait(job.id, manager.get(job.id).version, timeout=5)
+    assert manager.stats()['result_bytes'] == 40
+    second = manager.submit(run, reserve_bytes=30)
+
+    # Deleting a result frees its bytes
+    manager.cancel(job.id)
+    assert not os.path.exists(job.result)
+    while not manager.get(second.id).done:
+        manager.wait(second.id, manager.get(second.id).version, timeout=5)
+    assert manager.stats()['result_bytes'] == 40
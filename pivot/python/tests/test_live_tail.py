@@ -0,0 +1,155 @@
+"""Tests for incremental reads of files the relay is still writing"""
+import os
+
+from avro_reader import iter_columns, read_appended
+from decoder import concat_columns
+from export import ChannelJob, ExportPool, iter_channel_batches
+from live_tail import DEFAULT_MAX_BYTES, LiveTail, configure, live_tails
+
+from .conftest import make_record, write_relay_file
+
+T0 = 1_700_000_000_000_000_000
+MS = 1_000_000
+
+
+def growing_file(tmp_path, example_schema, n):
+    """Full relay file of n records (its bytes and block offsets) and an empty live path."""
+    full = str(tmp_path / 'full.avro')
+    offsets = write_relay_file(full, [make_record(i) for i in range(n)], example_schema)
+    with open(full, 'rb') as f:
+        raw = f.read()
+    live = str(tmp_path / 'live.avro')
+    open(live, 'wb').close()
+    return live, raw, offsets + [len(raw)]
+
+
+def grow(path, raw, upto):
+    with open(path, 'ab') as f:
+        f.write(raw[os.path.getsize(path):upto])
+
+
+def test_read_appended_stops_before_truncated_block(tmp_path, example_schema):
+    live, raw, offsets = growing_file(tmp_path, example_schema, 10)
+    grow(live, raw, offsets[4] + 5)  # writer is mid-way through block 4
+
+    columns, end = read_appended(live, None, example_schema)
+    assert columns['counter'].tolist() == [0, 1, 2, 3]
+    assert end == offsets[4]
+
+    grow(live, raw, len(raw))
+    columns, end = read_appended(live, end, example_schema)
+    assert columns['counter'].tolist() == list(range(4, 10))
+    assert end == len(raw)
+
+
+def test_live_tail_decodes_only_appended_blocks(tmp_path, example_schema):
+    live, raw, offsets = growing_file(tmp_path, example_schema, 100)
+    tails = LiveTail()
+    grow(live, raw, offsets[40] + 3)
+
+    rows = list(tails.iter_columns(live, schema=example_schema))
+    assert rows[0]['counter'].tolist() == list(range(40))
+    assert tails.bytes_decoded == offsets[40]
+
+    grow(live, raw, offsets[90])
+    start, end = T0 + 80 * MS, T0 + 95 * MS
+    rows = list(tails.iter_columns(live, start, end, example_schema))
+    assert rows[0]['counter'].tolist() == list(range(80, 90))
+    assert tails.bytes_decoded == offsets[90]
+    assert (tails.hits, tails.misses) == (1, 1)
+
+    grow(live, raw, len(raw))
+    expected = list(iter_columns(live, start, end, example_schema))[0]
+    rows = concat_columns(tails.iter_columns(live, start, end, example_schema))
+    assert rows['message'].tolist() == expected['message'].tolist()
+    assert tails.bytes_decoded == len(raw)
+
+
+def test_live_tail_keeps_requested_fields_only(tmp_path, example_schema):
+    live, raw, offsets = growing_file(tmp_path, example_schema, 100)
+    tails = LiveTail()
+    grow(live, raw, offsets[40])
+
+    rows = list(tails.iter_columns(live, schema=example_schema, fields=['counter']))
+    assert set(rows[0]) == {'time', 'counter'}
+    kept = tails.stats()['bytes']
+    assert kept == 40 * (8 + 4)
+
+    # Same projection: appended blocks only; another projection keeps its own tail
+    grow(live, raw, len(raw))
+    rows = concat_columns(tails.iter_columns(live, T0 + 30 * MS, None, example_schema, fields=['counter']))
+    assert rows['counter'].tolist() == list(range(30, 100))
+    assert (tails.hits, tails.misses) == (1, 1)
+    rows = concat_columns(tails.iter_columns(live, T0 + 30 * MS, None, example_schema, fields=['ramp']))
+    assert set(rows) == {'time', 'ramp'} and len(rows['time']) == 70
+    assert tails.stats()['tails'] == 2 and tails.stats()['files'] == 1
+
+    tails.forget(live)
+    assert tails.stats()['tails'] == 0
+
+
+def test_live_tail_starts_over_for_new_file(tmp_path, example_schema):
+    live, raw, offsets = growing_file(tmp_path, example_schema, 20)
+    tails = LiveTail()
+    grow(live, raw, len(raw))
+    assert len(list(tails.iter_columns(live, schema=example_schema))[0]['time']) == 20
+
+    os.unlink(live)
+    write_relay_file(live, [make_record(i) for i in range(5)], example_schema)
+    assert list(tails.iter_columns(live, schema=example_schema))[0]['counter'].tolist() == list(range(5))
+
+
+def test_live_tail_budget_keeps_newest_rows(tmp_path, example_schema):
+    live, raw, offsets = growing_file(tmp_path, example_schema, 200)
+    tails = LiveTail(max_bytes=4096)
+    grow(live, raw, len(raw))
+
+    everything = list(tails.iter_columns(live, schema=example_schema))[0]
+    assert len(everything['time']) == 200
+    assert tails.stats()['bytes'] <= 4096
+
+    # Recent windows come from the kept rows, older ones decode again
+    recent = list(tails.iter_columns(live, T0 + 190 * MS, None, example_schema))[0]
+    assert recent['counter'].tolist() == list(range(190, 200))
+    assert tails.hits == 1
+    old = list(tails.iter_columns(live, T0 + 10 * MS, T0 + 12 * MS, example_schema))[0]
+    assert old['counter'].tolist() == [10, 11, 12]
+    assert tails.misses == 2
+
+
+def test_export_reads_live_files_through_tail(tmp_path, example_schema):
+    live, raw, offsets = growing_file(tmp_path, example_schema, 30)
+    grow(live, raw, len(raw))
+    job = ChannelJob('a', [live], example_schema, T0 + 5 * MS, None, ['counter'], live=[live])
+    hits = live_tails.hits
+    for _ in range(2):
+        rows = list(iter_channel_batches(job))
+        assert rows[0]['counter'].tolist() == list(range(5, 30))
+    assert live_tails.hits == hits + 1
+    live_tails.forget(live)
+
+
+def test_live_tail_cold_window_decodes_in_batches(tmp_path, example_schema):
+    live, raw, offsets = growing_file(tmp_path, example_schema, 200)
+    grow(live, raw, len(raw))
+    tails = LiveTail()
+
+    # An early window decodes batch by batch and stops past its end
+    batches = list(tails.iter_columns(live, T0 + 20 * MS, T0 + 40 * MS, example_schema, batch_bytes=1024))
+    assert len(batches) > 1
+    assert concat_columns(batches)['counter'].tolist() == list(range(20, 41))
+    assert tails.bytes_decoded < offsets[60]
+
+    # A later window carries on from there
+    rows = concat_columns(tails.iter_columns(live, T0 + 150 * MS, None, example_schema, batch_bytes=1024))
+    assert rows['counter'].tolist() == list(range(150, 200))
+    assert tails.hits == 1 and tails.bytes_decoded == len(raw)
+
+
+def test_pool_splits_live_tail_budget():
+    pool = ExportPool(workers=3, live_tail_bytes=4000)
+    try:
+        assert pool.live_tail_bytes == 1000
+        assert live_tails.max_bytes == 1000
+    finally:
+        configure(DEFAULT_MAX_BYTES)
@@ -0,0 +1,74 @@
+"""Tests for the time-ordered merge of overlapping files"""
+import numpy as np
+import pytest
+
+from decoder import StringColumn
+from export import ChannelJob, iter_channel_batches
+from merge import drop_duplicates, merge_batches, overlap_groups
+
+from .conftest import make_record, write_relay_file
+
+MS = 1_000_000
+
+
+def batches(times, size, **extra):
+    times = np.asarray(times, dtype=np.int64)
+    for i in range(0, len(times), size):
+        columns = {'time': times[i:i + size], 'x': times[i:i + size] * 2.0}
+        columns.update({name: values[i:i + size] for name, values in extra.items()})
+        yield columns
+
+
+def test_overlap_groups():
+    files = ['a', 'b', 'c', 'd']
+    times = [(0, 10), (5, 20), (21, 30), (30, 40)]
+    assert overlap_groups(files, times) == [['a', 'b'], ['c', 'd']]
+    assert overlap_groups(files) == [['a'], ['b'], ['c'], ['d']]
+
+
+@pytest.mark.parametrize('sizes', [(1, 1, 1), (7, 3, 50), (1000, 1000, 1000)])
+def test_merge_is_time_ordered(sizes):
+    rng = np.random.default_rng(1)
+    streams = [np.sort(rng.integers(0, 500, 200)) for _ in sizes]
+    merged = list(merge_batches([batches(t, size) for t, size in zip(streams, sizes)]))
+
+    times = np.concatenate([b['time'] for b in merged])
+    assert times.tolist() == sorted(np.concatenate(streams).tolist())
+    assert np.array_equal(np.concatenate([b['x'] for b in merged]), times * 2.0)
+
+
+def test_dedupe_and_padding():
+    message = StringColumn(np.arange(4, dtype=np.int64), np.frombuffer(b'abc', np.uint8))
+    first = batches([1, 2, 3], 2, message=message, y=np.array([np.nan, 1.0, 2.0]))
+    copy = batches([1, 2, 3], 1, message=message, y=np.array([np.nan, 1.0, 2.0]))
+    other = batches([2, 4], 5)
+
+    merged = list(merge_batches([first, copy, other], dedupe=True))
+    columns = {name: np.concatenate([b[name] for b in merged]) if name != 'message' else
+               sum((b[name].tolist() for b in merged), []) for name in merged[0]}
+    assert columns['time'].tolist() == [1, 2, 2, 3, 4]
+    assert columns['message'] == ['a', 'b', '', 'c', '']
+    assert np.isnan(columns['y'][[0, 2, 4]]).all()
+
+
+def test_drop_duplicates_keeps_distinct_rows_at_same_time():
+    columns = {'time': np.array([5, 5, 5, 5]), 'x': np.array([1.0, 2.0, 1.0, 2.0])}
+    out = drop_duplicates(columns)
+    assert out['x'].tolist() == [1.0, 2.0]
+
+
+def test_export_merges_overlapping_files(example_schema, tmp_path):
+    t0 = 1_700_000_000_000_000_000
+    even = [make_record(i, t0=t0, step=2 * MS) for i in range(50)]
+    odd = [make_record(i, t0=t0 + MS, step=2 * MS) for i in range(50)]
+    paths = [str(tmp_path / name) for name in ('relay.avro', 'restart.avro', 'copy.avro')]
+    for path, records in zip(paths, (even, odd, even)):
+        write_relay_file(path, records, example_schema)
+    times = [(t0, t0 + 98 * MS), (t0 + MS, t0 + 99 * MS), (t0, t0 + 98 * MS)]
+
+    job = ChannelJob('a', paths, example_schema, None, None, ['counter'], times=times)
+    out = np.concatenate([b['time'] for b in iter_channel_batches(job, batch_bytes=256)])
+    assert len(out) == 150 and np.all(np.diff(out) >= 0)
+
+    out = np.concatenate([b['time'] for b in iter_channel_batches(job._replace(dedupe=True), batch_bytes=256)])
+    assert (out - t0).tolist() == [i * MS for i in range(100)]
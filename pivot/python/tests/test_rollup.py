@@ -0,0 +1,123 @@
+"""Tests for the rollup pyramid of closed relay files"""
+import os
+
+import numpy as np
+
+from catalog import FileCatalog
+from cost import CostModel
+from export import ChannelJob, iter_channel_batches
+from rollup import RollupService, build_rollup, read_rollup, rollup_level
+
+T0 = 1_700_000_000_000_000_000
+MS = 1_000_000
+LEVELS = (10 * MS, 50 * MS)
+
+
+def test_build_and_read_levels(relay_file, example_schema, tmp_path):
+    path, records, _ = relay_file(100, step=MS)
+    rollup_path = str(tmp_path / 'rollup' / 'data_1.avro.rollup.h5')
+    build_rollup(path, rollup_path, example_schema, LEVELS)
+
+    times, count, stats = read_rollup(rollup_path, 10 * MS)
+    assert len(times) == 10 and count.tolist() == [10] * 10
+    assert stats['counter', 'max'].tolist() == list(range(9, 100, 10))
+
+    # 100 ms is answered from the coarsest level dividing it (50 ms)
+    times, count, stats = read_rollup(rollup_path, 100 * MS)
+    assert (times - T0).tolist() == [0, 50 * MS]
+    assert count.tolist() == [50, 50]
+    assert stats['counter', 'sum'].tolist() == [sum(range(50)), sum(range(50, 100))]
+    assert stats['counter', 'last'].tolist() == [49, 99]
+    assert ('message', 'min') not in stats
+
+    assert rollup_level(LEVELS, 100 * MS) == 50 * MS
+    assert rollup_level(LEVELS, 15 * MS) is None
+
+
+def test_service_rollups_match_raw_aggregation(relay_file, example_schema, tmp_path):
+    paths = []
+    for i in range(3):
+        path, _, _ = relay_file(100, name=f'a/data_{i}.avro', index_interval=16, closed=True,
+                                t0=T0 + i * 100 * MS, step=MS)
+        paths.append(path)
+    relay_file(100, name='a/data_3.avro', index_interval=16, t0=T0 + 300 * MS, step=MS)
+
+    catalog = FileCatalog(str(tmp_path), str(tmp_path / 'catalog.db'))
+    service = RollupService(catalog, str(tmp_path / 'rollup'), LEVELS, lambda channel: example_schema)
+    assert service.run_once() == 3
+    assert service.run_once() == 0
+
+    # Window cuts into the first file: only the two closed files inside use rollups
+    start, end = T0 + 55 * MS, T0 + 380 * MS
+    entries = catalog.files_for('a', start, end)
+    rollups = service.lookup(entries, 100 * MS, start, end)
+    assert sorted(rollups) == paths[1:]
+
+    job = ChannelJob('a', [e['path'] for e in entries], example_schema, start, end, ['counter', 'noise'],
+                     resolution=100 * MS, aggregates=('min', 'max', 'mean', 'last'))
+    raw = list(iter_channel_batches(job, batch_bytes=512))
+    rolled = list(iter_channel_batches(job._replace(rollups=rollups), batch_bytes=512))
+    for name in raw[0]:
+        np.testing.assert_allclose(np.concatenate([b[name] for b in rolled]),
+                                   np.concatenate([b[name] for b in raw]))
+    assert sorted(raw[0]) == ['count', 'counter_last', 'counter_max', 'counter_mean', 'counter_min',
+                              'noise_last', 'noise_max', 'noise_mean', 'noise_min', 'time']
+
+    # Rollups go with their source files, and survive a restart
+    assert RollupService(catalog, str(tmp_path / 'rollup'), LEVELS).stats()['files'] == 3
+    os.unlink(paths[0])
+    os.unlink(paths[0] + '.idx')
+    service.run_once()
+    assert not os.path.exists(service.rollup_path(paths[0]))
+    assert service.stats()['files'] == 2
+
+
+def test_files_without_trailer_are_decoded(relay_file, example_schema, tmp_path):
+    # Index disabled: the catalog only knows the first time of each file's last block
+    for i in range(3):
+        relay_file(100, name=f'a/data_{i}.avro', block_records=10, t0=T0 + i * 100 * MS, step=MS)
+
+    catalog = FileCatalog(str(tmp_path), str(tmp_path / 'catalog.db'))
+    service = RollupService(catalog, str(tmp_path / 'rollup'), LEVELS, lambda channel: example_schema)
+    assert service.run_once() == 2
+
+    # data_0's last block (90-99 ms) straddles the window end
+    start, end = T0, T0 + 95 * MS
+    entries = catalog.files_for('a', start, end)
+    assert entries[0]['last_time'] == T0 + 90 * MS
+    assert service.lookup(entries, 100 * MS, start, end) == {}
+
+    job = ChannelJob('a', [e['path'] for e in entries], example_schema, start, end, ['counter'],
+                     resolution=100 * MS, aggregates=('max',))
+    rows = list(iter_channel_batches(job._replace(rollups=service.lookup(entries, 100 * MS, start, end))))
+    assert rows[-1]['counter_max'].tolist() == [95]
+    assert rows[-1]['count'].tolist() == [96]
+
+
+def test_multi_day_overview_from_rollups(relay_file, example_schema, tmp_path):
+    # One closed file a day, ten minutes of one record a second
+    second, day = 1_000_000_000, 86_400_000_000_000
+    t0 = T0 // day * day
+    for i in range(3):
+        relay_file(600, name=f'a/data_{i}.avro', index_interval=100, closed=True, t0=t0 + i * day,
+                   step=second)
+    catalog = FileCatalog(str(tmp_path), str(tmp_path / 'catalog.db'))
+    service = RollupService(catalog, str(tmp_path / 'rollup'), (second, 60 * second),
+                            lambda channel: example_schema)
+    assert service.run_once() == 3
+
+    start, end, resolution = t0, t0 + 3 * day, 3600 * second
+    entries = catalog.files_for('a', start, end)
+    rollups = service.lookup(entries, resolution, start, end)
+    assert len(rollups) == 3
+
+    # Costed from the rollups: nothing is scanned
+    job = ChannelJob('a', [e['path'] for e in entries], example_schema, start, end, ['counter'],
+                     resolution=resolution, aggregates=('max',), rollups=rollups)
+    estimate = CostModel().channel(job, entries)
+    assert estimate.input_bytes == 0
+    assert estimate.cpu_seconds < CostModel().channel(job._replace(rollups=None), entries).cpu_seconds
+
+    rows = list(iter_channel_batches(job))
+    assert np.concatenate([b['counter_max'] for b in rows]).tolist() == [599] * 3
+    assert (np.concatenate([b['time'] for b in rows]) - t0).tolist() == [0, day, 2 * day]
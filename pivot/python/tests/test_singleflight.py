@@ -0,0 +1,86 @@
+"""Tests for single-flight request coalescing"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def work():
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return 'export.h5'
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(flights.do, 'k', work)
+        started.wait(5)
+        followers = [pool.submit(flights.do, 'k', work) for _ in range(3)]
+        while flights.stats()['coalesced'] < 3:
+            time.sleep(0.01)
+        release.set()
+        results = [leader.result()] + [f.result() for f in followers]
+
+    assert len(runs) == 1
+    assert results == [('export.h5', False)] + [('export.h5', True)] * 3
+    assert flights.stats() == {'executed': 1, 'coalesced': 3, 'in_flight': 0}
+
+    # Finished key runs again
+    assert flights.do('k', lambda: 'again') == ('again', False)
+
+
+def test_error_reaches_all_waiters():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise RuntimeError('decode failed')
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flights.do, 'k', fail)
+        started.wait(5)
+        follower = pool.submit(flights.do, 'k', fail)
+        while flights.stats()['coalesced'] < 1:
+            time.sleep(0.01)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError, match='decode failed'):
+                future.result()
+
+    assert flights.in_flight == 0
+
+
+def test_share_reports_final_caller_count():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    shared = []
+
+    def work():
+        started.set()
+        release.wait(5)
+        return 'spool-file'
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        leader = pool.submit(flights.do, 'k', work, lambda result, users: shared.append((result, users)))
+        started.wait(5)
+        followers = [pool.submit(flights.do, 'k', work) for _ in range(2)]
+        while flights.stats()['coalesced'] < 2:
+            time.sleep(0.01)
+        release.set()
+        leader.result()
+        for f in followers:
+            f.result()
+
+    assert shared == [('spool-file', 3)]
@@ -0,0 +1,61 @@
+"""Tests for managed export temp files"""
+import os
+
+import pytest
+
+from spool import ExportSpool, SpoolFull
+
+
+def test_release_deletes_after_last_user(tmp_path):
+    spool = ExportSpool(str(tmp_path), max_bytes=1000)
+    path = spool.create()
+    with open(path, 'wb') as f:
+        f.write(b'x' * 100)
+    spool.commit(path)
+    spool.share(path, 2)
+    assert spool.stats() == {'files': 1, 'bytes': 100, 'max_bytes': 1000}
+
+    spool.release(path)
+    assert os.path.exists(path)
+    spool.release(path)
+    assert not os.path.exists(path)
+    assert spool.stats()['files'] == 0
+
+
+def test_quota(tmp_path):
+    spool = ExportSpool(str(tmp_path), max_bytes=50)
+    path = spool.create()
+    with open(path, 'wb') as f:
+        f.write(b'x' * 60)
+    spool.commit(path)
+
+    with pytest.raises(SpoolFull):
+        spool.create()
+    spool.discard(path)
+    spool.release(spool.create())
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_reservation_counts_until_commit(tmp_path):
+    # Files being written count with their expected size
+    spool = ExportSpool(str(tmp_path), max_bytes=100)
+    first = spool.create(60)
+    assert spool.stats()['bytes'] == 60
+    with pytest.raises(SpoolFull):
+        spool.create(60)
+
+    with open(first, 'wb') as f:
+        f.write(b'x' * 30)
+    spool.commit(first)
+    assert spool.stats()['bytes'] == 30
+    second = spool.create(60)
+    spool.release(second)
+    spool.release(first)
+    assert spool.stats()['bytes'] == 0
+
+
+def test_restart_cleanup(tmp_path):
+    spool = ExportSpool(str(tmp_path), max_bytes=1000)
+    leftover = spool.create()
+    ExportSpool(str(tmp_path), max_bytes=1000)
+    assert not os.path.exists(leftover)
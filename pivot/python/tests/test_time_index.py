@@ -0,0 +1,100 @@
+"""Tests for sparse time index and indexed block reads"""
+import pytest
+
+from avro_reader import iter_blocks, read_columns, read_header, read_records
+from time_index import TimeIndex, index_path
+
+from .conftest import make_record, write_relay_file
+
+
+def test_index_load_and_block_range(relay_file):
+    path, records, offsets = relay_file(100, index_interval=10)
+
+    index = TimeIndex.for_file(path)
+    assert len(index) == 10
+    assert index.interval == 10
+
+    # Window inside blocks 25..44 -> seek to block 20, stop at block 50
+    first, stop = index.block_range(records[25]['time'], records[44]['time'])
+    assert first == offsets[20]
+    assert stop == offsets[50]
+
+    # Open-ended windows
+    assert index.block_range(None, None) == (None, None)
+    assert index.block_range(records[0]['time'] - 1, None) == (None, None)
+    assert index.block_range(None, records[95]['time']) == (None, None)
+
+
+def test_duplicate_time_across_block_boundary(tmp_path, example_schema):
+    # Records 3 and 4 share a time; record 4 starts an indexed block
+    records = [make_record(i) for i in range(8)]
+    records[4]['time'] = records[3]['time']
+    path = str(tmp_path / 'data_1.avro')
+    offsets = write_relay_file(path, records, example_schema, index_interval=1, block_records=2)
+
+    t = records[3]['time']
+    assert TimeIndex.for_file(path).block_range(t, t) == (offsets[1], offsets[3])
+
+    columns = read_columns(path, t, t, example_schema)
+    assert columns['counter'].tolist() == [3, 4]
+
+
+def test_index_ignores_partial_entry(relay_file):
+    path, _, _ = relay_file(30, index_interval=10)
+    with open(index_path(path), 'ab') as f:
+        f.write(b'\x01\x02\x03')
+
+    assert len(TimeIndex.for_file(path)) == 3
+
+
+def test_missing_or_invalid_index(relay_file, tmp_path):
+    path, _, _ = relay_file(5)
+    assert TimeIndex.for_file(path) is None
+
+    bogus = tmp_path / 'bogus.idx'
+    bogus.write_bytes(b'NOPE' + b'\x00' * 20)
+    assert TimeIndex.load(str(bogus)) is None
+
+
+@pytest.mark.parametrize('header', [False, True])
+def test_read_records_time_window(relay_file, example_schema, header):
+    path, records, _ = relay_file(200, header=header, index_interval=16)
+
+    start, end = records[50]['time'], records[120]['time']
+    result = list(read_records(path, start, end, example_schema))
+
+    assert [r['counter'] for r in result] == list(range(50, 121))
+    assert result[0]['message'] == 'msg50'
+
+
+def test_read_records_decodes_only_indexed_range(relay_file, example_schema):
+    path, records, offsets = relay_file(200, index_interval=16)
+
+    # Corrupt data outside the indexed range: an indexed read never touches it
+    with open(path, 'r+b') as f:
+        f.seek(offsets[5])
+        f.write(b'\xff' * 8)
+
+    start, end = records[100]['time'], records[110]['time']
+    result = list(read_records(path, start, end, example_schema))
+    assert [r['counter'] for r in result] == list(range(100, 111))
+
+
+def test_truncated_trailing_block(relay_file, example_schema):
+    path, records, offsets = relay_file(10)
+    with open(path, 'r+b') as f:
+        f.truncate(offsets[9] + 5)
+
+    with open(path, 'rb') as f:
+        header = read_header(f)
+        blocks = list(iter_blocks(f, header.data_offset))
+    assert len(blocks) == 9
+    assert blocks[-1].end == offsets[9]
+
+    assert len(list(read_records(path, schema=example_schema))) == 9
+
+
+def test_headerless_file_requires_schema(relay_file):
+    path, _, _ = relay_file(3)
+    with pytest.raises(ValueError):
+        list(read_records(path))
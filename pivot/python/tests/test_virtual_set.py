@@ -0,0 +1,59 @@
+"""Tests for virtual-dataset Set exports over columnar shards"""
+import io
+
+import h5py
+
+from catalog import FileCatalog
+from catcol import ShardService
+from export import ChannelJob, ExportPool
+
+T0 = 1_700_000_000_000_000_000
+MS = 1_000_000
+
+
+def read_set(target):
+    with h5py.File(target, 'r') as f:
+        return {name: {signal: f[name][signal][:].tolist() for signal in f[name]}
+                for name in f if name != '_tail'}
+
+
+def test_virtual_set_matches_copy(relay_file, example_schema, tmp_path):
+    for channel in ('a', 'b'):
+        for i in range(2):
+            relay_file(100, name=f'{channel}/data_{i}.avro', index_interval=16, closed=True,
+                       t0=T0 + i * 100 * MS, step=MS)
+        relay_file(50, name=f'{channel}/data_2.avro', index_interval=16, t0=T0 + 200 * MS, step=MS)
+
+    catalog = FileCatalog(str(tmp_path), str(tmp_path / 'catalog.db'))
+    service = ShardService(catalog, str(tmp_path / 'shards'), lambda channel: example_schema)
+    service.run_once()
+
+    start, end = T0 + 55 * MS, T0 + 230 * MS
+    jobs = []
+    for channel, signals in (('a', None), ('b', ['counter'])):
+        entries = catalog.files_for(channel, start, end)
+        jobs.append(ChannelJob(channel, [e['path'] for e in entries], example_schema, start, end, signals,
+                               shards=service.lookup(entries)))
+
+    pool = ExportPool(0, batch_bytes=1024)
+    pool.write(str(tmp_path / 'copy.h5'), jobs)
+    pool.write(str(tmp_path / 'set.h5'), jobs, 'hdf5-virtual')
+
+    virtual = read_set(tmp_path / 'set.h5')
+    assert virtual == read_set(tmp_path / 'copy.h5')
+    assert virtual['a']['counter'] == list(range(55, 100)) + list(range(100)) + list(range(31))
+    assert set(virtual['b']) == {'time', 'counter'}
+
+    with h5py.File(tmp_path / 'set.h5', 'r') as f:
+        assert f['a/counter'].is_virtual
+        # Only the open tail is stored in the set file itself
+        assert list(f['_tail/a/2']['counter'][:]) == list(range(31))
+
+
+def test_virtual_set_in_memory_without_shards(relay_file, example_schema):
+    path, _, _ = relay_file(20, name='a/data_1.avro')
+    buf = io.BytesIO()
+    ExportPool(0).write(buf, [ChannelJob('a', [path], example_schema, None, None, ['ramp'])], 'hdf5-virtual')
+
+    data = read_set(io.BytesIO(buf.getvalue()))
+    assert data['a']['ramp'] == [-float(i) for i in range(20)]
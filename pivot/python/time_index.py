@@ -0,0 +1,108 @@
+"""
+Sparse time index for relay AVRO files
+Reads the <file>.avro.idx sidecar written by the relay (C and Python)
+
+Layout (little-endian):
+- header: magic "SDIX", version (uint32), interval in blocks (uint32), reserved
+- entries: timestamp of the block's first record (int64), block offset (uint64)
+- trailer (closed files only): magic "SDIE", reserved, first time (int64),
+  last time (int64), record count (uint64), data file size (uint64)
+"""
+import bisect
+import struct
+from collections import namedtuple
+
+INDEX_MAGIC = b'SDIX'
+INDEX_TRAILER_MAGIC = b'SDIE'
+INDEX_VERSION = 1
+HEADER = struct.Struct('<4sIII')
+ENTRY = struct.Struct('<qQ')
+TRAILER = struct.Struct('<4s4xqqQQ')
+
+# Summary of a closed file, from the index trailer
+FileSummary = namedtuple('FileSummary', ['first_time', 'last_time', 'record_count', 'bytes'])
+
+
+def index_path(avro_path: str) -> str:
+    """Path of the index sidecar for an AVRO file."""
+    return avro_path + '.idx'
+
+
+class TimeIndex:
+    """Sparse (timestamp -> block offset) index of one AVRO file."""
+
+    def __init__(self, times, offsets, interval: int = 1, summary=None):
+        self.times = list(times)
+        self.offsets = list(offsets)
+        self.interval = interval
+        self.summary = summary
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @classmethod
+    def load(cls, path: str):
+        """Load an index file. Returns None if missing or not an index."""
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+        except OSError:
+            return None
+
+        if len(raw) < HEADER.size:
+            return None
+        magic, version, interval, _ = HEADER.unpack_from(raw)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            return None
+
+        # Trailer makes the body length 8 mod 16; entries never do
+        body = raw[HEADER.size:]
+        summary = None
+        if len(body) >= TRAILER.size and (len(body) - TRAILER.size) % ENTRY.size == 0:
+            magic, *fields = TRAILER.unpack_from(body, len(body) - TRAILER.size)
+            if magic == INDEX_TRAILER_MAGIC:
+                summary = FileSummary(*fields)
+                body = body[:-TRAILER.size]
+
+        # Ignore a partially written trailing entry (file may still be growing)
+        body = body[:len(body) - len(body) % ENTRY.size]
+
+        times, offsets = [], []
+        for timestamp, offset in ENTRY.iter_unpack(body):
+            times.append(timestamp)
+            offsets.append(offset)
+        return cls(times, offsets, interval, summary)
+
+    @classmethod
+    def for_file(cls, avro_path: str):
+        """Load the index sidecar of an AVRO file, if any."""
+        return cls.load(index_path(avro_path))
+
+    def block_range(self, start=None, end=None):
+        """
+        Byte range of blocks that can hold records in [start, end].
+
+        Returns (first, stop): first is the offset of the last indexed block
+        starting before start (None = beginning of data), stop is the offset
+        of the first indexed block starting after end (None = EOF). A block
+        starting at start may follow one that ends with records at start, so
+        first is strictly before it. Assumes record times are non-decreasing
+        within a file.
+        """
+        first = None
+        stop = None
+        if not self.offsets:
+            return first, stop
+
+        if start is not None:
+            pos = bisect.bisect_left(self.times, start) - 1
+            if pos >= 0:
+                first = self.offsets[pos]
+
+        if end is not None:
+            pos = bisect.bisect_right(self.times, end)
+            if pos < len(self.offsets):
+                stop = self.offsets[pos]
+
+        return first, stop
+
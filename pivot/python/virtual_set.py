@@ -0,0 +1,109 @@
+"""
+Virtual Set exports
+A Set (several channels over one time range, one HDF5 file) written as
+HDF5 virtual datasets: each channel/signal dataset maps the requested rows
+of the columnar shards (catcol.py) instead of copying them, so building a
+set is a metadata write. Rows of files without a shard (the open tail) and
+of files overlapping in time (merged by timestamp) are copied into
+`_tail/<channel>/<n>` groups of the same file and mapped too.
+
+The file references shards by absolute path: it is meant for analysis on
+the storage host, and is only readable while those shards exist.
+"""
+import os
+from collections import namedtuple
+
+import h5py
+import numpy as np
+
+from catcol import SHARD_GROUP
+from hdf5_writer import DEFAULT_CHUNK_ROWS, Hdf5StreamWriter
+from merge import overlap_groups
+
+VIRTUAL_FORMAT = 'hdf5-virtual'
+TAIL_GROUP = '_tail'
+
+# Rows [lo, hi) of the datasets (name -> (dtype, length)) in group of file
+Piece = namedtuple('Piece', ['file', 'group', 'lo', 'hi', 'datasets'])
+
+
+def _datasets(grp, names=None):
+    return {name: (dset.dtype, dset.shape[0]) for name, dset in grp.items()
+            if names is None or name in names}
+
+
+def shard_piece(shard_path: str, start=None, end=None, signals=None, time_field: str = 'time'):
+    """Piece of a shard within [start, end] (the time column is only read for edge shards)."""
+    names = None if signals is None else set(signals) | {time_field}
+    with h5py.File(shard_path, 'r') as f:
+        grp = f[SHARD_GROUP]
+        if time_field not in grp:
+            return None
+        rows = grp[time_field].shape[0]
+        lo, hi = 0, rows
+        first, last = grp.attrs.get('first_time'), grp.attrs.get('last_time')
+        if first is None or (start is not None and first < start) or (end is not None and last > end):
+            times = grp[time_field][:]
+            lo = 0 if start is None else int(np.searchsorted(times, start, 'left'))
+            hi = rows if end is None else int(np.searchsorted(times, end, 'right'))
+        if hi <= lo:
+            return None
+        return Piece(os.path.abspath(shard_path), SHARD_GROUP, lo, hi, _datasets(grp, names))
+
+
+def write_virtual_set(target, jobs, read_files, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                      progress=None, time_field: str = 'time'):
+    """
+    Write channel jobs (in order) as a virtual Set file. target is a path or
+    a writable binary file object. Files listed in job.shards are mapped;
+    read_files(job, paths) yields the time-ordered column batches of the
+    others (and of overlapping runs), which are copied into the tail groups.
+    """
+    with h5py.File(target, 'w') as f:
+        tail = Hdf5StreamWriter(f, chunk_rows)
+        for done, job in enumerate(jobs, 1):
+            pieces = []
+            shards = job.shards or {}
+            for files in overlap_groups(job.files, job.times):
+                if len(files) == 1 and files[0] in shards:
+                    piece = shard_piece(shards[files[0]], job.start, job.end, job.signals, time_field)
+                    if piece is not None:
+                        pieces.append(piece)
+                    continue
+
+                group = f'{TAIL_GROUP}/{job.channel}/{len(pieces)}'
+                for columns in read_files(job, files):
+                    tail.append(group, columns)
+                rows = tail.rows.get(group, 0)
+                if rows:
+                    tail.finish()
+                    pieces.append(Piece('.', group, 0, rows, _datasets(f[group])))
+
+            write_channel_layout(f.require_group(job.channel), pieces, time_field)
+            if progress:
+                progress(done, len(jobs))
+
+
+def write_channel_layout(grp, pieces, time_field: str = 'time'):
+    """One virtual dataset per signal, concatenating the pieces' rows."""
+    total = sum(piece.hi - piece.lo for piece in pieces)
+    if not total:
+        return
+
+    signals = {}
+    for piece in pieces:
+        for name, (dtype, _) in piece.datasets.items():
+            signals.setdefault(name, dtype)
+    names = sorted(signals, key=lambda name: name != time_field)
+
+    for name in names:
+        layout = h5py.VirtualLayout(shape=(total,), dtype=signals[name])
+        offset = 0
+        for piece in pieces:
+            count = piece.hi - piece.lo
+            if name in piece.datasets:
+                source = h5py.VirtualSource(piece.file, f'{piece.group}/{name}',
+                                            shape=(piece.datasets[name][1],))
+                layout[offset:offset + count] = source[piece.lo:piece.hi]
+            offset += count
+        grp.create_virtual_dataset(name, layout)
@@ -5,6 +5,8 @@
 #include <stdbool.h>
 #include <stdio.h>
 #include <time.h>
+#include <netinet/in.h>
+#include <pthread.h>
 
 /* Configuration limits */
 #define MAX_PATH_LEN 256
@@ -12,6 +14,41 @@
 #define MAX_PACKET_SIZE 65535
 #define SYNC_MARKER_SIZE 16
 
+/* Sparse time index (<file>.avro.idx) */
+#define INDEX_MAGIC "SDIX"
+#define INDEX_VERSION 1
+#define INDEX_HEADER_SIZE 16
+#define INDEX_ENTRY_SIZE 16
+#define INDEX_TRAILER_MAGIC "SDIE"
+#define INDEX_TRAILER_SIZE 40
+#define DEFAULT_INDEX_INTERVAL 64  /* blocks between index entries */
+
+/* Multi-record blocks: a block is written at whichever limit comes first */
+#define DEFAULT_BLOCK_BYTES 65536
+#define DEFAULT_BLOCK_RECORDS 1000
+#define DEFAULT_BLOCK_DELAY_MS 100
+
+/* Rotation: start a new data file at a size or age */
+#define ROTATE_SIZE 0  /* rotation_threshold in bytes */
+#define ROTATE_TIME 1  /* rotation_threshold in seconds */
+#define DEFAULT_PREALLOC_BYTES (64 * 1024 * 1024)  /* next file, time rotation */
+#define MAX_RETIRED 4  /* rotated-out files waiting to be closed */
+
+/* Durability: when written data is forced to disk (fdatasync) */
+#define DURABILITY_NONE 0      /* page cache only: the kernel writes back when it likes */
+#define DURABILITY_INTERVAL 1  /* fdatasync every value ms (if anything was written) */
+#define DURABILITY_BYTES 2     /* fdatasync every value bytes */
+#define DEFAULT_WRITEBACK_BYTES (1024 * 1024)  /* start writeback every N bytes, 0 disables */
+
+/* Disk writer thread: datagrams reach it through a ring buffer */
+#define DEFAULT_RING_BYTES (16 * 1024 * 1024)
+#define RX_TIMEOUT_MS 100  /* receive timeout, so shutdown and writer failures are seen */
+
+/* Batched datagram I/O (recvmmsg/sendmmsg) */
+#define DEFAULT_BATCH_SIZE 32  /* datagrams per receive call, 1 = one per call */
+#define MAX_BATCH_SIZE 256
+#define DEFAULT_BATCH_TIMEOUT_US 0  /* extra wait to fill a batch, 0 = take what is queued */
+
 /* Relay configuration */
 typedef struct {
     char name[MAX_NAME_LEN];
@@ -29,23 +66,157 @@ typedef struct {
     int decimation_factor;
 
     /* Rotation config */
-    size_t rotation_threshold;  /* bytes */
+    int rotation_mode;          /* ROTATE_SIZE or ROTATE_TIME */
+    size_t rotation_threshold;  /* bytes (size) or seconds (time) */
+    size_t prealloc_bytes;      /* preallocated for the next file, 0 = create only */
+
+    /* Time index config */
+    int index_interval;  /* blocks between index entries, 0 disables */
+
+    /* Block config */
+    size_t block_bytes;   /* block size limit */
+    int block_records;    /* records per block limit, 1 = one record per block */
+    int block_delay_ms;   /* age limit of a block's first record */
+
+    /* Durability config */
+    int durability;           /* DURABILITY_* */
+    uint64_t durability_value;  /* ms (interval) or bytes (bytes) */
+    size_t writeback_bytes;   /* sync_file_range window, 0 disables */
+
+    /* Disk writer config */
+    size_t ring_bytes;  /* datagrams queued for the disk writer */
+    bool ring_block;    /* ring full: wait for room (true) or drop from the file (false) */
+
+    /* Batched I/O config */
+    int batch_size;        /* datagrams per recvmmsg/sendmmsg */
+    int batch_timeout_us;  /* wait after the first datagram to fill a batch */
 } relay_config_t;
 
+/* Durability policy and its cost, kept across rotations */
+typedef struct {
+    int mode;                 /* DURABILITY_* */
+    uint64_t value;           /* ms or bytes */
+    size_t writeback_bytes;   /* sync_file_range window, 0 disables */
+    uint64_t syncs;           /* fdatasync calls */
+    uint64_t sync_ns;         /* time spent in them */
+    uint64_t sync_ns_max;
+    uint64_t writebacks;      /* sync_file_range windows started */
+} durability_t;
+
 /* AVRO writer state */
 typedef struct {
     FILE *fp;
     char filepath[MAX_PATH_LEN];
     size_t current_size;
     uint8_t sync_marker[SYNC_MARKER_SIZE];
+
+    /* Sparse time index alongside the data file */
+    FILE *index_fp;
+    char index_path[MAX_PATH_LEN + 8];
+    int index_interval;
+    uint64_t block_count;
+
+    /* File summary, written as the index trailer on close */
+    uint64_t record_count;
+    bool has_time;
+    int64_t first_time;
+    int64_t last_time;
+
+    /* Current multi-record block, written at a size, count or time limit */
+    uint8_t *block_buf;
+    size_t block_capacity;
+    size_t block_len;
+    uint64_t block_records;
+    bool block_has_time;
+    int64_t block_first_time;   /* leading timestamp of the block's first record */
+    int64_t block_started_ms;   /* monotonic time of the block's first record */
+    size_t block_max_bytes;
+    int block_max_records;      /* 1 = one record per block */
+    int block_max_delay_ms;
+
+    /* Durability: bytes of this file already synced / handed to writeback */
+    durability_t durability;
+    size_t synced_size;
+    size_t writeback_size;
+    size_t writeback_start;     /* start of the window handed to writeback last */
+    int64_t synced_ms;          /* monotonic time of the last sync */
+    int64_t opened_ms;          /* monotonic time the file was started (time rotation) */
 } avro_writer_t;
 
+/* Next data file, created (and preallocated) ahead of rotation */
+typedef struct {
+    FILE *fp;
+    FILE *index_fp;                  /* NULL if the index is disabled */
+    char path[MAX_PATH_LEN];         /* temporary name until rotation */
+    char index_path[MAX_PATH_LEN + 8];
+} avro_spare_t;
+
+/* Data file rotated out, still to be closed */
+typedef struct {
+    FILE *fp;
+    FILE *index_fp;
+    size_t size;  /* bytes written: space preallocated past it is released */
+    bool sync;    /* fdatasync before closing (durability policy) */
+} avro_retired_t;
+
 /* Decimator state */
 typedef struct {
     int factor;
     int count;
 } decimator_t;
 
+/* Batch of received datagrams: preallocated slots of MAX_PACKET_SIZE */
+typedef struct {
+    int size;                 /* slots */
+    uint8_t *buffers;         /* size * MAX_PACKET_SIZE bytes, reused by every batch */
+    size_t *lengths;          /* datagram length per slot */
+    struct sockaddr_in *src;  /* sender per slot */
+    void *recv_msgs;          /* struct mmsghdr[size] (Linux) */
+    void *send_msgs;
+    void *recv_iovs;          /* struct iovec[size] */
+    void *send_iovs;
+} packet_batch_t;
+
+/* Single-producer/single-consumer ring of datagrams */
+typedef struct {
+    uint8_t *buffer;
+    size_t capacity;  /* bytes, a power of two */
+    uint64_t head;    /* bytes ever pushed (stored by the producer) */
+    uint64_t tail;    /* bytes ever popped (stored by the consumer) */
+} packet_ring_t;
+
+/* Rotation thread: keeps the next file ready and closes rotated-out files */
+typedef struct {
+    const relay_config_t *config;
+    pthread_t thread;
+    pthread_mutex_t lock;
+    pthread_cond_t cond;
+    avro_spare_t spare;
+    bool spare_ready;
+    bool spare_wanted;
+    avro_retired_t retired[MAX_RETIRED];
+    int retired_count;
+    bool stop;
+    uint64_t swaps;      /* rotations to a ready spare */
+    uint64_t fallbacks;  /* rotations that had to create the file inline */
+} rotator_t;
+
+/* AVRO writer running on its own thread, fed through a ring */
+typedef struct {
+    avro_writer_t writer;    /* owned by the writer thread once started */
+    rotator_t rotator;
+    packet_ring_t ring;
+    const relay_config_t *config;
+    pthread_t thread;
+    bool block_when_full;
+    bool stop;
+    bool failed;
+    uint64_t written;    /* records handed to the AVRO writer */
+    uint64_t submitted;  /* receive thread counters */
+    uint64_t dropped;
+    uint64_t stalls;     /* datagrams that waited for room */
+} disk_writer_t;
+
 /* Socket set */
 typedef struct {
     int rx_sock;          /* UDP receive socket */
@@ -59,9 +230,18 @@ typedef struct {
 int load_config(const char *channel_name, relay_config_t *config);
 
 /* AVRO writer */
-int avro_writer_init(avro_writer_t *writer, const char *output_dir);
-int avro_writer_write_block(avro_writer_t *writer, const uint8_t *data, size_t len);
+int avro_writer_init(avro_writer_t *writer, const char *output_dir, int index_interval);
+int avro_writer_set_blocks(avro_writer_t *writer, size_t max_bytes, int max_records, int max_delay_ms);
+int avro_writer_append(avro_writer_t *writer, const uint8_t *data, size_t len);
+int avro_writer_set_durability(avro_writer_t *writer, int mode, uint64_t value, size_t writeback_bytes);
+int avro_writer_flush(avro_writer_t *writer);
+int avro_writer_poll(avro_writer_t *writer);
 int avro_writer_rotate(avro_writer_t *writer, const char *output_dir);
+int avro_writer_create_spare(avro_spare_t *spare, const char *output_dir, int index_interval,
+                             size_t prealloc_bytes);
+void avro_writer_discard_spare(avro_spare_t *spare);
+int avro_writer_swap(avro_writer_t *writer, avro_spare_t *spare, avro_retired_t *retired);
+void avro_writer_retire(avro_retired_t *retired);
 void avro_writer_close(avro_writer_t *writer);
 
 /* Decimator */
@@ -72,7 +252,37 @@ bool decimator_should_send(decimator_t *dec);
 int setup_sockets(const relay_config_t *config, relay_sockets_t *socks);
 void close_sockets(relay_sockets_t *socks);
 
+/* Batched I/O */
+int packet_batch_init(packet_batch_t *batch, int size);
+void packet_batch_free(packet_batch_t *batch);
+uint8_t *packet_batch_data(const packet_batch_t *batch, int i);
+int packet_batch_recv(packet_batch_t *batch, int sock, int timeout_us);
+int packet_batch_send(packet_batch_t *batch, int sock, const struct sockaddr_in *dst,
+                      const bool *select, int count);
+
+/* Ring */
+int packet_ring_init(packet_ring_t *ring, size_t capacity);
+void packet_ring_free(packet_ring_t *ring);
+int packet_ring_push(packet_ring_t *ring, const uint8_t *data, size_t len);
+const uint8_t *packet_ring_peek(packet_ring_t *ring, size_t *len);
+void packet_ring_pop(packet_ring_t *ring);
+size_t packet_ring_used(packet_ring_t *ring);
+
+/* Rotation thread */
+int rotator_start(rotator_t *rot, const relay_config_t *config);
+bool rotator_due(const rotator_t *rot, const avro_writer_t *writer);
+int rotator_rotate(rotator_t *rot, avro_writer_t *writer);
+void rotator_stop(rotator_t *rot);
+
+/* Disk writer thread */
+int disk_writer_start(disk_writer_t *dw, const relay_config_t *config);
+int disk_writer_submit(disk_writer_t *dw, const uint8_t *data, size_t len);
+bool disk_writer_failed(disk_writer_t *dw);
+uint64_t disk_writer_written(disk_writer_t *dw);
+void disk_writer_stop(disk_writer_t *dw);
+
 /* Utils */
 void encode_long(int64_t value, uint8_t *buf, size_t *len);
+size_t decode_long(const uint8_t *buf, size_t len, int64_t *value);
 
 #endif /* RELAY_H */
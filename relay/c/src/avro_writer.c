@@ -1,8 +1,11 @@
+#define _GNU_SOURCE  /* sync_file_range */
 #include "relay.h"
 #include <string.h>
 #include <stdlib.h>
 #include <sys/stat.h>
 #include <errno.h>
+#include <fcntl.h>
+#include <unistd.h>
 
 /* Fixed AVRO sync marker (must match Python implementation) */
 static const uint8_t FIXED_SYNC_MARKER[SYNC_MARKER_SIZE] = {
@@ -10,6 +13,22 @@ static const uint8_t FIXED_SYNC_MARKER[SYNC_MARKER_SIZE] = {
     0x0a, 0x68, 0x33, 0x7f, 0xc2, 0x50, 0x95, 0x63
 };
 
+/**
+ * Monotonic clock in nanoseconds
+ */
+static int64_t now_ns(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (int64_t)ts.tv_sec * 1000000000 + ts.tv_nsec;
+}
+
+/**
+ * Monotonic clock in milliseconds (block deadlines, sync intervals)
+ */
+static int64_t now_ms(void) {
+    return now_ns() / 1000000;
+}
+
 /**
  * Create output directory if it doesn't exist
  */
@@ -24,17 +43,129 @@ static int ensure_dir(const char *path) {
     return 0;
 }
 
+/**
+ * Store values little-endian (index files are host independent)
+ */
+static void put_le32(uint8_t *buf, uint32_t value) {
+    for (int i = 0; i < 4; i++) {
+        buf[i] = (uint8_t)(value >> (8 * i));
+    }
+}
+
+static void put_le64(uint8_t *buf, uint64_t value) {
+    for (int i = 0; i < 8; i++) {
+        buf[i] = (uint8_t)(value >> (8 * i));
+    }
+}
+
+/**
+ * Create a sparse time index file and write its header:
+ * - magic "SDIX" (4 bytes)
+ * - version (uint32 LE)
+ * - index interval in blocks (uint32 LE)
+ * - reserved (4 bytes)
+ */
+static FILE *index_create(const char *path, int index_interval) {
+    FILE *fp = fopen(path, "wb");
+    if (!fp) {
+        perror("fopen index");
+        return NULL;
+    }
+
+    uint8_t header[INDEX_HEADER_SIZE] = {0};
+    memcpy(header, INDEX_MAGIC, 4);
+    put_le32(header + 4, INDEX_VERSION);
+    put_le32(header + 8, (uint32_t)index_interval);
+
+    if (fwrite(header, 1, INDEX_HEADER_SIZE, fp) != INDEX_HEADER_SIZE) {
+        perror("fwrite index header");
+        fclose(fp);
+        return NULL;
+    }
+
+    return fp;
+}
+
+/**
+ * Append index entry: timestamp of the block's first record (int64 LE)
+ * and byte offset of the block, i.e. just past the preceding sync marker
+ * (uint64 LE). The timestamp is the record's leading long (the schema's
+ * `time` field).
+ */
+static int index_add(avro_writer_t *writer, int64_t timestamp) {
+    uint8_t entry[INDEX_ENTRY_SIZE];
+    put_le64(entry, (uint64_t)timestamp);
+    put_le64(entry + 8, (uint64_t)writer->current_size);
+
+    if (fwrite(entry, 1, INDEX_ENTRY_SIZE, writer->index_fp) != INDEX_ENTRY_SIZE) {
+        perror("fwrite index entry");
+        return -1;
+    }
+
+    return 0;
+}
+
+/**
+ * Write index trailer summarizing the closed file, so catalogs can pick up
+ * its time range without reading the data:
+ * - magic "SDIE" (4 bytes) + reserved (4 bytes)
+ * - first record time (int64 LE), last record time (int64 LE)
+ * - record count (uint64 LE), data file size in bytes (uint64 LE)
+ */
+static void index_finish(avro_writer_t *writer) {
+    uint8_t trailer[INDEX_TRAILER_SIZE] = {0};
+    memcpy(trailer, INDEX_TRAILER_MAGIC, 4);
+    put_le64(trailer + 8, (uint64_t)writer->first_time);
+    put_le64(trailer + 16, (uint64_t)writer->last_time);
+    put_le64(trailer + 24, writer->record_count);
+    put_le64(trailer + 32, (uint64_t)writer->current_size);
+
+    if (fwrite(trailer, 1, INDEX_TRAILER_SIZE, writer->index_fp) != INDEX_TRAILER_SIZE) {
+        perror("fwrite index trailer");
+    }
+}
+
+/**
+ * Name a new data file: data_<timestamp>.avro, or data_<timestamp>_<n>.avro
+ * if a file was already started in the same second
+ */
+static void data_path(char *path, const char *output_dir) {
+    time_t now = time(NULL);
+    snprintf(path, MAX_PATH_LEN, "%s/data_%ld.avro", output_dir, (long)now);
+    struct stat st;
+    for (int n = 1; stat(path, &st) == 0; n++) {
+        snprintf(path, MAX_PATH_LEN, "%s/data_%ld_%d.avro", output_dir, (long)now, n);
+    }
+}
+
+/**
+ * Reset the per-file state for a newly opened file
+ */
+static void start_file(avro_writer_t *writer) {
+    writer->current_size = 0;
+    writer->block_count = 0;
+    writer->record_count = 0;
+    writer->has_time = false;
+    writer->first_time = 0;
+    writer->last_time = 0;
+    writer->synced_size = 0;
+    writer->writeback_size = 0;
+    writer->writeback_start = 0;
+    writer->synced_ms = now_ms();
+    writer->opened_ms = writer->synced_ms;
+}
+
 /**
  * Initialize AVRO writer with new file
+ * index_interval: blocks between time index entries (0 disables the index)
  */
-int avro_writer_init(avro_writer_t *writer, const char *output_dir) {
+int avro_writer_init(avro_writer_t *writer, const char *output_dir, int index_interval) {
     if (ensure_dir(output_dir) != 0) {
         return -1;
     }
 
     /* Generate filename: data_<timestamp>.avro */
-    time_t now = time(NULL);
-    snprintf(writer->filepath, MAX_PATH_LEN, "%s/data_%ld.avro", output_dir, now);
+    data_path(writer->filepath, output_dir);
 
     writer->fp = fopen(writer->filepath, "wb");
     if (!writer->fp) {
@@ -42,41 +173,137 @@ int avro_writer_init(avro_writer_t *writer, const char *output_dir) {
         return -1;
     }
 
-    writer->current_size = 0;
     memcpy(writer->sync_marker, FIXED_SYNC_MARKER, SYNC_MARKER_SIZE);
+    writer->index_fp = NULL;
+    writer->index_interval = index_interval;
+    start_file(writer);
+
+    /* One record per block until avro_writer_set_blocks */
+    writer->block_buf = NULL;
+    writer->block_capacity = 0;
+    writer->block_len = 0;
+    writer->block_records = 0;
+    writer->block_max_bytes = 0;
+    writer->block_max_records = 1;
+    writer->block_max_delay_ms = 0;
+
+    /* Page cache only until avro_writer_set_durability */
+    memset(&writer->durability, 0, sizeof(writer->durability));
+
+    if (index_interval > 0) {
+        snprintf(writer->index_path, sizeof(writer->index_path), "%s.idx", writer->filepath);
+        writer->index_fp = index_create(writer->index_path, index_interval);
+        if (!writer->index_fp) {
+            avro_writer_close(writer);
+            return -1;
+        }
+    }
 
     printf("Created AVRO file: %s\n", writer->filepath);
     return 0;
 }
 
 /**
- * Write AVRO block (matching Python format):
- * - object count (long, always 1)
- * - byte count (long, length of data)
- * - data (raw bytes)
- * - sync marker (16 bytes)
+ * Apply the durability policy to the flushed data: start writeback of each
+ * full writeback window (waiting for the window before it, so dirty pages
+ * are written steadily instead of in large bursts), and fdatasync the data
+ * (then the index) when the interval or byte count is due, or when force is
+ * set and the policy is not none.
  */
-int avro_writer_write_block(avro_writer_t *writer, const uint8_t *data, size_t len) {
-    if (!writer->fp) {
-        fprintf(stderr, "AVRO writer not initialized\n");
-        return -1;
+static int sync_data(avro_writer_t *writer, bool force) {
+    durability_t *d = &writer->durability;
+    int fd = fileno(writer->fp);
+
+#ifdef __linux__
+    if (d->writeback_bytes > 0 && writer->current_size - writer->writeback_size >= d->writeback_bytes) {
+        /* Only the previous window is waited on: the cost does not grow with the file */
+        size_t start = writer->writeback_size, prev = writer->writeback_start;
+        if (sync_file_range(fd, start, writer->current_size - start, SYNC_FILE_RANGE_WRITE) != 0 ||
+            (start > prev && sync_file_range(fd, prev, start - prev, SYNC_FILE_RANGE_WAIT_BEFORE |
+                                             SYNC_FILE_RANGE_WRITE | SYNC_FILE_RANGE_WAIT_AFTER) != 0)) {
+            perror("sync_file_range");
+        }
+        writer->writeback_start = start;
+        writer->writeback_size = writer->current_size;
+        d->writebacks++;
     }
+#endif
 
-    /* Encode object count = 1 */
-    uint8_t count_buf[10];
-    size_t count_len;
-    encode_long(1, count_buf, &count_len);
-    if (fwrite(count_buf, 1, count_len, writer->fp) != count_len) {
-        perror("fwrite count");
+    if (d->mode == DURABILITY_NONE || writer->current_size == writer->synced_size) {
+        return 0;
+    }
+    bool due = force;
+    if (d->mode == DURABILITY_INTERVAL) {
+        due = due || now_ms() - writer->synced_ms >= (int64_t)d->value;
+    } else if (d->mode == DURABILITY_BYTES) {
+        due = due || writer->current_size - writer->synced_size >= d->value;
+    }
+    if (!due) {
+        return 0;
+    }
+
+    int64_t start = now_ns();
+    if (fdatasync(fd) != 0) {
+        perror("fdatasync");
+        return -1;
+    }
+    if (writer->index_fp && fdatasync(fileno(writer->index_fp)) != 0) {
+        perror("fdatasync(index)");
         return -1;
     }
+    uint64_t elapsed = (uint64_t)(now_ns() - start);
 
-    /* Encode byte count = data length */
-    uint8_t len_buf[10];
-    size_t len_len;
-    encode_long((int64_t)len, len_buf, &len_len);
-    if (fwrite(len_buf, 1, len_len, writer->fp) != len_len) {
-        perror("fwrite length");
+    writer->synced_size = writer->current_size;
+    writer->synced_ms = now_ms();
+    d->syncs++;
+    d->sync_ns += elapsed;
+    if (elapsed > d->sync_ns_max) {
+        d->sync_ns_max = elapsed;
+    }
+    return 0;
+}
+
+/**
+ * Set the durability policy: DURABILITY_NONE leaves written data to the page
+ * cache, DURABILITY_INTERVAL syncs it every value ms and DURABILITY_BYTES
+ * every value bytes. Data at risk in a crash is bounded by the policy; the
+ * sync counters measure its cost. writeback_bytes > 0 smooths writeback
+ * with sync_file_range (Linux) whatever the policy.
+ */
+int avro_writer_set_durability(avro_writer_t *writer, int mode, uint64_t value, size_t writeback_bytes) {
+    writer->durability.mode = mode;
+    writer->durability.value = value;
+    writer->durability.writeback_bytes = writeback_bytes;
+    return 0;
+}
+
+/**
+ * Write one AVRO block holding count records, up to block_max_records
+ * (the Python relay writes one record per block):
+ * - object count (long, records in the block)
+ * - byte count (long, length of data)
+ * - data (the records' encodings, concatenated)
+ * - sync marker (16 bytes)
+ * Then flush (data first, so index entries never lead the data).
+ * has_time/first_time: leading timestamp of the block's first record.
+ */
+static int write_block(avro_writer_t *writer, const uint8_t *data, size_t len, uint64_t count,
+                       bool has_time, int64_t first_time) {
+    /* Index every Nth block, starting with the first */
+    if (has_time && writer->index_fp && writer->block_count % writer->index_interval == 0) {
+        if (index_add(writer, first_time) != 0) {
+            return -1;
+        }
+    }
+
+    /* Encode object count and byte count */
+    uint8_t header[20];
+    size_t count_len, len_len;
+    encode_long((int64_t)count, header, &count_len);
+    encode_long((int64_t)len, header + count_len, &len_len);
+    size_t header_len = count_len + len_len;
+    if (fwrite(header, 1, header_len, writer->fp) != header_len) {
+        perror("fwrite block header");
         return -1;
     }
 
@@ -93,22 +320,286 @@ int avro_writer_write_block(avro_writer_t *writer, const uint8_t *data, size_t l
     }
 
     /* Update size tracking */
-    writer->current_size += count_len + len_len + len + SYNC_MARKER_SIZE;
+    writer->current_size += header_len + len + SYNC_MARKER_SIZE;
+    writer->block_count++;
 
-    /* Flush to disk */
+    /* Group commit: one flush per block */
     fflush(writer->fp);
+    if (writer->index_fp) {
+        fflush(writer->index_fp);
+    }
+
+    return sync_data(writer, false);
+}
+
+/**
+ * Set block limits: a block is written once it holds max_records records or
+ * max_bytes bytes, or its first record is max_delay_ms old (checked on each
+ * append and by avro_writer_poll), whichever comes first. max_records <= 1
+ * writes every record as its own block.
+ */
+int avro_writer_set_blocks(avro_writer_t *writer, size_t max_bytes, int max_records, int max_delay_ms) {
+    if (avro_writer_flush(writer) != 0) {
+        return -1;
+    }
+    free(writer->block_buf);
+    writer->block_buf = NULL;
+    writer->block_capacity = 0;
+
+    writer->block_max_bytes = max_bytes;
+    writer->block_max_records = max_records > 1 ? max_records : 1;
+    writer->block_max_delay_ms = max_delay_ms;
+    if (writer->block_max_records == 1) {
+        return 0;
+    }
 
+    /* A block closes at max_bytes, so it never holds more than one packet past it */
+    writer->block_capacity = max_bytes + MAX_PACKET_SIZE;
+    writer->block_buf = malloc(writer->block_capacity);
+    if (!writer->block_buf) {
+        perror("malloc(block)");
+        writer->block_capacity = 0;
+        writer->block_max_records = 1;
+        return -1;
+    }
     return 0;
 }
 
+/**
+ * Append one record (an AVRO-encoded datagram) to the current block.
+ * The block is written when it reaches a limit (see avro_writer_set_blocks).
+ */
+int avro_writer_append(avro_writer_t *writer, const uint8_t *data, size_t len) {
+    if (!writer->fp) {
+        fprintf(stderr, "AVRO writer not initialized\n");
+        return -1;
+    }
+
+    /* Track time range from the record's leading long */
+    int64_t timestamp = 0;
+    bool has_time = decode_long(data, len, &timestamp) > 0;
+    if (has_time) {
+        if (!writer->has_time) {
+            writer->first_time = timestamp;
+            writer->has_time = true;
+        }
+        writer->last_time = timestamp;
+    }
+    writer->record_count++;
+
+    /* Records too large for the block buffer go out on their own */
+    if (!writer->block_buf || len > writer->block_capacity) {
+        if (avro_writer_flush(writer) != 0) {
+            return -1;
+        }
+        return write_block(writer, data, len, 1, has_time, timestamp);
+    }
+
+    if (writer->block_len + len > writer->block_capacity && avro_writer_flush(writer) != 0) {
+        return -1;
+    }
+    if (writer->block_records == 0) {
+        writer->block_started_ms = now_ms();
+        writer->block_has_time = has_time;
+        writer->block_first_time = timestamp;
+    }
+    memcpy(writer->block_buf + writer->block_len, data, len);
+    writer->block_len += len;
+    writer->block_records++;
+
+    if (writer->block_len >= writer->block_max_bytes ||
+        writer->block_records >= (uint64_t)writer->block_max_records) {
+        return avro_writer_flush(writer);
+    }
+    return avro_writer_poll(writer);
+}
+
+/**
+ * Write the current block, if it holds any records
+ */
+int avro_writer_flush(avro_writer_t *writer) {
+    if (writer->block_records == 0) {
+        return 0;
+    }
+    int ret = write_block(writer, writer->block_buf, writer->block_len, writer->block_records,
+                          writer->block_has_time, writer->block_first_time);
+    writer->block_len = 0;
+    writer->block_records = 0;
+    return ret;
+}
+
+/**
+ * Write the current block if its deadline has passed, and sync if an
+ * interval sync is due (so neither waits for the next record)
+ */
+int avro_writer_poll(avro_writer_t *writer) {
+    if (writer->block_records > 0 && now_ms() - writer->block_started_ms >= writer->block_max_delay_ms) {
+        return avro_writer_flush(writer);
+    }
+    return sync_data(writer, false);
+}
+
 /**
  * Rotate to new file
  */
 int avro_writer_rotate(avro_writer_t *writer, const char *output_dir) {
     printf("Rotating file: %s (size: %zu bytes)\n", writer->filepath, writer->current_size);
 
+    int index_interval = writer->index_interval;
+    size_t max_bytes = writer->block_max_bytes;
+    int max_records = writer->block_max_records;
+    int max_delay_ms = writer->block_max_delay_ms;
     avro_writer_close(writer);
-    return avro_writer_init(writer, output_dir);
+    durability_t durability = writer->durability;  /* counters include the closing sync */
+    if (avro_writer_init(writer, output_dir, index_interval) != 0) {
+        return -1;
+    }
+    writer->durability = durability;
+    return avro_writer_set_blocks(writer, max_bytes, max_records, max_delay_ms);
+}
+
+/**
+ * Preallocate bytes for fp without changing its size, so readers still see
+ * only the data written (Linux; elsewhere, and on filesystems without
+ * support, the file simply grows as it is written)
+ */
+static void preallocate(FILE *fp, size_t bytes) {
+#ifdef __linux__
+    if (bytes > 0 && fallocate(fileno(fp), FALLOC_FL_KEEP_SIZE, 0, (off_t)bytes) != 0 &&
+        errno != EOPNOTSUPP) {
+        perror("fallocate");
+    }
+#else
+    (void)fp;
+    (void)bytes;
+#endif
+}
+
+/**
+ * Create the next file ahead of rotation, under a temporary name (which the
+ * pivot catalog ignores), with its index header written and prealloc_bytes
+ * preallocated
+ */
+int avro_writer_create_spare(avro_spare_t *spare, const char *output_dir, int index_interval,
+                             size_t prealloc_bytes) {
+    memset(spare, 0, sizeof(*spare));
+    if (ensure_dir(output_dir) != 0) {
+        return -1;
+    }
+
+    /* Unique, as the writer may create one while the rotation thread does */
+    static int spares = 0;
+    snprintf(spare->path, sizeof(spare->path), "%s/.next_%d.avro.part", output_dir,
+             __atomic_add_fetch(&spares, 1, __ATOMIC_RELAXED));
+    spare->fp = fopen(spare->path, "wb");
+    if (!spare->fp) {
+        perror("fopen(spare)");
+        return -1;
+    }
+    preallocate(spare->fp, prealloc_bytes);
+
+    if (index_interval > 0) {
+        snprintf(spare->index_path, sizeof(spare->index_path), "%s.idx", spare->path);
+        spare->index_fp = index_create(spare->index_path, index_interval);
+        if (!spare->index_fp) {
+            avro_writer_discard_spare(spare);
+            return -1;
+        }
+    }
+    return 0;
+}
+
+/**
+ * Close and remove an unused spare
+ */
+void avro_writer_discard_spare(avro_spare_t *spare) {
+    if (spare->fp) {
+        fclose(spare->fp);
+        unlink(spare->path);
+    }
+    if (spare->index_fp) {
+        fclose(spare->index_fp);
+        unlink(spare->index_path);
+    }
+    memset(spare, 0, sizeof(*spare));
+}
+
+/**
+ * Rotate to a spare (from avro_writer_create_spare): the spare is renamed to
+ * the next data file name and written from now on, and the current file is
+ * handed back in retired, complete (pending block and index trailer written)
+ * but still open, for avro_writer_retire to close off the write path.
+ * Block and durability settings carry over.
+ */
+int avro_writer_swap(avro_writer_t *writer, avro_spare_t *spare, avro_retired_t *retired) {
+    char dir[MAX_PATH_LEN];
+    strcpy(dir, writer->filepath);
+    char *slash = strrchr(dir, '/');
+    if (slash) {
+        *slash = '\0';
+    } else {
+        strcpy(dir, ".");
+    }
+    if ((writer->index_fp != NULL) != (spare->index_fp != NULL)) {
+        fprintf(stderr, "Spare AVRO file does not match the index setting\n");
+        return -1;
+    }
+
+    /* Name the spare first: on failure the current file carries on untouched */
+    char path[MAX_PATH_LEN];
+    char index_path[sizeof(writer->index_path)];
+    data_path(path, dir);
+    snprintf(index_path, sizeof(index_path), "%s.idx", path);
+    if (rename(spare->path, path) != 0) {
+        perror("rename(spare)");
+        return -1;
+    }
+    if (spare->index_fp && rename(spare->index_path, index_path) != 0) {
+        perror("rename(spare index)");
+        rename(path, spare->path);
+        return -1;
+    }
+
+    printf("Rotating file: %s (size: %zu bytes)\n", writer->filepath, writer->current_size);
+    int ret = avro_writer_flush(writer);
+    if (writer->index_fp && writer->record_count > 0) {
+        index_finish(writer);
+    }
+    retired->fp = writer->fp;
+    retired->index_fp = writer->index_fp;
+    retired->size = writer->current_size;
+    retired->sync = writer->durability.mode != DURABILITY_NONE;
+
+    writer->fp = spare->fp;
+    writer->index_fp = spare->index_fp;
+    strcpy(writer->filepath, path);
+    strcpy(writer->index_path, index_path);
+    start_file(writer);
+    memset(spare, 0, sizeof(*spare));
+
+    printf("Created AVRO file: %s\n", writer->filepath);
+    return ret;
+}
+
+/**
+ * Close a file rotated out by avro_writer_swap: release its unused
+ * preallocated space and, unless the durability policy is none, sync it
+ */
+void avro_writer_retire(avro_retired_t *retired) {
+    if (fflush(retired->fp) != 0 || ftruncate(fileno(retired->fp), (off_t)retired->size) != 0) {
+        perror("ftruncate(retired)");
+    }
+    if (retired->sync && fdatasync(fileno(retired->fp)) != 0) {
+        perror("fdatasync(retired)");
+    }
+    fclose(retired->fp);
+    if (retired->index_fp) {
+        if (retired->sync && (fflush(retired->index_fp) != 0 || fdatasync(fileno(retired->index_fp)) != 0)) {
+            perror("fdatasync(retired index)");
+        }
+        fclose(retired->index_fp);
+    }
+    memset(retired, 0, sizeof(*retired));
 }
 
 /**
@@ -116,7 +607,29 @@ int avro_writer_rotate(avro_writer_t *writer, const char *output_dir) {
  */
 void avro_writer_close(avro_writer_t *writer) {
     if (writer->fp) {
+        /* A closed file is complete on disk, unless the policy is none */
+        avro_writer_flush(writer);
+        if (fflush(writer->fp) != 0 || ftruncate(fileno(writer->fp), (off_t)writer->current_size) != 0) {
+            perror("ftruncate");  /* releases space preallocated past the data */
+        }
+        sync_data(writer, true);
         fclose(writer->fp);
         writer->fp = NULL;
     }
+    free(writer->block_buf);
+    writer->block_buf = NULL;
+    writer->block_capacity = 0;
+    writer->block_records = 0;
+    writer->block_len = 0;
+    if (writer->index_fp) {
+        if (writer->record_count > 0) {
+            index_finish(writer);
+        }
+        if (writer->durability.mode != DURABILITY_NONE &&
+            (fflush(writer->index_fp) != 0 || fdatasync(fileno(writer->index_fp)) != 0)) {
+            perror("fdatasync(index)");
+        }
+        fclose(writer->index_fp);
+        writer->index_fp = NULL;
+    }
 }
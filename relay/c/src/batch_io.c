@@ -0,0 +1,224 @@
+#define _GNU_SOURCE  /* recvmmsg, sendmmsg, ppoll */
+#include "relay.h"
+#include <stdlib.h>
+#include <string.h>
+#include <errno.h>
+#include <poll.h>
+#include <sys/socket.h>
+#include <netinet/in.h>
+
+/*
+ * Batched datagram I/O: up to batch->size datagrams per recvmmsg, forwarded
+ * with one sendmmsg per destination. Datagrams land in preallocated slots
+ * (one MAX_PACKET_SIZE buffer each) that are reused by every batch.
+ * Platforms without recvmmsg/sendmmsg fall back to one datagram per call.
+ */
+
+#ifdef __linux__
+#define HAVE_MMSG 1
+#endif
+
+/**
+ * Allocate a batch of size slots (clamped to 1..MAX_BATCH_SIZE)
+ */
+int packet_batch_init(packet_batch_t *batch, int size) {
+    memset(batch, 0, sizeof(*batch));
+    if (size < 1) {
+        size = 1;
+    }
+    if (size > MAX_BATCH_SIZE) {
+        size = MAX_BATCH_SIZE;
+    }
+    batch->size = size;
+    batch->buffers = malloc((size_t)size * MAX_PACKET_SIZE);
+    batch->lengths = calloc(size, sizeof(size_t));
+    batch->src = calloc(size, sizeof(struct sockaddr_in));
+    if (!batch->buffers || !batch->lengths || !batch->src) {
+        perror("malloc(batch)");
+        packet_batch_free(batch);
+        return -1;
+    }
+
+#ifdef HAVE_MMSG
+    struct mmsghdr *recv_msgs = calloc(size, sizeof(struct mmsghdr));
+    struct mmsghdr *send_msgs = calloc(size, sizeof(struct mmsghdr));
+    struct iovec *recv_iovs = calloc(size, sizeof(struct iovec));
+    struct iovec *send_iovs = calloc(size, sizeof(struct iovec));
+    batch->recv_msgs = recv_msgs;
+    batch->send_msgs = send_msgs;
+    batch->recv_iovs = recv_iovs;
+    batch->send_iovs = send_iovs;
+    if (!recv_msgs || !send_msgs || !recv_iovs || !send_iovs) {
+        perror("malloc(batch)");
+        packet_batch_free(batch);
+        return -1;
+    }
+
+    /* Receive headers point at their slot for good */
+    for (int i = 0; i < size; i++) {
+        recv_iovs[i].iov_base = packet_batch_data(batch, i);
+        recv_iovs[i].iov_len = MAX_PACKET_SIZE;
+        recv_msgs[i].msg_hdr.msg_iov = &recv_iovs[i];
+        recv_msgs[i].msg_hdr.msg_iovlen = 1;
+        recv_msgs[i].msg_hdr.msg_name = &batch->src[i];
+    }
+#endif
+
+    return 0;
+}
+
+/**
+ * Free batch buffers
+ */
+void packet_batch_free(packet_batch_t *batch) {
+    free(batch->buffers);
+    free(batch->lengths);
+    free(batch->src);
+    free(batch->recv_msgs);
+    free(batch->send_msgs);
+    free(batch->recv_iovs);
+    free(batch->send_iovs);
+    memset(batch, 0, sizeof(*batch));
+}
+
+/**
+ * Data of slot i
+ */
+uint8_t *packet_batch_data(const packet_batch_t *batch, int i) {
+    return batch->buffers + (size_t)i * MAX_PACKET_SIZE;
+}
+
+#ifdef HAVE_MMSG
+/**
+ * recvmmsg into slots [first, size); with MSG_DONTWAIT nothing queued is 0
+ */
+static int recv_more(packet_batch_t *batch, int sock, int first, int flags) {
+    struct mmsghdr *msgs = batch->recv_msgs;
+    for (int i = first; i < batch->size; i++) {
+        msgs[i].msg_hdr.msg_namelen = sizeof(struct sockaddr_in);
+    }
+
+    int n = recvmmsg(sock, msgs + first, batch->size - first, flags, NULL);
+    if (n < 0) {
+        return (flags == MSG_DONTWAIT && (errno == EAGAIN || errno == EWOULDBLOCK)) ? 0 : -1;
+    }
+
+    for (int i = first; i < first + n; i++) {
+        batch->lengths[i] = msgs[i].msg_len;
+    }
+    return n;
+}
+#endif
+
+/**
+ * Receive a batch: block until at least one datagram arrives, then take
+ * every datagram already queued, up to batch->size. With timeout_us > 0,
+ * keep waiting up to that long after the first datagram to fill the batch.
+ * Returns the number of datagrams received, or -1 on error (errno set).
+ */
+int packet_batch_recv(packet_batch_t *batch, int sock, int timeout_us) {
+#ifdef HAVE_MMSG
+    int count = recv_more(batch, sock, 0, MSG_WAITFORONE);
+    if (count <= 0 || timeout_us <= 0) {
+        return count;
+    }
+
+    struct timespec deadline;
+    clock_gettime(CLOCK_MONOTONIC, &deadline);
+    deadline.tv_sec += timeout_us / 1000000;
+    deadline.tv_nsec += (long)(timeout_us % 1000000) * 1000;
+    if (deadline.tv_nsec >= 1000000000L) {
+        deadline.tv_sec++;
+        deadline.tv_nsec -= 1000000000L;
+    }
+
+    while (count < batch->size) {
+        struct timespec now, left;
+        clock_gettime(CLOCK_MONOTONIC, &now);
+        left.tv_sec = deadline.tv_sec - now.tv_sec;
+        left.tv_nsec = deadline.tv_nsec - now.tv_nsec;
+        if (left.tv_nsec < 0) {
+            left.tv_sec--;
+            left.tv_nsec += 1000000000L;
+        }
+        if (left.tv_sec < 0) {
+            break;
+        }
+
+        struct pollfd pfd = {.fd = sock, .events = POLLIN};
+        int ready = ppoll(&pfd, 1, &left, NULL);
+        if (ready <= 0) {
+            break;  /* timeout, or a signal: deliver what we have */
+        }
+        int n = recv_more(batch, sock, count, MSG_DONTWAIT);
+        if (n < 0) {
+            break;
+        }
+        count += n;
+    }
+    return count;
+#else
+    (void)timeout_us;
+    socklen_t src_len = sizeof(batch->src[0]);
+    ssize_t len = recvfrom(sock, batch->buffers, MAX_PACKET_SIZE, 0,
+                           (struct sockaddr *)&batch->src[0], &src_len);
+    if (len < 0) {
+        return -1;
+    }
+    batch->lengths[0] = (size_t)len;
+    return 1;
+#endif
+}
+
+/**
+ * Send slots [0, count) to dst, skipping those with select[i] false
+ * (select NULL sends all). Returns datagrams sent, or -1 on error.
+ */
+int packet_batch_send(packet_batch_t *batch, int sock, const struct sockaddr_in *dst,
+                      const bool *select, int count) {
+#ifdef HAVE_MMSG
+    struct mmsghdr *msgs = batch->send_msgs;
+    struct iovec *iovs = batch->send_iovs;
+    int total = 0;
+    for (int i = 0; i < count; i++) {
+        if (select && !select[i]) {
+            continue;
+        }
+        iovs[total].iov_base = packet_batch_data(batch, i);
+        iovs[total].iov_len = batch->lengths[i];
+        memset(&msgs[total].msg_hdr, 0, sizeof(msgs[total].msg_hdr));
+        msgs[total].msg_hdr.msg_iov = &iovs[total];
+        msgs[total].msg_hdr.msg_iovlen = 1;
+        msgs[total].msg_hdr.msg_name = (void *)dst;
+        msgs[total].msg_hdr.msg_namelen = sizeof(*dst);
+        total++;
+    }
+
+    /* sendmmsg may stop early; resend the rest */
+    int sent = 0;
+    while (sent < total) {
+        int n = sendmmsg(sock, msgs + sent, total - sent, 0);
+        if (n < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            return -1;
+        }
+        sent += n;
+    }
+    return sent;
+#else
+    int sent = 0;
+    for (int i = 0; i < count; i++) {
+        if (select && !select[i]) {
+            continue;
+        }
+        if (sendto(sock, packet_batch_data(batch, i), batch->lengths[i], 0,
+                   (const struct sockaddr *)dst, sizeof(*dst)) < 0) {
+            return -1;
+        }
+        sent++;
+    }
+    return sent;
+#endif
+}
@@ -25,8 +25,31 @@ int load_config(const char *channel_name, relay_config_t *config) {
     config->decimation_enabled = true;
     config->decimation_factor = 5;
 
-    /* Rotation threshold (from config/relay.yaml) */
-    config->rotation_threshold = 50 * 1024 * 1024;  /* 50 MB */
+    /* Rotation (from config/relay.yaml): hourly, next file preallocated */
+    config->rotation_mode = ROTATE_TIME;
+    config->rotation_threshold = 3600;  /* seconds */
+    config->prealloc_bytes = DEFAULT_PREALLOC_BYTES;
+
+    /* Sparse time index: one entry every N blocks */
+    config->index_interval = DEFAULT_INDEX_INTERVAL;
+
+    /* Multi-record blocks: written at a size, record count or age limit */
+    config->block_bytes = DEFAULT_BLOCK_BYTES;
+    config->block_records = DEFAULT_BLOCK_RECORDS;
+    config->block_delay_ms = DEFAULT_BLOCK_DELAY_MS;
+
+    /* Durability (from config/relay.yaml): page cache only, smoothed writeback */
+    config->durability = DURABILITY_NONE;
+    config->durability_value = 0;
+    config->writeback_bytes = DEFAULT_WRITEBACK_BYTES;
+
+    /* Disk writer ring: drop from the file when full, never stall the network path */
+    config->ring_bytes = DEFAULT_RING_BYTES;
+    config->ring_block = false;
+
+    /* Batched I/O: datagrams per recvmmsg/sendmmsg */
+    config->batch_size = DEFAULT_BATCH_SIZE;
+    config->batch_timeout_us = DEFAULT_BATCH_TIMEOUT_US;
 
     /* Output directory (from config/global.yaml) */
     strncpy(config->output_dir, "./data", MAX_PATH_LEN - 1);
@@ -53,12 +76,117 @@ int load_config(const char *channel_name, relay_config_t *config) {
                                       strcmp(env_dec_enabled, "1") == 0);
     }
 
+    char *env_rotation_mode = getenv("RELAY_ROTATION_MODE");
+    if (env_rotation_mode) {
+        if (strcmp(env_rotation_mode, "time") == 0) {
+            config->rotation_mode = ROTATE_TIME;
+        } else if (strcmp(env_rotation_mode, "size") == 0) {
+            config->rotation_mode = ROTATE_SIZE;
+        } else {
+            fprintf(stderr, "Unknown RELAY_ROTATION_MODE '%s' (time, size)\n", env_rotation_mode);
+            return -1;
+        }
+    }
+
+    char *env_rotation_threshold = getenv("RELAY_ROTATION_THRESHOLD");
+    if (env_rotation_threshold) {
+        config->rotation_threshold = strtoul(env_rotation_threshold, NULL, 10);
+    }
+
+    /* Size rotation preallocates a whole file unless told otherwise */
+    char *env_prealloc = getenv("RELAY_PREALLOC_BYTES");
+    if (env_prealloc) {
+        config->prealloc_bytes = strtoul(env_prealloc, NULL, 10);
+    } else if (config->rotation_mode == ROTATE_SIZE) {
+        config->prealloc_bytes = config->rotation_threshold;
+    }
+
+    char *env_index = getenv("RELAY_INDEX_INTERVAL");
+    if (env_index) {
+        config->index_interval = atoi(env_index);
+    }
+
+    char *env_block_bytes = getenv("RELAY_BLOCK_BYTES");
+    if (env_block_bytes) {
+        config->block_bytes = strtoul(env_block_bytes, NULL, 10);
+    }
+
+    char *env_block_records = getenv("RELAY_BLOCK_RECORDS");
+    if (env_block_records) {
+        config->block_records = atoi(env_block_records);
+    }
+
+    char *env_block_delay = getenv("RELAY_BLOCK_DELAY_MS");
+    if (env_block_delay) {
+        config->block_delay_ms = atoi(env_block_delay);
+    }
+
+    char *env_durability = getenv("RELAY_DURABILITY");
+    if (env_durability) {
+        if (strcmp(env_durability, "interval") == 0) {
+            config->durability = DURABILITY_INTERVAL;
+        } else if (strcmp(env_durability, "bytes") == 0) {
+            config->durability = DURABILITY_BYTES;
+        } else if (strcmp(env_durability, "none") == 0) {
+            config->durability = DURABILITY_NONE;
+        } else {
+            fprintf(stderr, "Unknown RELAY_DURABILITY '%s' (none, interval, bytes)\n", env_durability);
+            return -1;
+        }
+    }
+
+    char *env_durability_value = getenv("RELAY_DURABILITY_VALUE");
+    if (env_durability_value) {
+        config->durability_value = strtoull(env_durability_value, NULL, 10);
+    }
+
+    char *env_writeback = getenv("RELAY_WRITEBACK_BYTES");
+    if (env_writeback) {
+        config->writeback_bytes = strtoul(env_writeback, NULL, 10);
+    }
+
+    char *env_ring_bytes = getenv("RELAY_RING_BYTES");
+    if (env_ring_bytes) {
+        config->ring_bytes = strtoul(env_ring_bytes, NULL, 10);
+    }
+
+    char *env_ring_full = getenv("RELAY_RING_FULL");
+    if (env_ring_full) {
+        config->ring_block = strcmp(env_ring_full, "block") == 0;
+    }
+
+    char *env_batch = getenv("RELAY_BATCH_SIZE");
+    if (env_batch) {
+        config->batch_size = atoi(env_batch);
+    }
+
+    char *env_batch_timeout = getenv("RELAY_BATCH_TIMEOUT_US");
+    if (env_batch_timeout) {
+        config->batch_timeout_us = atoi(env_batch_timeout);
+    }
+
     printf("Configuration loaded for channel '%s':\n", config->name);
     printf("  RX Port: %d\n", config->rx_port);
     printf("  Output Dir: %s\n", config->output_dir);
     printf("  Decimation: %s (factor: %d)\n",
            config->decimation_enabled ? "enabled" : "disabled",
            config->decimation_factor);
+    printf("  Rotation: every %zu %s (next file preallocated: %zu bytes)\n", config->rotation_threshold,
+           config->rotation_mode == ROTATE_TIME ? "seconds" : "bytes", config->prealloc_bytes);
+    printf("  Index Interval: %d blocks\n", config->index_interval);
+    printf("  Block: %d records / %zu bytes (delay: %d ms)\n",
+           config->block_records, config->block_bytes, config->block_delay_ms);
+    static const char *durability_names[] = {"none", "interval", "bytes"};
+    static const char *durability_units[] = {"", " ms", " bytes"};
+    printf("  Durability: %s", durability_names[config->durability]);
+    if (config->durability != DURABILITY_NONE) {
+        printf(" (fdatasync every %llu%s)", (unsigned long long)config->durability_value,
+               durability_units[config->durability]);
+    }
+    printf(", writeback every %zu bytes\n", config->writeback_bytes);
+    printf("  Disk Ring: %zu bytes (when full: %s)\n",
+           config->ring_bytes, config->ring_block ? "block" : "drop");
+    printf("  Batch: %d datagrams (timeout: %d us)\n", config->batch_size, config->batch_timeout_us);
 
     return 0;
 }
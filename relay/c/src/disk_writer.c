@@ -0,0 +1,153 @@
+#define _POSIX_C_SOURCE 200809L  /* nanosleep */
+#include "relay.h"
+#include <string.h>
+#include <time.h>
+
+/*
+ * Disk writer thread: the receive thread copies each datagram into a ring
+ * and goes straight on to the multicast forward; this thread drains the
+ * ring into the AVRO writer (blocks, flushes, rotation via the rotation
+ * thread, which prepares and closes files). A slow disk only
+ * fills the ring. When it is full a datagram is dropped from the file (and
+ * counted), or with block_when_full the receive thread waits for room,
+ * pushing back on the kernel receive buffer instead.
+ */
+
+#define WRITER_IDLE_NS 1000000L  /* sleep when the ring is empty */
+#define PRODUCER_WAIT_NS 100000L /* retry interval of a blocked submit */
+
+static void sleep_ns(long ns) {
+    struct timespec ts = {.tv_sec = 0, .tv_nsec = ns};
+    nanosleep(&ts, NULL);
+}
+
+static int rotate_if_due(disk_writer_t *dw) {
+    if (rotator_due(&dw->rotator, &dw->writer) && rotator_rotate(&dw->rotator, &dw->writer) != 0) {
+        fprintf(stderr, "Failed to rotate file\n");
+        return -1;
+    }
+    return 0;
+}
+
+static int write_pending(disk_writer_t *dw) {
+    const uint8_t *data;
+    size_t len;
+    while ((data = packet_ring_peek(&dw->ring, &len)) != NULL) {
+        if (avro_writer_append(&dw->writer, data, len) != 0) {
+            fprintf(stderr, "Failed to write AVRO record\n");
+            return -1;
+        }
+        packet_ring_pop(&dw->ring);
+        __atomic_add_fetch(&dw->written, 1, __ATOMIC_RELAXED);
+
+        if (rotate_if_due(dw) != 0) {
+            return -1;
+        }
+    }
+
+    /* Write the pending block once it is due, even without new records */
+    if (avro_writer_poll(&dw->writer) != 0) {
+        fprintf(stderr, "Failed to write AVRO block\n");
+        return -1;
+    }
+    return rotate_if_due(dw);  /* time rotation of a quiet channel */
+}
+
+static void *writer_main(void *arg) {
+    disk_writer_t *dw = arg;
+    for (;;) {
+        /* Read stop first: everything submitted before it is drained below */
+        bool stopping = __atomic_load_n(&dw->stop, __ATOMIC_ACQUIRE);
+        if (write_pending(dw) != 0) {
+            __atomic_store_n(&dw->failed, true, __ATOMIC_RELEASE);
+            break;
+        }
+        if (stopping) {
+            break;
+        }
+        if (packet_ring_used(&dw->ring) == 0) {
+            sleep_ns(WRITER_IDLE_NS);
+        }
+    }
+    return NULL;
+}
+
+/**
+ * Open the first AVRO file and start the writer thread
+ */
+int disk_writer_start(disk_writer_t *dw, const relay_config_t *config) {
+    memset(dw, 0, sizeof(*dw));
+    dw->config = config;
+    dw->block_when_full = config->ring_block;
+
+    if (avro_writer_init(&dw->writer, config->output_dir, config->index_interval) != 0) {
+        return -1;
+    }
+    avro_writer_set_durability(&dw->writer, config->durability, config->durability_value,
+                               config->writeback_bytes);
+    if (avro_writer_set_blocks(&dw->writer, config->block_bytes, config->block_records,
+                               config->block_delay_ms) != 0 ||
+        packet_ring_init(&dw->ring, config->ring_bytes) != 0) {
+        avro_writer_close(&dw->writer);
+        return -1;
+    }
+    if (rotator_start(&dw->rotator, config) != 0) {
+        packet_ring_free(&dw->ring);
+        avro_writer_close(&dw->writer);
+        return -1;
+    }
+    if (pthread_create(&dw->thread, NULL, writer_main, dw) != 0) {
+        perror("pthread_create(writer)");
+        rotator_stop(&dw->rotator);
+        packet_ring_free(&dw->ring);
+        avro_writer_close(&dw->writer);
+        return -1;
+    }
+    return 0;
+}
+
+/**
+ * Receive thread: queue a datagram for the file. Returns 0, or -1 if it was
+ * dropped (ring full without block_when_full, or the writer has failed).
+ */
+int disk_writer_submit(disk_writer_t *dw, const uint8_t *data, size_t len) {
+    bool stalled = false;
+    while (packet_ring_push(&dw->ring, data, len) != 0) {
+        if (!dw->block_when_full || disk_writer_failed(dw) || len > MAX_PACKET_SIZE) {
+            dw->dropped++;
+            return -1;
+        }
+        if (!stalled) {
+            dw->stalls++;
+            stalled = true;
+        }
+        sleep_ns(PRODUCER_WAIT_NS);
+    }
+    dw->submitted++;
+    return 0;
+}
+
+/**
+ * True once the writer thread has stopped on an error
+ */
+bool disk_writer_failed(disk_writer_t *dw) {
+    return __atomic_load_n(&dw->failed, __ATOMIC_ACQUIRE);
+}
+
+/**
+ * Records written so far (from any thread)
+ */
+uint64_t disk_writer_written(disk_writer_t *dw) {
+    return __atomic_load_n(&dw->written, __ATOMIC_RELAXED);
+}
+
+/**
+ * Drain the ring, stop the writer and rotation threads and close the files
+ */
+void disk_writer_stop(disk_writer_t *dw) {
+    __atomic_store_n(&dw->stop, true, __ATOMIC_RELEASE);
+    pthread_join(dw->thread, NULL);
+    avro_writer_close(&dw->writer);
+    rotator_stop(&dw->rotator);
+    packet_ring_free(&dw->ring);
+}
@@ -4,9 +4,13 @@
 #include <string.h>
 #include <signal.h>
 #include <sys/socket.h>
+#include <sys/time.h>
 #include <netinet/in.h>
 #include <arpa/inet.h>
 #include <unistd.h>
+#include <errno.h>
+
+#define DROP_LOG_INTERVAL_S 1  /* drops are summarized at most this often */
 
 static volatile int running = 1;
 
@@ -49,20 +53,31 @@ int main(int argc, char *argv[]) {
         return 1;
     }
 
-    /* Initialize AVRO writer */
-    avro_writer_t writer;
-    if (avro_writer_init(&writer, config.output_dir) != 0) {
-        fprintf(stderr, "Failed to initialize AVRO writer\n");
+    /* Initialize decimator */
+    decimator_t decimator;
+    decimator_init(&decimator, config.decimation_factor);
+
+    /* Received datagrams, relayed a batch at a time */
+    packet_batch_t batch;
+    if (packet_batch_init(&batch, config.batch_size) != 0) {
+        fprintf(stderr, "Failed to allocate packet batch\n");
         close_sockets(&socks);
         return 1;
     }
+    bool dec_select[MAX_BATCH_SIZE];
 
-    /* Initialize decimator */
-    decimator_t decimator;
-    decimator_init(&decimator, config.decimation_factor);
+    /* AVRO files are written on their own thread, off the network path */
+    disk_writer_t disk;
+    if (disk_writer_start(&disk, &config) != 0) {
+        fprintf(stderr, "Failed to start AVRO writer\n");
+        packet_batch_free(&batch);
+        close_sockets(&socks);
+        return 1;
+    }
 
-    /* Packet buffer */
-    uint8_t packet[MAX_PACKET_SIZE];
+    /* Wake up now and then to notice shutdown or a failed writer */
+    struct timeval tv = {.tv_sec = RX_TIMEOUT_MS / 1000, .tv_usec = (RX_TIMEOUT_MS % 1000) * 1000};
+    setsockopt(socks.rx_sock, SOL_SOCKET, SO_RCVTIMEO, &tv, sizeof(tv));
 
     /* Multicast destination addresses */
     struct sockaddr_in mcast_full_addr;
@@ -84,70 +99,81 @@ int main(int argc, char *argv[]) {
     printf("Ready to receive packets...\n\n");
 
     uint64_t packet_count = 0;
+    uint64_t dropped_logged = 0;
+    time_t drop_log_time = 0;
+    bool failed = false;
 
     /* Main relay loop */
-    while (running) {
-        /* Receive UDP packet */
-        struct sockaddr_in src_addr;
-        socklen_t src_len = sizeof(src_addr);
-        ssize_t recv_len = recvfrom(
-            socks.rx_sock,
-            packet,
-            MAX_PACKET_SIZE,
-            0,
-            (struct sockaddr *)&src_addr,
-            &src_len
-        );
-
-        if (recv_len < 0) {
+    while (running && !failed) {
+        /* Receive up to batch.size UDP packets in one call */
+        int count = packet_batch_recv(&batch, socks.rx_sock, config.batch_timeout_us);
+        if (count < 0) {
+            if ((errno == EAGAIN || errno == EWOULDBLOCK || errno == EINTR) && running) {
+                failed = disk_writer_failed(&disk);
+                continue;
+            }
             if (running) {
-                perror("recvfrom");
+                perror("recvmmsg");
             }
             break;
         }
 
-        packet_count++;
-        printf("[%lu] Received %zd bytes from %s:%d\n",
-               packet_count,
-               recv_len,
-               inet_ntoa(src_addr.sin_addr),
-               ntohs(src_addr.sin_port));
-
-        /* Write to AVRO file */
-        if (avro_writer_write_block(&writer, packet, recv_len) != 0) {
-            fprintf(stderr, "Failed to write AVRO block\n");
-            break;
+        int dec_count = 0;
+        for (int i = 0; i < count; i++) {
+            packet_count++;
+            printf("[%lu] Received %zu bytes from %s:%d\n",
+                   packet_count,
+                   batch.lengths[i],
+                   inet_ntoa(batch.src[i].sin_addr),
+                   ntohs(batch.src[i].sin_port));
+
+            /* Decimated multicast gets every Nth packet */
+            dec_select[i] = config.decimation_enabled && decimator_should_send(&decimator);
+            dec_count += dec_select[i];
         }
 
         /* Relay to full-rate multicast */
-        if (sendto(socks.mcast_full_sock, packet, recv_len, 0,
-                   (struct sockaddr *)&mcast_full_addr,
-                   sizeof(mcast_full_addr)) < 0) {
-            perror("sendto(full)");
+        if (packet_batch_send(&batch, socks.mcast_full_sock, &mcast_full_addr, NULL, count) < 0) {
+            perror("sendmmsg(full)");
         }
 
-        /* Relay to decimated multicast (if enabled and should send) */
-        if (config.decimation_enabled && decimator_should_send(&decimator)) {
-            if (sendto(socks.mcast_dec_sock, packet, recv_len, 0,
-                       (struct sockaddr *)&mcast_dec_addr,
-                       sizeof(mcast_dec_addr)) < 0) {
-                perror("sendto(decimated)");
+        /* Relay to decimated multicast (if enabled and any packet selected) */
+        if (dec_count > 0) {
+            if (packet_batch_send(&batch, socks.mcast_dec_sock, &mcast_dec_addr, dec_select, count) < 0) {
+                perror("sendmmsg(decimated)");
             }
-            printf("  -> Sent to decimated multicast\n");
+            printf("  -> Sent %d to decimated multicast\n", dec_count);
+        }
+
+        /* Queue for the AVRO file (after forwarding: the disk never delays live consumers) */
+        for (int i = 0; i < count; i++) {
+            disk_writer_submit(&disk, packet_batch_data(&batch, i), batch.lengths[i]);  /* drops are counted */
         }
 
-        /* Check if file rotation needed */
-        if (writer.current_size >= config.rotation_threshold) {
-            if (avro_writer_rotate(&writer, config.output_dir) != 0) {
-                fprintf(stderr, "Failed to rotate file\n");
-                break;
+        /* Summarize drops at most once per interval: a line per drop would flood stderr */
+        if (disk.dropped != dropped_logged) {
+            time_t now = time(NULL);
+            if (now - drop_log_time >= DROP_LOG_INTERVAL_S) {
+                fprintf(stderr, "Dropped %lu datagrams from AVRO file (writer ring full), %lu in total\n",
+                        disk.dropped - dropped_logged, disk.dropped);
+                dropped_logged = disk.dropped;
+                drop_log_time = now;
             }
         }
+        failed = disk_writer_failed(&disk);
     }
 
     /* Cleanup */
+    disk_writer_stop(&disk);
     printf("\nProcessed %lu packets\n", packet_count);
-    avro_writer_close(&writer);
+    printf("AVRO: %lu written, %lu dropped, %lu waited for the writer\n",
+           disk_writer_written(&disk), disk.dropped, disk.stalls);
+    printf("Rotation: %lu to a prepared file, %lu created inline\n",
+           disk.rotator.swaps, disk.rotator.fallbacks);
+    const durability_t *d = &disk.writer.durability;
+    printf("Durability: %lu fdatasync (avg %.2f ms, max %.2f ms), %lu writeback windows\n",
+           d->syncs, d->syncs ? d->sync_ns / 1e6 / d->syncs : 0.0, d->sync_ns_max / 1e6, d->writebacks);
+    packet_batch_free(&batch);
     close_sockets(&socks);
 
     return 0;
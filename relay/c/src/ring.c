@@ -0,0 +1,122 @@
+#include "relay.h"
+#include <stdlib.h>
+#include <string.h>
+
+/*
+ * Single-producer/single-consumer ring of datagrams: one byte buffer holding
+ * [length (u32)][data] records, each padded to 8 bytes. head and tail are
+ * running byte counts; only the producer stores head and only the consumer
+ * stores tail, so neither side takes a lock. A record that would cross the
+ * end of the buffer is written at the start instead, behind a wrap marker.
+ */
+
+#define RING_ALIGN 8
+#define RING_WRAP UINT32_MAX  /* length of a wrap marker: skip to the start */
+
+static size_t record_size(size_t len) {
+    return (sizeof(uint32_t) + len + RING_ALIGN - 1) & ~(size_t)(RING_ALIGN - 1);
+}
+
+/**
+ * Allocate a ring of at least capacity bytes (rounded up to a power of two,
+ * and to at least two datagrams of MAX_PACKET_SIZE)
+ */
+int packet_ring_init(packet_ring_t *ring, size_t capacity) {
+    memset(ring, 0, sizeof(*ring));
+    size_t size = 2 * record_size(MAX_PACKET_SIZE);
+    size_t rounded = RING_ALIGN;
+    while (rounded < size || rounded < capacity) {
+        rounded <<= 1;
+    }
+
+    ring->buffer = malloc(rounded);
+    if (!ring->buffer) {
+        perror("malloc(ring)");
+        return -1;
+    }
+    ring->capacity = rounded;
+    return 0;
+}
+
+/**
+ * Free ring buffer
+ */
+void packet_ring_free(packet_ring_t *ring) {
+    free(ring->buffer);
+    memset(ring, 0, sizeof(*ring));
+}
+
+/**
+ * Producer: copy a datagram into the ring. Returns 0, or -1 if it is full.
+ */
+int packet_ring_push(packet_ring_t *ring, const uint8_t *data, size_t len) {
+    if (len > MAX_PACKET_SIZE) {
+        return -1;
+    }
+    size_t need = record_size(len);
+    uint64_t head = ring->head;  /* only this side stores head */
+    uint64_t tail = __atomic_load_n(&ring->tail, __ATOMIC_ACQUIRE);
+    size_t pos = head & (ring->capacity - 1);
+    size_t to_end = ring->capacity - pos;
+    size_t total = need > to_end ? to_end + need : need;
+
+    if (ring->capacity - (head - tail) < total) {
+        return -1;
+    }
+
+    if (need > to_end) {
+        uint32_t wrap = RING_WRAP;
+        memcpy(ring->buffer + pos, &wrap, sizeof(wrap));
+        head += to_end;
+        pos = 0;
+    }
+    uint32_t len32 = (uint32_t)len;
+    memcpy(ring->buffer + pos, &len32, sizeof(len32));
+    memcpy(ring->buffer + pos + sizeof(len32), data, len);
+
+    /* Publish the record after its bytes */
+    __atomic_store_n(&ring->head, head + need, __ATOMIC_RELEASE);
+    return 0;
+}
+
+/**
+ * Consumer: oldest datagram, left in place until packet_ring_pop.
+ * Returns its data (length in *len), or NULL if the ring is empty.
+ */
+const uint8_t *packet_ring_peek(packet_ring_t *ring, size_t *len) {
+    for (;;) {
+        uint64_t tail = ring->tail;  /* only this side stores tail */
+        if (tail == __atomic_load_n(&ring->head, __ATOMIC_ACQUIRE)) {
+            return NULL;
+        }
+
+        size_t pos = tail & (ring->capacity - 1);
+        uint32_t len32;
+        memcpy(&len32, ring->buffer + pos, sizeof(len32));
+        if (len32 == RING_WRAP) {
+            __atomic_store_n(&ring->tail, tail + (ring->capacity - pos), __ATOMIC_RELEASE);
+            continue;
+        }
+        *len = len32;
+        return ring->buffer + pos + sizeof(len32);
+    }
+}
+
+/**
+ * Consumer: release the datagram returned by packet_ring_peek
+ */
+void packet_ring_pop(packet_ring_t *ring) {
+    size_t len;
+    if (packet_ring_peek(ring, &len)) {
+        __atomic_store_n(&ring->tail, ring->tail + record_size(len), __ATOMIC_RELEASE);
+    }
+}
+
+/**
+ * Bytes in use (either side; a snapshot)
+ */
+size_t packet_ring_used(packet_ring_t *ring) {
+    uint64_t tail = __atomic_load_n(&ring->tail, __ATOMIC_ACQUIRE);
+    uint64_t head = __atomic_load_n(&ring->head, __ATOMIC_ACQUIRE);
+    return (size_t)(head - tail);
+}
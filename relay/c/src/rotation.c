@@ -0,0 +1,150 @@
+#define _POSIX_C_SOURCE 200809L  /* clock_gettime */
+#include "relay.h"
+#include <string.h>
+#include <time.h>
+
+/*
+ * Rotation thread: creates (and preallocates) the next data file while the
+ * current one is being written, and closes files once they are rotated out,
+ * so rotation on the writer thread is a rename and a pointer swap. If no
+ * spare is ready yet (rotations in quick succession, or creating it failed)
+ * the writer creates the file itself, as before.
+ */
+
+static int64_t now_ms(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (int64_t)ts.tv_sec * 1000 + ts.tv_nsec / 1000000;
+}
+
+static void *rotator_main(void *arg) {
+    rotator_t *rot = arg;
+    pthread_mutex_lock(&rot->lock);
+    for (;;) {
+        /* Close rotated-out files first: they hold sync and truncate work */
+        if (rot->retired_count > 0) {
+            avro_retired_t retired = rot->retired[0];
+            rot->retired_count--;
+            memmove(rot->retired, rot->retired + 1, rot->retired_count * sizeof(retired));
+            pthread_mutex_unlock(&rot->lock);
+            avro_writer_retire(&retired);
+            pthread_mutex_lock(&rot->lock);
+            continue;
+        }
+        if (rot->stop) {
+            break;
+        }
+        if (rot->spare_wanted && !rot->spare_ready) {
+            const relay_config_t *config = rot->config;
+            avro_spare_t spare;
+            pthread_mutex_unlock(&rot->lock);
+            int ret = avro_writer_create_spare(&spare, config->output_dir, config->index_interval,
+                                               config->prealloc_bytes);
+            pthread_mutex_lock(&rot->lock);
+            rot->spare_wanted = false;  /* on failure, retried after the next rotation */
+            if (ret == 0) {
+                rot->spare = spare;
+                rot->spare_ready = true;
+            }
+            continue;
+        }
+        pthread_cond_wait(&rot->cond, &rot->lock);
+    }
+    pthread_mutex_unlock(&rot->lock);
+    return NULL;
+}
+
+/**
+ * Start the rotation thread; it creates the first spare right away
+ */
+int rotator_start(rotator_t *rot, const relay_config_t *config) {
+    memset(rot, 0, sizeof(*rot));
+    rot->config = config;
+    rot->spare_wanted = true;
+    pthread_mutex_init(&rot->lock, NULL);
+    pthread_cond_init(&rot->cond, NULL);
+    if (pthread_create(&rot->thread, NULL, rotator_main, rot) != 0) {
+        perror("pthread_create(rotator)");
+        pthread_mutex_destroy(&rot->lock);
+        pthread_cond_destroy(&rot->cond);
+        return -1;
+    }
+    return 0;
+}
+
+/**
+ * True if the writer's file has reached the rotation size or age
+ * (an empty file is never rotated by age)
+ */
+bool rotator_due(const rotator_t *rot, const avro_writer_t *writer) {
+    const relay_config_t *config = rot->config;
+    if (config->rotation_mode == ROTATE_TIME) {
+        return writer->record_count > 0 &&
+               now_ms() - writer->opened_ms >= (int64_t)config->rotation_threshold * 1000;
+    }
+    return writer->current_size >= config->rotation_threshold;
+}
+
+/**
+ * Writer thread: rotate to the ready spare (or a file created now), and
+ * leave the old file to the rotation thread to close
+ */
+int rotator_rotate(rotator_t *rot, avro_writer_t *writer) {
+    avro_spare_t spare;
+    pthread_mutex_lock(&rot->lock);
+    bool ready = rot->spare_ready;
+    if (ready) {
+        spare = rot->spare;
+        rot->spare_ready = false;
+    }
+    pthread_mutex_unlock(&rot->lock);
+
+    if (!ready && avro_writer_create_spare(&spare, rot->config->output_dir, rot->config->index_interval,
+                                           rot->config->prealloc_bytes) != 0) {
+        return -1;
+    }
+    avro_retired_t retired;
+    memset(&retired, 0, sizeof(retired));
+    int ret = avro_writer_swap(writer, &spare, &retired);
+    if (!retired.fp) {
+        avro_writer_discard_spare(&spare);  /* not swapped: the current file carries on */
+        return -1;
+    }
+
+    pthread_mutex_lock(&rot->lock);
+    if (ready) {
+        rot->swaps++;
+    } else {
+        rot->fallbacks++;
+    }
+    bool queued = rot->retired_count < MAX_RETIRED;
+    if (queued) {
+        rot->retired[rot->retired_count++] = retired;
+    }
+    rot->spare_wanted = true;
+    pthread_cond_signal(&rot->cond);
+    pthread_mutex_unlock(&rot->lock);
+
+    if (!queued) {
+        avro_writer_retire(&retired);  /* the rotation thread is behind: close it here */
+    }
+    return ret;
+}
+
+/**
+ * Close the remaining rotated-out files, remove the unused spare and stop
+ */
+void rotator_stop(rotator_t *rot) {
+    pthread_mutex_lock(&rot->lock);
+    rot->stop = true;
+    pthread_cond_signal(&rot->cond);
+    pthread_mutex_unlock(&rot->lock);
+    pthread_join(rot->thread, NULL);
+
+    if (rot->spare_ready) {
+        avro_writer_discard_spare(&rot->spare);
+        rot->spare_ready = false;
+    }
+    pthread_mutex_destroy(&rot->lock);
+    pthread_cond_destroy(&rot->cond);
+}
@@ -18,3 +18,23 @@ void encode_long(int64_t value, uint8_t *buf, size_t *len) {
 
     *len = idx;
 }
+
+/**
+ * Decode AVRO zigzag + varint long from the start of buf
+ * Returns bytes consumed, or 0 if buf does not hold a complete varint
+ */
+size_t decode_long(const uint8_t *buf, size_t len, int64_t *value) {
+    uint64_t encoded = 0;
+    int shift = 0;
+
+    for (size_t idx = 0; idx < len && shift < 64; idx++) {
+        encoded |= (uint64_t)(buf[idx] & 0x7F) << shift;
+        if ((buf[idx] & 0x80) == 0) {
+            *value = (int64_t)(encoded >> 1) ^ -(int64_t)(encoded & 1);
+            return idx + 1;
+        }
+        shift += 7;
+    }
+
+    return 0;
+}
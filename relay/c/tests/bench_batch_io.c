@@ -0,0 +1,154 @@
+#define _GNU_SOURCE  /* sendmmsg */
+#include "../include/relay.h"
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <signal.h>
+#include <sys/socket.h>
+#include <sys/wait.h>
+#include <netinet/in.h>
+#include <arpa/inet.h>
+#include <unistd.h>
+
+/*
+ * Relay throughput benchmark: a child process floods a loopback port with
+ * datagrams; the parent relays them to two sink ports (full rate and every
+ * 5th, as the relay does) for a fixed time, once with one recvfrom + sendto
+ * per datagram and once per batch size with recvmmsg + sendmmsg.
+ * Reports relayed packets per second (AVRO writes are not included).
+ *
+ * Usage: bench_batch_io [seconds] [payload_bytes]
+ */
+
+#define SEND_BATCH 64
+#define DECIMATION 5
+
+static int bound_socket(struct sockaddr_in *addr, int rcvbuf) {
+    int sock = socket(AF_INET, SOCK_DGRAM, IPPROTO_UDP);
+    memset(addr, 0, sizeof(*addr));
+    addr->sin_family = AF_INET;
+    addr->sin_addr.s_addr = inet_addr("127.0.0.1");
+    if (rcvbuf > 0) {
+        setsockopt(sock, SOL_SOCKET, SO_RCVBUF, &rcvbuf, sizeof(rcvbuf));
+    }
+    if (bind(sock, (struct sockaddr *)addr, sizeof(*addr)) != 0) {
+        perror("bind");
+        exit(1);
+    }
+    socklen_t len = sizeof(*addr);
+    getsockname(sock, (struct sockaddr *)addr, &len);
+    return sock;
+}
+
+static double now_seconds(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec + ts.tv_nsec / 1e9;
+}
+
+/**
+ * Sender: flood dst until killed
+ */
+static void flood(const struct sockaddr_in *dst, int payload) {
+    int sock = socket(AF_INET, SOCK_DGRAM, IPPROTO_UDP);
+    uint8_t *data = calloc(1, payload);
+    struct iovec iov = {.iov_base = data, .iov_len = payload};
+    struct mmsghdr msgs[SEND_BATCH];
+    memset(msgs, 0, sizeof(msgs));
+    for (int i = 0; i < SEND_BATCH; i++) {
+        msgs[i].msg_hdr.msg_iov = &iov;
+        msgs[i].msg_hdr.msg_iovlen = 1;
+        msgs[i].msg_hdr.msg_name = (void *)dst;
+        msgs[i].msg_hdr.msg_namelen = sizeof(*dst);
+    }
+    for (;;) {
+        sendmmsg(sock, msgs, SEND_BATCH, 0);
+    }
+}
+
+/**
+ * Relay for seconds; batch_size 0 = one recvfrom/sendto per datagram
+ */
+static double relay(int batch_size, double seconds, int payload) {
+    struct sockaddr_in rx_addr, full_addr, dec_addr;
+    int rx = bound_socket(&rx_addr, 4 * 1024 * 1024);
+    int full_sink = bound_socket(&full_addr, 0);
+    int dec_sink = bound_socket(&dec_addr, 0);
+    int tx = socket(AF_INET, SOCK_DGRAM, IPPROTO_UDP);
+
+    /* Let a blocked receive notice the end of the run */
+    struct timeval tv = {.tv_sec = 0, .tv_usec = 100000};
+    setsockopt(rx, SOL_SOCKET, SO_RCVTIMEO, &tv, sizeof(tv));
+
+    pid_t child = fork();
+    if (child == 0) {
+        flood(&rx_addr, payload);
+        _exit(0);
+    }
+
+    decimator_t dec;
+    decimator_init(&dec, DECIMATION);
+    uint64_t relayed = 0;
+    double start = now_seconds();
+    double end = start + seconds;
+
+    if (batch_size == 0) {
+        uint8_t packet[MAX_PACKET_SIZE];
+        while (now_seconds() < end) {
+            ssize_t len = recvfrom(rx, packet, sizeof(packet), 0, NULL, NULL);
+            if (len < 0) {
+                continue;
+            }
+            sendto(tx, packet, len, 0, (struct sockaddr *)&full_addr, sizeof(full_addr));
+            if (decimator_should_send(&dec)) {
+                sendto(tx, packet, len, 0, (struct sockaddr *)&dec_addr, sizeof(dec_addr));
+            }
+            relayed++;
+        }
+    } else {
+        packet_batch_t batch;
+        bool select[MAX_BATCH_SIZE];
+        packet_batch_init(&batch, batch_size);
+        while (now_seconds() < end) {
+            int count = packet_batch_recv(&batch, rx, 0);
+            if (count <= 0) {
+                continue;
+            }
+            for (int i = 0; i < count; i++) {
+                select[i] = decimator_should_send(&dec);
+            }
+            packet_batch_send(&batch, tx, &full_addr, NULL, count);
+            packet_batch_send(&batch, tx, &dec_addr, select, count);
+            relayed += count;
+        }
+        packet_batch_free(&batch);
+    }
+    double elapsed = now_seconds() - start;
+
+    kill(child, SIGKILL);
+    waitpid(child, NULL, 0);
+    close(rx);
+    close(full_sink);
+    close(dec_sink);
+    close(tx);
+    return relayed / elapsed;
+}
+
+int main(int argc, char *argv[]) {
+    double seconds = argc > 1 ? atof(argv[1]) : 2.0;
+    int payload = argc > 2 ? atoi(argv[2]) : 128;
+    int sizes[] = {0, 1, 8, 32, 128};
+
+    printf("Relay throughput, %d-byte datagrams, %.1f s per run\n", payload, seconds);
+    double baseline = 0;
+    for (size_t i = 0; i < sizeof(sizes) / sizeof(sizes[0]); i++) {
+        double pps = relay(sizes[i], seconds, payload);
+        if (sizes[i] == 0) {
+            baseline = pps;
+            printf("  recvfrom/sendto       %10.0f pps\n", pps);
+        } else {
+            printf("  recvmmsg batch %-4d   %10.0f pps  (%.2fx)\n", sizes[i], pps, pps / baseline);
+        }
+    }
+    return 0;
+}
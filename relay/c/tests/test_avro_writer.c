@@ -1,3 +1,4 @@
+#define _POSIX_C_SOURCE 200809L  /* nanosleep */
 #include "../include/relay.h"
 #include <stdio.h>
 #include <string.h>
@@ -7,6 +8,11 @@
 
 #define TEST_DIR "/tmp/relay_test"
 
+static const uint8_t FIXED_SYNC_MARKER_BYTES[SYNC_MARKER_SIZE] = {
+    0xa4, 0x8a, 0x1e, 0x90, 0x05, 0x04, 0x24, 0x78,
+    0x0a, 0x68, 0x33, 0x7f, 0xc2, 0x50, 0x95, 0x63
+};
+
 /**
  * Helper: check if file exists
  */
@@ -33,7 +39,7 @@ void test_avro_writer_init() {
     avro_writer_t writer;
 
     /* Initialize writer */
-    int ret = avro_writer_init(&writer, TEST_DIR);
+    int ret = avro_writer_init(&writer, TEST_DIR, DEFAULT_INDEX_INTERVAL);
     assert(ret == 0);
     assert(writer.fp != NULL);
     assert(writer.current_size == 0);
@@ -48,17 +54,17 @@ void test_avro_writer_init() {
 }
 
 /**
- * Test AVRO block writing
+ * Test AVRO record writing (one record per block by default)
  */
-void test_avro_writer_write_block() {
+void test_avro_writer_append() {
     avro_writer_t writer;
-    avro_writer_init(&writer, TEST_DIR);
+    avro_writer_init(&writer, TEST_DIR, DEFAULT_INDEX_INTERVAL);
 
     /* Write a block */
     uint8_t test_data[] = {0x01, 0x02, 0x03, 0x04, 0x05};
     size_t test_len = sizeof(test_data);
 
-    int ret = avro_writer_write_block(&writer, test_data, test_len);
+    int ret = avro_writer_append(&writer, test_data, test_len);
     assert(ret == 0);
 
     /* Verify size increased */
@@ -71,7 +77,7 @@ void test_avro_writer_write_block() {
     /* Cleanup */
     avro_writer_close(&writer);
 
-    printf("✓ test_avro_writer_write_block passed\n");
+    printf("✓ test_avro_writer_append passed\n");
 }
 
 /**
@@ -79,14 +85,14 @@ void test_avro_writer_write_block() {
  */
 void test_avro_writer_multiple_blocks() {
     avro_writer_t writer;
-    avro_writer_init(&writer, TEST_DIR);
+    avro_writer_init(&writer, TEST_DIR, DEFAULT_INDEX_INTERVAL);
 
     /* Write 10 blocks */
     uint8_t data[100];
     memset(data, 0xAB, sizeof(data));
 
     for (int i = 0; i < 10; i++) {
-        int ret = avro_writer_write_block(&writer, data, sizeof(data));
+        int ret = avro_writer_append(&writer, data, sizeof(data));
         assert(ret == 0);
     }
 
@@ -108,7 +114,7 @@ void test_avro_writer_multiple_blocks() {
  */
 void test_avro_writer_rotation() {
     avro_writer_t writer;
-    avro_writer_init(&writer, TEST_DIR);
+    avro_writer_init(&writer, TEST_DIR, DEFAULT_INDEX_INTERVAL);
 
     /* Save original filepath */
     char first_file[MAX_PATH_LEN];
@@ -116,7 +122,7 @@ void test_avro_writer_rotation() {
 
     /* Write some data */
     uint8_t data[100];
-    avro_writer_write_block(&writer, data, sizeof(data));
+    avro_writer_append(&writer, data, sizeof(data));
 
     /* Wait 1 second to ensure different timestamp */
     sleep(1);
@@ -144,7 +150,7 @@ void test_avro_writer_rotation() {
  */
 void test_sync_marker() {
     avro_writer_t writer;
-    avro_writer_init(&writer, TEST_DIR);
+    avro_writer_init(&writer, TEST_DIR, DEFAULT_INDEX_INTERVAL);
 
     /* Expected sync marker (from Python implementation) */
     uint8_t expected[SYNC_MARKER_SIZE] = {
@@ -161,6 +167,336 @@ void test_sync_marker() {
     printf("✓ test_sync_marker passed\n");
 }
 
+/**
+ * Test sparse time index written alongside the data file
+ */
+void test_avro_writer_time_index() {
+    avro_writer_t writer;
+    int ret = avro_writer_init(&writer, TEST_DIR, 4);
+    assert(ret == 0);
+    assert(file_exists(writer.index_path));
+
+    /* Records lead with their timestamp (zigzag varint long) */
+    size_t offsets[10];
+    for (int i = 0; i < 10; i++) {
+        uint8_t record[16];
+        size_t ts_len;
+        encode_long(1000 + i, record, &ts_len);
+        memset(record + ts_len, 0xCD, sizeof(record) - ts_len);
+
+        offsets[i] = writer.current_size;
+        ret = avro_writer_append(&writer, record, sizeof(record));
+        assert(ret == 0);
+    }
+
+    char index_path[sizeof(writer.index_path)];
+    strcpy(index_path, writer.index_path);
+    size_t data_size = writer.current_size;
+
+    /* Header + entries for blocks 0, 4, 8 while the file is open */
+    assert(get_file_size(index_path) == INDEX_HEADER_SIZE + 3 * INDEX_ENTRY_SIZE);
+
+    /* Closing appends the summary trailer */
+    avro_writer_close(&writer);
+    assert(get_file_size(index_path) ==
+           INDEX_HEADER_SIZE + 3 * INDEX_ENTRY_SIZE + INDEX_TRAILER_SIZE);
+
+    FILE *fp = fopen(index_path, "rb");
+    uint8_t buf[INDEX_HEADER_SIZE + 3 * INDEX_ENTRY_SIZE + INDEX_TRAILER_SIZE];
+    assert(fread(buf, 1, sizeof(buf), fp) == sizeof(buf));
+    fclose(fp);
+
+    assert(memcmp(buf, INDEX_MAGIC, 4) == 0);
+    assert(buf[4] == INDEX_VERSION);
+    assert(buf[8] == 4);
+
+    for (int e = 0; e < 3; e++) {
+        const uint8_t *entry = buf + INDEX_HEADER_SIZE + e * INDEX_ENTRY_SIZE;
+        uint64_t ts = 0, offset = 0;
+        for (int i = 7; i >= 0; i--) {
+            ts = (ts << 8) | entry[i];
+            offset = (offset << 8) | entry[8 + i];
+        }
+        assert(ts == (uint64_t)(1000 + 4 * e));
+        assert(offset == offsets[4 * e]);
+    }
+
+    const uint8_t *trailer = buf + INDEX_HEADER_SIZE + 3 * INDEX_ENTRY_SIZE;
+    assert(memcmp(trailer, INDEX_TRAILER_MAGIC, 4) == 0);
+    assert(trailer[8] == (1000 & 0xFF) && trailer[9] == (1000 >> 8));   /* first time */
+    assert(trailer[16] == (1009 & 0xFF) && trailer[17] == (1009 >> 8)); /* last time */
+    assert(trailer[24] == 10);                                           /* records */
+    assert(trailer[32] == (data_size & 0xFF) && trailer[33] == (data_size >> 8));
+
+    printf("✓ test_avro_writer_time_index passed\n");
+}
+
+/**
+ * Test index can be disabled
+ */
+void test_avro_writer_index_disabled() {
+    avro_writer_t writer;
+    int ret = avro_writer_init(&writer, TEST_DIR, 0);
+    assert(ret == 0);
+    assert(writer.index_fp == NULL);
+
+    uint8_t data[8] = {0};
+    assert(avro_writer_append(&writer, data, sizeof(data)) == 0);
+
+    avro_writer_close(&writer);
+
+    printf("✓ test_avro_writer_index_disabled passed\n");
+}
+
+/**
+ * Helper: decode a zigzag varint long at buf, returning bytes used
+ */
+static size_t read_long(const uint8_t *buf, int64_t *value) {
+    uint64_t n = 0;
+    size_t i = 0;
+    int shift = 0;
+    do {
+        n |= (uint64_t)(buf[i] & 0x7F) << shift;
+        shift += 7;
+    } while (buf[i++] & 0x80);
+    *value = (int64_t)(n >> 1) ^ -(int64_t)(n & 1);
+    return i;
+}
+
+/**
+ * Test multi-record blocks: a block is written at its record or byte limit,
+ * framed as [count][size][records][sync]
+ */
+void test_avro_writer_record_blocks() {
+    avro_writer_t writer;
+    assert(avro_writer_init(&writer, TEST_DIR, 1) == 0);
+    assert(avro_writer_set_blocks(&writer, 1024, 4, 60000) == 0);
+
+    uint8_t record[16];
+    for (int i = 0; i < 10; i++) {
+        size_t ts_len;
+        encode_long(2000 + i, record, &ts_len);
+        memset(record + ts_len, i, sizeof(record) - ts_len);
+        assert(avro_writer_append(&writer, record, sizeof(record)) == 0);
+    }
+
+    /* Two full blocks written, two records pending */
+    assert(writer.block_count == 2);
+    assert(writer.block_records == 2);
+    assert(get_file_size(writer.filepath) == writer.current_size);
+
+    char filepath[MAX_PATH_LEN];
+    char index_path[sizeof(writer.index_path)];
+    strcpy(filepath, writer.filepath);
+    strcpy(index_path, writer.index_path);
+
+    /* Closing writes the pending block */
+    avro_writer_close(&writer);
+
+    uint8_t buf[512];
+    FILE *fp = fopen(filepath, "rb");
+    size_t size = fread(buf, 1, sizeof(buf), fp);
+    fclose(fp);
+
+    int64_t expected_counts[] = {4, 4, 2};
+    size_t pos = 0;
+    int first = 0;
+    for (int b = 0; b < 3; b++) {
+        int64_t count, len, ts;
+        pos += read_long(buf + pos, &count);
+        pos += read_long(buf + pos, &len);
+        assert(count == expected_counts[b]);
+        assert(len == count * (int64_t)sizeof(record));
+        for (int r = 0; r < count; r++) {
+            read_long(buf + pos + r * sizeof(record), &ts);
+            assert(ts == 2000 + first + r);
+        }
+        pos += len;
+        assert(memcmp(buf + pos, FIXED_SYNC_MARKER_BYTES, SYNC_MARKER_SIZE) == 0);
+        pos += SYNC_MARKER_SIZE;
+        first += count;
+    }
+    assert(pos == size);
+
+    /* One index entry per block, at the block's first record time */
+    assert(get_file_size(index_path) == INDEX_HEADER_SIZE + 3 * INDEX_ENTRY_SIZE + INDEX_TRAILER_SIZE);
+
+    /* Byte limit: 16-byte records into 40-byte blocks close after 3 records */
+    assert(avro_writer_init(&writer, TEST_DIR, 0) == 0);
+    assert(avro_writer_set_blocks(&writer, 40, 1000, 60000) == 0);
+    for (int i = 0; i < 7; i++) {
+        assert(avro_writer_append(&writer, record, sizeof(record)) == 0);
+    }
+    assert(writer.block_count == 2);
+    assert(writer.block_records == 1);
+
+    /* Records too large for the block buffer are written on their own */
+    uint8_t large[MAX_PACKET_SIZE + 64];
+    memset(large, 0, sizeof(large));
+    assert(avro_writer_append(&writer, large, sizeof(large)) == 0);
+    assert(writer.block_count == 4);
+    assert(writer.block_records == 0);
+    assert(writer.record_count == 8);
+    avro_writer_close(&writer);
+
+    printf("✓ test_avro_writer_record_blocks passed\n");
+}
+
+/**
+ * Test block deadline: a pending block is written by poll once it is due
+ */
+void test_avro_writer_block_deadline() {
+    avro_writer_t writer;
+    assert(avro_writer_init(&writer, TEST_DIR, 0) == 0);
+    assert(avro_writer_set_blocks(&writer, 65536, 1000, 20) == 0);
+
+    uint8_t record[8] = {0x02};
+    assert(avro_writer_append(&writer, record, sizeof(record)) == 0);
+    assert(avro_writer_append(&writer, record, sizeof(record)) == 0);
+    assert(writer.block_count == 0);
+    assert(avro_writer_poll(&writer) == 0);
+    assert(writer.block_count == 0);
+
+    struct timespec wait = {.tv_sec = 0, .tv_nsec = 30000000L};
+    nanosleep(&wait, NULL);
+    assert(avro_writer_poll(&writer) == 0);
+    assert(writer.block_count == 1);
+    assert(writer.block_records == 0);
+    assert(get_file_size(writer.filepath) == writer.current_size);
+
+    /* Rotation keeps the block limits */
+    sleep(1);
+    assert(avro_writer_rotate(&writer, TEST_DIR) == 0);
+    assert(writer.block_max_records == 1000);
+    assert(writer.block_buf != NULL);
+    avro_writer_close(&writer);
+
+    printf("✓ test_avro_writer_block_deadline passed\n");
+}
+
+/**
+ * Test durability policies: fdatasync by bytes written, by interval (also
+ * from poll, without new records), on close, and never with none
+ */
+void test_avro_writer_durability() {
+    avro_writer_t writer;
+    uint8_t record[100];
+    memset(record, 0x02, sizeof(record));
+
+    /* Bytes: one sync per 500 bytes (each block is 1 + 2 + 100 + 16 = 119 bytes) */
+    assert(avro_writer_init(&writer, TEST_DIR, 0) == 0);
+    assert(avro_writer_set_durability(&writer, DURABILITY_BYTES, 500, 0) == 0);
+    for (int i = 0; i < 10; i++) {
+        assert(avro_writer_append(&writer, record, sizeof(record)) == 0);
+    }
+    assert(writer.durability.syncs == 2);  /* at 595 and 1190 bytes */
+    assert(writer.synced_size == 1190);
+    assert(writer.durability.sync_ns_max > 0);
+
+    /* Rotation keeps the policy and its counters; closing syncs the rest */
+    assert(avro_writer_append(&writer, record, sizeof(record)) == 0);
+    sleep(1);
+    assert(avro_writer_rotate(&writer, TEST_DIR) == 0);
+    assert(writer.durability.mode == DURABILITY_BYTES);
+    assert(writer.durability.syncs == 3);
+    avro_writer_close(&writer);
+
+    /* Interval: the first block is synced once 20 ms have passed since the last sync */
+    assert(avro_writer_init(&writer, TEST_DIR, 0) == 0);
+    assert(avro_writer_set_durability(&writer, DURABILITY_INTERVAL, 20, 0) == 0);
+    assert(avro_writer_append(&writer, record, sizeof(record)) == 0);
+    assert(writer.durability.syncs == 0);
+    struct timespec wait = {.tv_sec = 0, .tv_nsec = 30000000L};
+    nanosleep(&wait, NULL);
+    assert(avro_writer_poll(&writer) == 0);
+    assert(writer.durability.syncs == 1);
+    assert(avro_writer_poll(&writer) == 0);
+    assert(writer.durability.syncs == 1);  /* nothing new to sync */
+    avro_writer_close(&writer);
+
+    /* None: never synced; writeback windows still smooth the page cache */
+    assert(avro_writer_init(&writer, TEST_DIR, 0) == 0);
+    assert(avro_writer_set_durability(&writer, DURABILITY_NONE, 0, 256) == 0);
+    for (int i = 0; i < 10; i++) {
+        assert(avro_writer_append(&writer, record, sizeof(record)) == 0);
+    }
+    assert(writer.durability.syncs == 0);
+#ifdef __linux__
+    assert(writer.durability.writebacks == 3);  /* at 357, 714 and 1071 bytes */
+    assert(writer.writeback_start == 714);      /* waited on the window before it, [357, 714), only */
+    assert(writer.writeback_size == 1071);
+#endif
+    avro_writer_close(&writer);
+    assert(writer.durability.syncs == 0);
+
+    printf("✓ test_avro_writer_durability passed\n");
+}
+
+/**
+ * Test rotation to a spare: created and preallocated ahead, renamed into
+ * place on swap; the old file is completed, then closed by retire
+ */
+void test_avro_writer_swap() {
+    avro_writer_t writer;
+    assert(avro_writer_init(&writer, TEST_DIR, 4) == 0);
+    uint8_t record[16];
+    for (int i = 0; i < 10; i++) {
+        size_t ts_len;
+        encode_long(3000 + i, record, &ts_len);
+        memset(record + ts_len, 0, sizeof(record) - ts_len);
+        assert(avro_writer_append(&writer, record, sizeof(record)) == 0);
+    }
+    char old_path[MAX_PATH_LEN];
+    char old_index[sizeof(writer.index_path)];
+    strcpy(old_path, writer.filepath);
+    strcpy(old_index, writer.index_path);
+    size_t old_size = writer.current_size;
+
+    avro_spare_t spare;
+    assert(avro_writer_create_spare(&spare, TEST_DIR, 4, 1024 * 1024) == 0);
+    struct stat st;
+    assert(stat(spare.path, &st) == 0);
+    assert(st.st_size == 0);  /* preallocation keeps the size */
+    bool preallocated = (size_t)st.st_blocks * 512 >= 1024 * 1024;
+    char spare_path[MAX_PATH_LEN];
+    strcpy(spare_path, spare.path);
+
+    /* Same second as the first file: the new name gets a suffix */
+    avro_retired_t retired;
+    assert(avro_writer_swap(&writer, &spare, &retired) == 0);
+    assert(strcmp(writer.filepath, old_path) != 0);
+    assert(strstr(writer.filepath, ".avro") != NULL);
+    assert(!file_exists(spare_path));
+    assert(file_exists(writer.filepath) && file_exists(writer.index_path));
+    assert(writer.current_size == 0 && writer.record_count == 0);
+    assert(retired.size == old_size);
+
+    /* The retired file is complete (index trailer) once closed */
+    avro_writer_retire(&retired);
+    assert(get_file_size(old_path) == old_size);
+    assert(get_file_size(old_index) == INDEX_HEADER_SIZE + 3 * INDEX_ENTRY_SIZE + INDEX_TRAILER_SIZE);
+
+    /* Writing continues in the new file; closing releases the unused preallocation */
+    assert(avro_writer_append(&writer, record, sizeof(record)) == 0);
+    char new_path[MAX_PATH_LEN];
+    strcpy(new_path, writer.filepath);
+    size_t new_size = writer.current_size;
+    avro_writer_close(&writer);
+    assert(stat(new_path, &st) == 0);
+    assert((size_t)st.st_size == new_size);
+    if (preallocated) {
+        assert((size_t)st.st_blocks * 512 < 1024 * 1024);
+    }
+
+    /* An unused spare is removed */
+    assert(avro_writer_create_spare(&spare, TEST_DIR, 0, 0) == 0);
+    strcpy(spare_path, spare.path);
+    avro_writer_discard_spare(&spare);
+    assert(!file_exists(spare_path));
+
+    printf("✓ test_avro_writer_swap passed\n");
+}
+
 int main() {
     printf("Running AVRO writer tests...\n");
 
@@ -168,10 +504,16 @@ int main() {
     mkdir(TEST_DIR, 0755);
 
     test_avro_writer_init();
-    test_avro_writer_write_block();
+    test_avro_writer_append();
     test_avro_writer_multiple_blocks();
     test_avro_writer_rotation();
     test_sync_marker();
+    test_avro_writer_time_index();
+    test_avro_writer_index_disabled();
+    test_avro_writer_record_blocks();
+    test_avro_writer_block_deadline();
+    test_avro_writer_durability();
+    test_avro_writer_swap();
 
     printf("\nAll AVRO writer tests passed!\n");
 
@@ -0,0 +1,165 @@
+#include "../include/relay.h"
+#include <stdio.h>
+#include <string.h>
+#include <assert.h>
+#include <sys/socket.h>
+#include <netinet/in.h>
+#include <arpa/inet.h>
+#include <unistd.h>
+
+/**
+ * Helper: UDP socket bound to an ephemeral loopback port
+ */
+static int bound_socket(struct sockaddr_in *addr) {
+    int sock = socket(AF_INET, SOCK_DGRAM, IPPROTO_UDP);
+    assert(sock >= 0);
+
+    memset(addr, 0, sizeof(*addr));
+    addr->sin_family = AF_INET;
+    addr->sin_addr.s_addr = inet_addr("127.0.0.1");
+    addr->sin_port = 0;
+    assert(bind(sock, (struct sockaddr *)addr, sizeof(*addr)) == 0);
+
+    socklen_t len = sizeof(*addr);
+    assert(getsockname(sock, (struct sockaddr *)addr, &len) == 0);
+    return sock;
+}
+
+/**
+ * Helper: send datagram i (i + 1 bytes of value i)
+ */
+static void send_datagram(int sock, const struct sockaddr_in *dst, int i) {
+    uint8_t data[64];
+    memset(data, i, sizeof(data));
+    assert(sendto(sock, data, i + 1, 0, (const struct sockaddr *)dst, sizeof(*dst)) == i + 1);
+}
+
+/**
+ * Test batch receive: queued datagrams are drained several per call
+ */
+void test_batch_recv() {
+    struct sockaddr_in rx_addr, tx_addr;
+    int rx = bound_socket(&rx_addr);
+    int tx = bound_socket(&tx_addr);
+
+    packet_batch_t batch;
+    assert(packet_batch_init(&batch, 4) == 0);
+    assert(batch.size == 4);
+
+    for (int i = 0; i < 10; i++) {
+        send_datagram(tx, &rx_addr, i);
+    }
+
+    int received = 0;
+    int calls = 0;
+    while (received < 10) {
+        int count = packet_batch_recv(&batch, rx, 0);
+        assert(count >= 1 && count <= 4);
+        for (int i = 0; i < count; i++) {
+            int expected = received + i;
+            assert(batch.lengths[i] == (size_t)expected + 1);
+            assert(packet_batch_data(&batch, i)[0] == expected);
+            assert(batch.src[i].sin_port == tx_addr.sin_port);
+        }
+        received += count;
+        calls++;
+    }
+    assert(calls < 10);  /* more than one datagram per call */
+
+    packet_batch_free(&batch);
+    close(rx);
+    close(tx);
+
+    printf("✓ test_batch_recv passed\n");
+}
+
+/**
+ * Test batch timeout: a short batch is delivered once the timeout expires
+ */
+void test_batch_recv_timeout() {
+    struct sockaddr_in rx_addr, tx_addr;
+    int rx = bound_socket(&rx_addr);
+    int tx = bound_socket(&tx_addr);
+
+    packet_batch_t batch;
+    assert(packet_batch_init(&batch, 8) == 0);
+
+    send_datagram(tx, &rx_addr, 1);
+    send_datagram(tx, &rx_addr, 2);
+    int count = packet_batch_recv(&batch, rx, 20000);  /* 20 ms */
+    assert(count == 2);
+
+    packet_batch_free(&batch);
+    close(rx);
+    close(tx);
+
+    printf("✓ test_batch_recv_timeout passed\n");
+}
+
+/**
+ * Test batch send: all slots, or only the selected ones, in order
+ */
+void test_batch_send() {
+    struct sockaddr_in rx_addr, tx_addr, sink_addr;
+    int rx = bound_socket(&rx_addr);
+    int tx = bound_socket(&tx_addr);
+    int sink = bound_socket(&sink_addr);
+
+    packet_batch_t batch;
+    assert(packet_batch_init(&batch, 8) == 0);
+    for (int i = 0; i < 6; i++) {
+        send_datagram(tx, &rx_addr, i);
+    }
+    int count = 0;
+    while (count < 6) {
+        count += packet_batch_recv(&batch, rx, 20000);
+    }
+    assert(count == 6);
+
+    bool select[6] = {false, true, false, false, true, false};
+    assert(packet_batch_send(&batch, tx, &sink_addr, NULL, count) == 6);
+    assert(packet_batch_send(&batch, tx, &sink_addr, select, count) == 2);
+
+    uint8_t data[64];
+    int expected[] = {0, 1, 2, 3, 4, 5, 1, 4};
+    for (int i = 0; i < 8; i++) {
+        ssize_t len = recv(sink, data, sizeof(data), 0);
+        assert(len == expected[i] + 1);
+        assert(data[0] == expected[i]);
+    }
+
+    packet_batch_free(&batch);
+    close(rx);
+    close(tx);
+    close(sink);
+
+    printf("✓ test_batch_send passed\n");
+}
+
+/**
+ * Test batch size clamping
+ */
+void test_batch_size_limits() {
+    packet_batch_t batch;
+    assert(packet_batch_init(&batch, 0) == 0);
+    assert(batch.size == 1);
+    packet_batch_free(&batch);
+
+    assert(packet_batch_init(&batch, MAX_BATCH_SIZE + 1) == 0);
+    assert(batch.size == MAX_BATCH_SIZE);
+    packet_batch_free(&batch);
+
+    printf("✓ test_batch_size_limits passed\n");
+}
+
+int main() {
+    printf("Running batched I/O tests...\n");
+
+    test_batch_recv();
+    test_batch_recv_timeout();
+    test_batch_send();
+    test_batch_size_limits();
+
+    printf("\nAll batched I/O tests passed!\n");
+    return 0;
+}
@@ -0,0 +1,254 @@
+#define _POSIX_C_SOURCE 200809L
+#include "../include/relay.h"
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <assert.h>
+#include <sys/stat.h>
+#include <dirent.h>
+
+#define TEST_DIR "/tmp/relay_ring_test"
+
+/**
+ * Helper: datagram i (i % 200 + 1 bytes of value i)
+ */
+static size_t make_datagram(uint8_t *buf, int i) {
+    size_t len = i % 200 + 1;
+    memset(buf, i & 0xFF, len);
+    return len;
+}
+
+/**
+ * Test push/peek/pop order and lengths
+ */
+void test_ring_fifo() {
+    packet_ring_t ring;
+    assert(packet_ring_init(&ring, 0) == 0);
+    assert(ring.capacity >= 2 * (size_t)MAX_PACKET_SIZE);
+    assert((ring.capacity & (ring.capacity - 1)) == 0);
+
+    size_t len;
+    assert(packet_ring_peek(&ring, &len) == NULL);
+
+    uint8_t buf[256];
+    for (int i = 0; i < 10; i++) {
+        size_t n = make_datagram(buf, i);
+        assert(packet_ring_push(&ring, buf, n) == 0);
+    }
+    for (int i = 0; i < 10; i++) {
+        const uint8_t *data = packet_ring_peek(&ring, &len);
+        assert(data != NULL);
+        assert(len == (size_t)(i % 200 + 1));
+        assert(data[0] == i && data[len - 1] == i);
+        packet_ring_pop(&ring);
+    }
+    assert(packet_ring_peek(&ring, &len) == NULL);
+    assert(packet_ring_used(&ring) == 0);
+
+    packet_ring_free(&ring);
+    printf("✓ test_ring_fifo passed\n");
+}
+
+/**
+ * Test full ring: push fails without overwriting, room returns after pops,
+ * and records that would cross the end wrap to the start
+ */
+void test_ring_full_and_wrap() {
+    packet_ring_t ring;
+    assert(packet_ring_init(&ring, 0) == 0);
+
+    static uint8_t big[MAX_PACKET_SIZE];
+    int pushed = 0;
+    while (packet_ring_push(&ring, big, 50000) == 0) {
+        pushed++;
+    }
+    assert(pushed >= 2);
+    assert(packet_ring_push(&ring, big, MAX_PACKET_SIZE + 1) == -1);
+
+    /* Pop one; the next record no longer fits before the end and wraps */
+    size_t len;
+    assert(packet_ring_peek(&ring, &len) != NULL);
+    packet_ring_pop(&ring);
+    memset(big, 0x5A, 1000);
+    assert(packet_ring_push(&ring, big, 1000) == 0);
+
+    for (int i = 1; i < pushed; i++) {
+        assert(packet_ring_peek(&ring, &len) != NULL && len == 50000);
+        packet_ring_pop(&ring);
+    }
+    const uint8_t *data = packet_ring_peek(&ring, &len);
+    assert(data != NULL && len == 1000 && data[999] == 0x5A);
+    packet_ring_pop(&ring);
+    assert(packet_ring_used(&ring) == 0);
+
+    packet_ring_free(&ring);
+    printf("✓ test_ring_full_and_wrap passed\n");
+}
+
+/* Consumer side of test_ring_threads */
+typedef struct {
+    packet_ring_t *ring;
+    int count;
+    int errors;
+} consumer_t;
+
+static void *consume(void *arg) {
+    consumer_t *c = arg;
+    uint8_t expected[256];
+    for (int i = 0; i < c->count;) {
+        size_t len;
+        const uint8_t *data = packet_ring_peek(c->ring, &len);
+        if (!data) {
+            continue;
+        }
+        size_t n = make_datagram(expected, i);
+        if (len != n || memcmp(data, expected, n) != 0) {
+            c->errors++;
+        }
+        packet_ring_pop(c->ring);
+        i++;
+    }
+    return NULL;
+}
+
+/**
+ * Test one producer and one consumer thread: every datagram arrives intact, in order
+ */
+void test_ring_threads() {
+    packet_ring_t ring;
+    assert(packet_ring_init(&ring, 0) == 0);
+
+    consumer_t consumer = {.ring = &ring, .count = 200000, .errors = 0};
+    pthread_t thread;
+    assert(pthread_create(&thread, NULL, consume, &consumer) == 0);
+
+    uint8_t buf[256];
+    for (int i = 0; i < consumer.count;) {
+        size_t n = make_datagram(buf, i);
+        if (packet_ring_push(&ring, buf, n) == 0) {
+            i++;
+        }
+    }
+    pthread_join(thread, NULL);
+    assert(consumer.errors == 0);
+
+    packet_ring_free(&ring);
+    printf("✓ test_ring_threads passed\n");
+}
+
+/**
+ * Test disk writer thread: submitted datagrams are all written by stop
+ */
+void test_disk_writer() {
+    relay_config_t config;
+    memset(&config, 0, sizeof(config));
+    strcpy(config.output_dir, TEST_DIR);
+    config.rotation_threshold = 50 * 1024 * 1024;
+    config.index_interval = DEFAULT_INDEX_INTERVAL;
+    config.block_bytes = DEFAULT_BLOCK_BYTES;
+    config.block_records = 16;
+    config.block_delay_ms = DEFAULT_BLOCK_DELAY_MS;
+    config.ring_bytes = 0;
+    config.ring_block = true;
+
+    disk_writer_t disk;
+    assert(disk_writer_start(&disk, &config) == 0);
+
+    char filepath[MAX_PATH_LEN];
+    strcpy(filepath, disk.writer.filepath);
+
+    uint8_t record[32];
+    for (int i = 0; i < 1000; i++) {
+        size_t ts_len;
+        encode_long(i, record, &ts_len);
+        assert(disk_writer_submit(&disk, record, sizeof(record)) == 0);
+    }
+    assert(!disk_writer_failed(&disk));
+
+    disk_writer_stop(&disk);
+    assert(disk_writer_written(&disk) == 1000);
+    assert(disk.submitted == 1000);
+    assert(disk.dropped == 0);
+
+    /* 1000 records of 32 bytes in blocks of 16: [count][size][data][sync] */
+    struct stat st;
+    assert(stat(filepath, &st) == 0);
+    size_t full_blocks = 1000 / 16, last = 1000 % 16;
+    size_t expected = full_blocks * (1 + 2 + 16 * 32 + SYNC_MARKER_SIZE) +
+                      (1 + 2 + last * 32 + SYNC_MARKER_SIZE);
+    assert((size_t)st.st_size == expected);
+
+    printf("✓ test_disk_writer passed\n");
+}
+
+/**
+ * Test time rotation on the disk writer thread: a quiet file past its age is
+ * rotated to the spare the rotation thread prepared
+ */
+void test_disk_writer_time_rotation() {
+    system("rm -rf " TEST_DIR "/*");
+
+    relay_config_t config;
+    memset(&config, 0, sizeof(config));
+    strcpy(config.output_dir, TEST_DIR);
+    config.rotation_mode = ROTATE_TIME;
+    config.rotation_threshold = 1;  /* seconds */
+    config.prealloc_bytes = 1024 * 1024;
+    config.index_interval = DEFAULT_INDEX_INTERVAL;
+    config.block_bytes = DEFAULT_BLOCK_BYTES;
+    config.block_records = 1;
+    config.ring_bytes = 0;
+
+    disk_writer_t disk;
+    assert(disk_writer_start(&disk, &config) == 0);
+
+    uint8_t record[32] = {0x02};
+    assert(disk_writer_submit(&disk, record, sizeof(record)) == 0);
+    struct timespec wait = {.tv_sec = 1, .tv_nsec = 300000000L};
+    nanosleep(&wait, NULL);
+    assert(disk_writer_submit(&disk, record, sizeof(record)) == 0);
+    disk_writer_stop(&disk);
+
+    assert(disk.rotator.swaps == 1);
+    assert(disk.rotator.fallbacks == 0);
+    assert(disk_writer_written(&disk) == 2);
+
+    /* Two data files with their indexes; the unused spare is gone */
+    int avro = 0, other = 0;
+    DIR *dir = opendir(TEST_DIR);
+    struct dirent *entry;
+    while ((entry = readdir(dir)) != NULL) {
+        size_t len = strlen(entry->d_name);
+        if (strcmp(entry->d_name, ".") == 0 || strcmp(entry->d_name, "..") == 0) {
+            continue;
+        }
+        if (len > 5 && strcmp(entry->d_name + len - 5, ".avro") == 0) {
+            avro++;
+        } else if (len <= 9 || strcmp(entry->d_name + len - 9, ".avro.idx") != 0) {
+            other++;
+        }
+    }
+    closedir(dir);
+    assert(avro == 2);
+    assert(other == 0);
+
+    printf("✓ test_disk_writer_time_rotation passed\n");
+}
+
+int main() {
+    printf("Running ring and disk writer tests...\n");
+
+    mkdir(TEST_DIR, 0755);
+
+    test_ring_fifo();
+    test_ring_full_and_wrap();
+    test_ring_threads();
+    test_disk_writer();
+    test_disk_writer_time_rotation();
+
+    printf("\nAll ring and disk writer tests passed!\n");
+
+    system("rm -rf " TEST_DIR);
+
+    return 0;
+}
@@ -46,10 +46,30 @@ void test_encode_long_multi_byte() {
     printf("✓ test_encode_long_multi_byte passed\n");
 }
 
+void test_decode_long_roundtrip() {
+    uint8_t buf[10];
+    size_t len;
+    int64_t value;
+    const int64_t cases[] = {0, 1, -1, 63, 64, -65, 1700000000000000000LL, INT64_MIN, INT64_MAX};
+
+    for (size_t i = 0; i < sizeof(cases) / sizeof(cases[0]); i++) {
+        encode_long(cases[i], buf, &len);
+        assert(decode_long(buf, len, &value) == len);
+        assert(value == cases[i]);
+    }
+
+    /* Truncated varint (continuation bit set on last byte) */
+    encode_long(64, buf, &len);
+    assert(decode_long(buf, 1, &value) == 0);
+
+    printf("✓ test_decode_long_roundtrip passed\n");
+}
+
 int main() {
     printf("Running AVRO utils tests...\n");
     test_encode_long_simple();
     test_encode_long_multi_byte();
+    test_decode_long_roundtrip();
     printf("\nAll utils tests passed!\n");
     return 0;
 }
@@ -26,7 +26,8 @@ from api import create_app
 class RelayProcess:
     """Manages a single relay process for one channel"""
 
-    def __init__(self, channel_config: dict, relay_binary: str, global_config: dict):
+    def __init__(self, channel_config: dict, relay_binary: str, global_config: dict,
+                 relay_config: Optional[dict] = None):
         self.name = channel_config['name']
         self.port = channel_config['port']
         self.relay_binary = relay_binary
@@ -38,9 +39,53 @@ class RelayProcess:
         self.env = os.environ.copy()
         self.env['RELAY_RX_PORT'] = str(self.port)
 
-        # Global storage config
+        # Global storage config: one subdirectory per channel, so readers
+        # (pivot catalog) can attribute files without opening them
         storage = global_config.get('storage', {})
-        self.env['RELAY_OUTPUT_DIR'] = storage.get('avro_path', './data')
+        self.output_dir = os.path.join(storage.get('avro_path', './data'), self.name)
+        self.env['RELAY_OUTPUT_DIR'] = self.output_dir
+
+        # Rotation, index, block, batch, ring and durability settings
+        # (relay.yaml, per-channel override in the channel config)
+        rotation = channel_config.get('rotation', (relay_config or {}).get('rotation', {}))
+        if 'mode' in rotation:
+            self.env['RELAY_ROTATION_MODE'] = str(rotation['mode'])
+        if 'threshold' in rotation:
+            self.env['RELAY_ROTATION_THRESHOLD'] = str(rotation['threshold'])
+        if 'prealloc_bytes' in rotation:
+            self.env['RELAY_PREALLOC_BYTES'] = str(rotation['prealloc_bytes'])
+
+        index = channel_config.get('index', (relay_config or {}).get('index', {}))
+        if 'interval' in index:
+            self.env['RELAY_INDEX_INTERVAL'] = str(index['interval'])
+
+        block = channel_config.get('block', (relay_config or {}).get('block', {}))
+        if 'records' in block:
+            self.env['RELAY_BLOCK_RECORDS'] = str(block['records'])
+        if 'bytes' in block:
+            self.env['RELAY_BLOCK_BYTES'] = str(block['bytes'])
+        if 'delay_ms' in block:
+            self.env['RELAY_BLOCK_DELAY_MS'] = str(block['delay_ms'])
+
+        batch = channel_config.get('batch', (relay_config or {}).get('batch', {}))
+        if 'size' in batch:
+            self.env['RELAY_BATCH_SIZE'] = str(batch['size'])
+        if 'timeout_us' in batch:
+            self.env['RELAY_BATCH_TIMEOUT_US'] = str(batch['timeout_us'])
+
+        ring = channel_config.get('ring', (relay_config or {}).get('ring', {}))
+        if 'bytes' in ring:
+            self.env['RELAY_RING_BYTES'] = str(ring['bytes'])
+        if 'full' in ring:
+            self.env['RELAY_RING_FULL'] = str(ring['full'])
+
+        durability = channel_config.get('durability', (relay_config or {}).get('durability', {}))
+        if 'mode' in durability:
+            self.env['RELAY_DURABILITY'] = str(durability['mode'])
+        if 'value' in durability:
+            self.env['RELAY_DURABILITY_VALUE'] = str(durability['value'])
+        if 'writeback_bytes' in durability:
+            self.env['RELAY_WRITEBACK_BYTES'] = str(durability['writeback_bytes'])
 
     def start(self):
         """Start relay process"""
@@ -49,6 +94,7 @@ class RelayProcess:
             return
 
         print(f"[{self.name}] Starting relay on port {self.port}...")
+        os.makedirs(self.output_dir, exist_ok=True)
 
         self.process = subprocess.Popen(
             [self.relay_binary, self.name],
@@ -197,7 +243,7 @@ class RelayOrchestrator:
                     channel_config.update(channel['config'])
 
                 with self.process_lock:
-                    relay = RelayProcess(channel_config, self.relay_binary, self.global_config)
+                    relay = RelayProcess(channel_config, self.relay_binary, self.global_config, self.config)
                     self.processes[name] = relay
                     relay.start()
 
@@ -233,7 +279,7 @@ class RelayOrchestrator:
             if name in self.processes:
                 raise ValueError(f"Relay already running for channel '{name}'")
 
-            relay = RelayProcess(channel_config, self.relay_binary, self.global_config)
+            relay = RelayProcess(channel_config, self.relay_binary, self.global_config, self.config)
             relay.start()
             self.processes[name] = relay
 
@@ -2,6 +2,7 @@ import socket
 import os
 import time
 import io
+import struct
 import sys
 from pathlib import Path
 
@@ -13,26 +14,78 @@ import avro.io
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../lib/python'))
 from speeddata_config import load_config
 
-def new_writer(schema: str, output_dir: str) -> avro.datafile.DataFileWriter:
-    """Create a new Avro writer object."""
+# Sparse time index layout (must match relay/c/src/avro_writer.c)
+INDEX_MAGIC = b'SDIX'
+INDEX_TRAILER_MAGIC = b'SDIE'
+INDEX_VERSION = 1
+INDEX_INTERVAL = 64  # blocks between index entries
+
+
+class TimeIndex:
+    """
+    Sparse time index written alongside an AVRO file (<file>.avro.idx).
+
+    Header is magic, version and interval; each entry is the leading long
+    (`time` field) of the block's first record and the block's byte offset.
+    Closing appends a trailer with the file's time range, record count and size.
+    """
+
+    def __init__(self, path: str, interval: int = INDEX_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.block_count = 0
+        self.first_time = None
+        self.last_time = None
+        self.file = open(path, "wb")
+        self.file.write(INDEX_MAGIC + struct.pack('<III', INDEX_VERSION, interval, 0))
+        self.file.flush()
+
+    def add_block(self, offset: int, data: bytes):
+        """Track the block at offset and index it if it is due for an entry."""
+        try:
+            timestamp = avro.io.BinaryDecoder(io.BytesIO(data)).read_long()
+        except Exception:
+            timestamp = None
+        if timestamp is not None:
+            if self.first_time is None:
+                self.first_time = timestamp
+            self.last_time = timestamp
+            if self.block_count % self.interval == 0:
+                self.file.write(struct.pack('<qQ', timestamp, offset))
+                self.file.flush()
+        self.block_count += 1
+
+    def close(self, data_size: int):
+        """Write the summary trailer and close."""
+        if self.block_count:
+            self.file.write(INDEX_TRAILER_MAGIC + struct.pack(
+                '<4xqqQQ', self.first_time or 0, self.last_time or 0, self.block_count, data_size))
+        self.file.close()
+
+
+def new_writer(schema: str, output_dir: str, index_interval: int = INDEX_INTERVAL) -> avro.datafile.DataFileWriter:
+    """Create a new Avro writer object with its sparse time index."""
     os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"data_{int(time.time())}.avro")
     writer = avro.datafile.DataFileWriter(
-        open(
-            os.path.join(
-                output_dir,
-                f"data_{int(time.time())}.avro",
-            ),
-            "wb",
-        ),
+        open(path, "wb"),
         avro.io.DatumWriter(),
         schema,
     )
     writer.sync_marker = b'\xa4\x8a\x1e\x90\x05\x04$x\nh3\x7f\xc2P\x95c'
     print(writer.sync_marker)
     writer.flush()
+    writer.index = TimeIndex(path + '.idx', index_interval) if index_interval > 0 else None
     return writer
 
 
+def close_writer(writer: avro.datafile.DataFileWriter):
+    """Close an Avro writer and its time index."""
+    writer.close()
+    if writer.index:
+        writer.index.close(os.path.getsize(writer.writer.name))
+
+
 class Decimator:
     """Handles decimation of incoming data packets."""
 
@@ -115,9 +168,12 @@ def main():
     rotation_mode = rotation_config.get('mode', 'size')
     rotation_threshold = rotation_config.get('threshold', 50 * 1024 * 1024)  # bytes
 
+    # Get time index config
+    index_interval = config.get('index', {}).get('interval', INDEX_INTERVAL)
+
     # Get storage path
     storage_config = config.get('storage', {})
-    output_dir = storage_config.get('avro_path', '../../data')
+    output_dir = os.path.join(storage_config.get('avro_path', '../../data'), channel['name'])
 
     # UDP receive socket setup
     rx_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
@@ -141,16 +197,16 @@ def main():
 
     # Load Avro schema
     schema = avro.schema.parse(open(schema_path, "r", encoding="utf-8").read())
-    writer = new_writer(schema, output_dir)
+    writer = new_writer(schema, output_dir, index_interval)
     current_file_size = 0
 
     try:
         while True:
             # Rotate file if size exceeds limit
             if rotation_mode == 'size' and current_file_size >= rotation_threshold:
-                writer.close()
+                close_writer(writer)
                 print(f"Rotated file: {writer.writer.name}")
-                writer = new_writer(schema, output_dir)
+                writer = new_writer(schema, output_dir, index_interval)
                 current_file_size = 0
 
             # Receive data from UDP
@@ -167,6 +223,8 @@ def main():
                     tx_dec_sock.sendto(decimated_packet, (decimated['address'], decimated['port']))
 
             # Write raw data as a block to Avro file
+            if writer.index:
+                writer.index.add_block(writer.writer.raw.tell(), data)
             writer.writer.raw.write(encode_long(1))
             writer.writer.raw.write(encode_long(len(data)))
             writer.writer.raw.write(data)
@@ -176,7 +234,7 @@ def main():
     except KeyboardInterrupt:
         print("Shutting down...")
     finally:
-        writer.close()
+        close_writer(writer)
 
 if __name__ == "__main__":
     main()
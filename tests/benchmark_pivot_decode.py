@@ -0,0 +1,162 @@
+"""Benchmark pivot AVRO decode: avro.io DatumReader path vs schema-compiled columnar decoder"""
+import io
+import json
+import os
+import random
+import sys
+import time
+
+import avro.io
+import avro.schema
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../pivot/python'))
+from avro_reader import SYNC_MARKER, frame_blocks, frame_view
+from decoder import compile_schema
+
+
+def make_schema(num_signals):
+    """Relay-style schema: time, counter, message, then double signals"""
+    fields = [
+        {"name": "time", "type": "long"},
+        {"name": "counter", "type": "int"},
+        {"name": "message", "type": "string"},
+    ]
+    fields += [{"name": f"signal_{i}", "type": "double"} for i in range(num_signals)]
+    return {"type": "record", "name": "bench", "fields": fields}
+
+
+# C relay block defaults (relay/c/include/relay.h): a block is written once it
+# holds RELAY_BLOCK_RECORDS records or RELAY_BLOCK_BYTES bytes
+RELAY_BLOCK_RECORDS = 1000
+RELAY_BLOCK_BYTES = 65536
+
+
+def make_blocks(schema, num_records, block_records=1, block_bytes=None):
+    """
+    Encode records the way the relay stores them: up to block_records records
+    per block, a block ending once it reaches block_bytes (1 = Python relay)
+    """
+    writer = avro.io.DatumWriter(avro.schema.parse(json.dumps(schema)))
+    signal_names = [f['name'] for f in schema['fields'][3:]]
+    out = io.BytesIO()
+    t0 = time.time_ns()
+    block, count = io.BytesIO(), 0
+
+    def write_block():
+        data = block.getvalue()
+        avro.io.BinaryEncoder(out).write_long(count)
+        avro.io.BinaryEncoder(out).write_long(len(data))
+        out.write(data)
+        out.write(SYNC_MARKER)
+
+    for i in range(num_records):
+        record = {"time": t0 + i * 200_000, "counter": i, "message": random.choice(["ok", "warn", "err"])}
+        record.update({name: random.random() for name in signal_names})
+        writer.write(record, avro.io.BinaryEncoder(block))
+        count += 1
+        if count >= block_records or (block_bytes and block.tell() >= block_bytes):
+            write_block()
+            block, count = io.BytesIO(), 0
+    if count:
+        write_block()
+    return out.getvalue()
+
+
+def decode_datum_reader(schema, raw):
+    """Previous pivot path: dict per record, then per-signal lists, then np.array"""
+    reader = avro.io.DatumReader(avro.schema.parse(json.dumps(schema)))
+    starts, sizes, counts, _ = frame_blocks(raw)
+    records = []
+    for start, size, count in zip(starts, sizes, counts):
+        decoder = avro.io.BinaryDecoder(io.BytesIO(raw[start:start + size]))
+        records.extend(reader.read(decoder) for _ in range(count))
+    signal_data = {}
+    for record in records:
+        for key, value in record.items():
+            signal_data.setdefault(key, []).append(value)
+    return {k: np.array(v) for k, v in signal_data.items()}
+
+
+def decode_compiled(schema, raw, fields=None):
+    """Compiled decoder: block framing, then one vectorized pass per field"""
+    starts, sizes, counts, _ = frame_blocks(raw)
+    return compile_schema(schema).decode(np.frombuffer(raw, dtype=np.uint8), starts, counts, fields)
+
+
+def decode_mapped(schema, raw):
+    """Zero-copy path used on mmapped files: vectorized sync marker framing"""
+    buf = np.frombuffer(raw, dtype=np.uint8)
+    starts, sizes, counts, _ = frame_view(buf, 0, len(buf), SYNC_MARKER, raw)
+    return compile_schema(schema).decode(buf, starts, counts)
+
+
+def decode_projected(schema, raw):
+    """Compiled decoder with projection: typical analyst request of 3 signals"""
+    return decode_compiled(schema, raw, fields={'time', 'signal_10', 'signal_50', 'signal_90'})
+
+
+def benchmark(func, schema, raw, iterations):
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func(schema, raw)
+        times.append(time.perf_counter() - start)
+    return np.mean(times), np.std(times)
+
+
+def run(schema, raw, num_records, num_fields, layout):
+    """Benchmark every path on one block layout; returns mean seconds by path"""
+    blocks = len(frame_blocks(raw)[0])
+    print(f"Layout: {layout} ({blocks} blocks, {num_records / blocks:.0f} records per block)")
+    results = {}
+    for name, func, iterations in [
+        ('DatumReader', decode_datum_reader, 3),
+        ('Compiled', decode_compiled, 20),
+        ('Mapped', decode_mapped, 20),
+        ('Projected', decode_projected, 20),
+    ]:
+        mean, std = benchmark(func, schema, raw, iterations)
+        results[name] = mean
+        print(f"{name:12} {mean * 1000:9.2f}ms ± {std * 1000:6.2f}ms "
+              f"({num_records / mean:>12,.0f} records/sec, {len(raw) / mean / 1e6:8.1f} MB/s)")
+
+    # Sanity check: both paths agree
+    expected = decode_datum_reader(schema, raw)
+    actual = decode_compiled(schema, raw)
+    assert all(np.array_equal(expected[k], actual[k]) for k in expected if k != 'message')
+    assert actual['message'].tolist() == expected['message'].tolist()
+    mapped = decode_mapped(schema, raw)
+    assert all(np.array_equal(actual[k], mapped[k]) for k in actual if k != 'message')
+
+    print(f"Speedup: {results['DatumReader'] / results['Compiled']:.1f}x "
+          f"(mapped framing: {results['DatumReader'] / results['Mapped']:.1f}x, "
+          f"3 of {num_fields - 3} signals: {results['DatumReader'] / results['Projected']:.1f}x)")
+    print()
+    return results
+
+
+if __name__ == '__main__':
+    # Simulate 1 second of 5000 Hz data with 100 fields
+    samples_per_sec = 5000
+    num_fields = 100
+
+    schema = make_schema(num_fields - 3)
+
+    print("=" * 60)
+    print("Pivot Decode Performance Benchmark")
+    print("=" * 60)
+    print(f"Records: {samples_per_sec} (1 s at {samples_per_sec} Hz)")
+    print(f"Number of fields: {num_fields}")
+    print()
+
+    for layout, block_records, block_bytes in [
+        ('one record per block (Python relay)', 1, None),
+        (f'C relay defaults ({RELAY_BLOCK_RECORDS} records / {RELAY_BLOCK_BYTES} bytes)',
+         RELAY_BLOCK_RECORDS, RELAY_BLOCK_BYTES),
+        (f'{RELAY_BLOCK_RECORDS} records per block', RELAY_BLOCK_RECORDS, None),
+    ]:
+        raw = make_blocks(schema, samples_per_sec, block_records, block_bytes)
+        print(f"Input size: {len(raw) / 1e6:.2f} MB")
+        run(schema, raw, samples_per_sec, num_fields, layout)
+    print("=" * 60)
@@ -30,6 +30,7 @@ def make_export_request(request_id, channels, duration='PT30S'):
             'status_code': response.status_code,
             'elapsed_sec': elapsed,
             'file_size': len(response.content) if response.status_code == 200 else 0,
+            'cache': response.headers.get('X-Cache'),
             'start_time': start_time,
             'end_time': end_time,
             'error': None
@@ -41,6 +42,7 @@ def make_export_request(request_id, channels, duration='PT30S'):
             'status_code': None,
             'elapsed_sec': end_time - start_time,
             'file_size': 0,
+            'cache': None,
             'start_time': start_time,
             'end_time': end_time,
             'error': str(e)
@@ -124,10 +126,38 @@ def test_burst_requests(num_concurrent=3):
     return results, all_successful
 
 
+def test_identical_burst(num_concurrent=5):
+    """Identical concurrent requests should share one export (single-flight)"""
+    print("\n" + "=" * 60)
+    print(f"Test 3: Burst of {num_concurrent} Identical Requests")
+    print("=" * 60)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_concurrent) as executor:
+        futures = [
+            executor.submit(make_export_request, i+1, ['ch1', 'ch2'], 'PT30S')
+            for i in range(num_concurrent)
+        ]
+        results = [f.result() for f in futures]
+
+    for r in sorted(results, key=lambda x: x['start_time']):
+        print(f"Request {r['request_id']}: {r['status_code']} {r['elapsed_sec']:.2f}s "
+              f"(X-Cache: {r['cache']})")
+
+    # At most one request decoded; the rest waited on it or hit the cache
+    misses = sum(1 for r in results if r['cache'] == 'MISS')
+    sizes = {r['file_size'] for r in results}
+    print(f"\nDecodes: {misses}, distinct sizes: {len(sizes)}")
+    assert all(r['status_code'] == 200 for r in results)
+    assert misses <= 1, "Identical requests should not decode independently"
+    assert len(sizes) == 1
+
+    return results
+
+
 def test_limit_validation():
     """Test that API enforces limits"""
     print("\n" + "=" * 60)
-    print("Test 3: Limit Validation")
+    print("Test 4: Limit Validation")
     print("=" * 60)
 
     # Test channel limit (max 20)
@@ -155,6 +185,7 @@ if __name__ == '__main__':
     # Run tests
     baseline = test_single_request()
     burst_results, burst_success = test_burst_requests(num_concurrent=3)
+    test_identical_burst(num_concurrent=5)
     test_limit_validation()
 
     # Summary
@@ -163,6 +194,7 @@ if __name__ == '__main__':
     print("=" * 60)
     print(f"Baseline single request: {baseline['elapsed_sec']:.2f}s")
     print(f"Burst test (3 concurrent): {'PASSED' if burst_success else 'FAILED'}")
+    print(f"Identical burst (5 concurrent): PASSED")
     print(f"Limit validation: PASSED")
 
     if burst_success: